@@ -3,19 +3,32 @@
 # Projeto CARTO
 # Autoria: Wagner P Calazans
 # Ano de criação: 2025
-# Versao: 1.0 (LDAP Remote Cannon)
+# Versao: 1.3 (LDAP Remote Cannon - Pool de Conexões)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: ldap_jogador_remoto_paralelo.py
 # Descrição: Provisionamento remoto massivo via LDAP (Paralelo)
+#            Root DSE/schema lidos uma vez (cache por CSN), não a cada conexão.
+#            Padrão: pool de conexões autenticadas reaproveitadas pelos workers.
+#            --fresh-connection: uma conexão (connect+bind+unbind) por usuário.
 # ============================================================
 
+import os
 import time
 import sys
+import queue
+import argparse
+import threading
+from contextlib import contextmanager
+from functools import partial
 from concurrent.futures import ThreadPoolExecutor
-from ldap3 import Server, Connection, ALL, SUBTREE
+from ldap3 import Connection, SUBTREE
 from ldap3.core.exceptions import LDAPException
 
+# Módulos compartilhados dos jogadores (scripts/scim_server)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'scim_server'))
+from carto_ldap_info import cached_server, ultimo_carregamento
+
 # --- CONFIGURACAO ---
 LDAP_HOST = '172.16.102.100' # Maquina B (Alvo)
 LDAP_PORT = 389
@@ -24,11 +37,52 @@ LDAP_PASS = 'carto123'                 # Ajuste conforme sua senha
 BASE_DN   = 'dc=carto,dc=com'
 TOTAL_USERS = 5000
 CONCURRENCY = 200 # O mesmo nivel de paralelismo do SCIM
+POOL_SIZE = 20    # Conexoes autenticadas no modo pool (padrao)
 
-def add_ldap_user(user_id):
-    # Cria uma conexao dedicada para esta thread (simula clientes distintos)
-    server = Server(LDAP_HOST, port=LDAP_PORT, get_info=ALL)
-    
+class PoolLDAP:
+    """ Conexoes autenticadas de longa duracao emprestadas pelos workers.
+
+    Abertas sob demanda; uma conexao que falha e descartada e a vaga volta
+    vazia para o pool, sendo reaberta pelo proximo worker que a pegar.
+    """
+    def __init__(self, size):
+        self.livres = queue.Queue()
+        for _ in range(size):
+            self.livres.put(None)
+        self.aberturas = 0
+        self._lock = threading.Lock()
+
+    def _abrir(self):
+        server = cached_server(LDAP_HOST, LDAP_PORT, user=LDAP_USER, password=LDAP_PASS)
+        conn = Connection(server, user=LDAP_USER, password=LDAP_PASS, auto_bind=True)
+        with self._lock:
+            self.aberturas += 1
+        return conn
+
+    @contextmanager
+    def emprestar(self):
+        conn = self.livres.get()
+        try:
+            if conn is None or conn.closed:
+                conn = self._abrir()
+            yield conn
+        except Exception:
+            if conn is not None:
+                try: conn.unbind()
+                except Exception: pass
+            conn = None
+            raise
+        finally:
+            self.livres.put(conn)
+
+    def fechar(self):
+        while not self.livres.empty():
+            conn = self.livres.get()
+            if conn is not None:
+                try: conn.unbind()
+                except Exception: pass
+
+def inserir(conn, user_id):
     # Monta o DN e os atributos
     # Ajuste a estrutura se voce usa ou=users
     user_dn = f"uid=remoto{user_id},{BASE_DN}"
@@ -41,35 +95,62 @@ def add_ldap_user(user_id):
         'description': 'Carga Remota Paralela LDAP'
     }
 
+    if conn.add(user_dn, attributes=attributes):
+        return "SUCCESS"
+    # Captura erro (ex: ja existe -> entryAlreadyExists, codigo 68)
+    if conn.result['result'] == 68:
+        return "ALREADY_EXISTS"
+    return "SERVER_ERROR"
+
+def add_ldap_user(user_id, pool=None):
     try:
-        # Auto-bind e execucao
+        if pool is not None:
+            with pool.emprestar() as conn:
+                return inserir(conn, user_id)
+
+        # Cria uma conexao dedicada para este usuario (simula clientes distintos),
+        # com o schema do cache em vez de baixa-lo de novo a cada conexao
+        server = cached_server(LDAP_HOST, LDAP_PORT, user=LDAP_USER, password=LDAP_PASS)
         conn = Connection(server, user=LDAP_USER, password=LDAP_PASS, auto_bind=True)
-        if conn.add(user_dn, attributes=attributes):
-            conn.unbind()
-            return "SUCCESS"
-        else:
-            # Captura erro (ex: ja existe)
-            result = conn.result['description']
+        try:
+            return inserir(conn, user_id)
+        finally:
             conn.unbind()
-            if "already exists" in result:
-                return "ALREADY_EXISTS"
-            return "SERVER_ERROR"
     except Exception as e:
         return "CONN_ERROR"
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Carga remota LDAP paralela")
+    parser.add_argument("--pool-size", type=int, default=POOL_SIZE,
+                        help=f"conexoes autenticadas reaproveitadas (padrao {POOL_SIZE})")
+    parser.add_argument("--fresh-connection", action="store_true",
+                        help="uma conexao nova (connect+bind+unbind) por usuario, sem pool")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
+    pool = None if args.fresh_connection else PoolLDAP(args.pool_size)
+
     print("------------------------------------------------------------")
     print(f"INICIO DA CARGA REMOTA LDAP (PARALELA)")
     print(f"Alvo: ldap://{LDAP_HOST}:{LDAP_PORT}")
-    print(f"Mode: {CONCURRENCY} conexoes simultaneas")
+    if pool is None:
+        print(f"Mode: {CONCURRENCY} workers, conexao nova por usuario")
+    else:
+        print(f"Mode: {CONCURRENCY} workers, pool de {args.pool_size} conexoes autenticadas")
     print("------------------------------------------------------------")
 
+    cached_server(LDAP_HOST, LDAP_PORT, user=LDAP_USER, password=LDAP_PASS)
+    print(f"Schema: {ultimo_carregamento['origem']} (CSN {ultimo_carregamento['csn']}) em {ultimo_carregamento['segundos']:.2f} s")
+
     start_time = time.time()
 
     # ThreadPoolExecutor gerencia as 200 conexoes simultaneas
     with ThreadPoolExecutor(max_workers=CONCURRENCY) as executor:
         # Mapeia a funcao para os 5000 IDs
-        results = list(executor.map(add_ldap_user, range(1, TOTAL_USERS + 1)))
+        results = list(executor.map(partial(add_ldap_user, pool=pool), range(1, TOTAL_USERS + 1)))
+    if pool is not None:
+        pool.fechar()
 
     end_time = time.time()
     duration = end_time - start_time
@@ -85,6 +166,7 @@ def main():
     print(f"[ALERTA]  Ja existiam..: {exists_count}")
     print(f"[FALHA]   Erro Logico..: {error_count}")
     print(f"[FALHA]   Erro Rede....: {conn_error}")
+    print(f"[CONEXOES] Abertas.....: {TOTAL_USERS if pool is None else pool.aberturas}")
     print("------------------------------------------------------------")
     print(f"Tempo Total: {duration:.2f} segundos")
     if duration > 0:
@@ -3,7 +3,7 @@
 # Projeto CARTO
 # Autoria: Wagner Calazans
 # Ano de criação: 2025
-# Versao: 1.2 (Auto-Retry)
+# Versao: 1.3 (Retry Contínuo por Item)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_jogador_deletar_usuarios.py
@@ -13,6 +13,12 @@
 import asyncio
 import aiohttp
 import time
+import sys
+import os
+
+# Modulo de retry compartilhado com o scim_py_jogador_master (pasta acima)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from carto_retry import run_with_retry
 
 # CONFIGURACAO
 SERVER_BASE = "http://172.16.102.100:5000/Users"
@@ -40,45 +46,16 @@ async def main():
     start_time = time.time()
     
     # Lista inicial: Todos os usuarios de 1 a 5000
-    pending_users = list(range(1, TOTAL_USERS + 1))
-    
-    rounds = 0
-    total_failures_accumulated = 0
-    
     connector = aiohttp.TCPConnector(limit=CONCURRENCY_LIMIT)
-    timeout = aiohttp.ClientTimeout(total=5) # Timeout curto para falhar rapido e tentar de novo
+    timeout = aiohttp.ClientTimeout(total=5)
     
     async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         
-        # Loop enquanto houver usuarios pendentes
-        while pending_users:
-            rounds += 1
-            print(f"\n>>> INICIANDO RONDA {rounds}")
-            print(f"    Alvos restantes: {len(pending_users)}")
-            
-            tasks = []
-            for uid in pending_users:
-                tasks.append(delete_user(session, uid))
-            
-            # Dispara a bateria de tentativas
-            results = await asyncio.gather(*tasks)
-            
-            # Limpa a lista para verificar quem ainda sobra
-            pending_users = []
-            round_failures = 0
-            
-            for uid, status in results:
-                if status != "SUCCESS":
-                    pending_users.append(uid) # Adiciona na lista para a proxima volta
-                    round_failures += 1
-                    total_failures_accumulated += 1
-            
-            if pending_users:
-                print(f"    [FALHA] {round_failures} erros nesta ronda.")
-                print("    A aguardar 2 segundos para o servidor recuperar...")
-                await asyncio.sleep(2)
-            else:
-                print("    [SUCESSO] Todos os usuarios da ronda foram processados.")
+        async def send(batch):
+            return [await delete_user(session, batch[0])]
+        
+        # Re-tentativa por item com backoff + jitter no lugar da ronda global
+        stats = await run_with_retry(range(1, TOTAL_USERS + 1), send, CONCURRENCY_LIMIT, total=TOTAL_USERS)
 
     end_time = time.time()
     duration = end_time - start_time
@@ -86,8 +63,9 @@ async def main():
     print("------------------------------------------------------------")
     print(f"RELATORIO FINAL (PERSISTENCIA):")
     print(f"[STATUS]  Todos os {TOTAL_USERS} usuarios foram deletados.")
-    print(f"[RODADAS] Necessarias....: {rounds}")
-    print(f"[FALHAS]  Erros superados: {total_failures_accumulated}")
+    print(f"[TENTATIVAS] Max por user: {stats['MAX_ATTEMPTS'] + 1}")
+    print(f"[FALHAS]  Erros superados: {stats['RETRIES']}")
+    print(f"[CIRCUITO] Aberturas.....: {stats['BREAKER_OPENS']}")
     print("------------------------------------------------------------")
     print(f"Tempo Total: {duration:.2f} segundos")
     print("------------------------------------------------------------")
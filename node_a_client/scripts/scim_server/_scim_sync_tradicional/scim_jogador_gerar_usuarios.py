@@ -3,7 +3,7 @@
 # Projeto CARTO
 # Autoria: Wagner P Calazans
 # Ano de criação: 2025
-# Versao: 1.3 (Idempotente)
+# Versao: 1.4 (Idempotente + Retry Contínuo)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_jogador_gerar_usuarios.py
@@ -14,6 +14,11 @@ import asyncio
 import aiohttp
 import time
 import sys
+import os
+
+# Modulo de retry compartilhado com o scim_py_jogador_master (pasta acima)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from carto_retry import run_with_retry
 
 # CONFIGURACAO
 SERVER_URL = "http://172.16.102.100:5000/Users"
@@ -54,49 +59,19 @@ async def main():
     
     start_time = time.time()
     
-    # Lista inicial: Todos os usuarios
-    pending_users = list(range(1, TOTAL_USERS + 1))
-    
-    rounds = 0
-    failures_retryable = 0
-    already_exists_count = 0
-    
     connector = aiohttp.TCPConnector(limit=CONCURRENCY_LIMIT)
     timeout = aiohttp.ClientTimeout(total=5) 
     
     async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         
-        while pending_users:
-            rounds += 1
-            print(f"\n>>> INICIANDO RONDA {rounds}")
-            print(f"    Alvos restantes: {len(pending_users)}")
-            
-            tasks = []
-            for uid in pending_users:
-                tasks.append(create_user(session, uid))
-            
-            results = await asyncio.gather(*tasks)
-            
-            pending_users = []
-            round_failures = 0
-            
-            for uid, status in results:
-                if status == "SUCCESS":
-                    pass # Sucesso pleno
-                elif status == "ALREADY_EXISTS":
-                    already_exists_count += 1
-                    # Nao adicionamos em pending_users, pois ja esta la
-                else:
-                    # SERVER_ERROR ou CONN_ERROR -> Tenta de novo
-                    pending_users.append(uid)
-                    round_failures += 1
-                    failures_retryable += 1
-            
-            if pending_users:
-                print(f"    [FALHA] {round_failures} erros recuperaveis. Aguardando...")
-                await asyncio.sleep(2)
-            else:
-                print("    [SUCESSO] Todos os usuarios desta ronda resolvidos.")
+        async def send(batch):
+            return [await create_user(session, batch[0])]
+        
+        # Cada falha volta para a fila sozinha (backoff + jitter), sem esperar
+        # a ronda inteira terminar; o circuit breaker pausa na perda total
+        stats = await run_with_retry(range(1, TOTAL_USERS + 1), send, CONCURRENCY_LIMIT, total=TOTAL_USERS)
+    
+    already_exists_count = stats.get("ALREADY_EXISTS", 0)
 
     end_time = time.time()
     duration = end_time - start_time
@@ -106,8 +81,9 @@ async def main():
     print(f"[STATUS]  Carga finalizada.")
     print(f"[DETALHE] Criados novos...: {TOTAL_USERS - already_exists_count}")
     print(f"[DETALHE] Ja existiam.....: {already_exists_count} (Duplicatas/Recuperados)")
-    print(f"[RODADAS] Necessarias.....: {rounds}")
-    print(f"[RETRYS]  Falhas de Rede..: {failures_retryable}")
+    print(f"[TENTATIVAS] Max por user.: {stats['MAX_ATTEMPTS'] + 1}")
+    print(f"[RETRYS]  Falhas de Rede..: {stats['RETRIES']}")
+    print(f"[CIRCUITO] Aberturas......: {stats['BREAKER_OPENS']}")
     print("------------------------------------------------------------")
     print(f"Tempo Total: {duration:.2f} segundos")
     print("------------------------------------------------------------")
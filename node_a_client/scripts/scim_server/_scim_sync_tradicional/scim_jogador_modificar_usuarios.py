@@ -3,7 +3,7 @@
 # Projeto CARTO
 # Autoria: Wagner P Calazans
 # Ano de criação: 2025
-# Versao: 1.2 (Auto-Retry)
+# Versao: 1.4 (Retry Contínuo por Item)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_jogador_modificar_usuarios.py
@@ -13,8 +13,14 @@
 import asyncio
 import aiohttp
 import time
+import sys
+import os
 from datetime import datetime
 
+# Modulo de retry compartilhado com o scim_py_jogador_master (pasta acima)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from carto_retry import run_with_retry
+
 # CONFIGURACAO
 SERVER_BASE = "http://172.16.102.100:5000/Users"
 TOTAL_USERS = 5000
@@ -29,6 +35,9 @@ async def update_user(session, user_id, timestamp):
         async with session.put(url, json=payload) as response:
             if response.status == 200:
                 return user_id, "SUCCESS"
+            elif response.status == 404:
+                # Usuario inexistente: falha definitiva, nao volta para a fila
+                return user_id, "NOT_FOUND"
             else:
                 return user_id, "SERVER_ERROR"
     except Exception:
@@ -43,50 +52,28 @@ async def main():
     start_time = time.time()
     current_time = datetime.now().strftime("%H:%M:%S")
     
-    pending_users = list(range(1, TOTAL_USERS + 1))
-    
-    rounds = 0
-    total_failures_accumulated = 0
-    
     connector = aiohttp.TCPConnector(limit=CONCURRENCY_LIMIT)
     timeout = aiohttp.ClientTimeout(total=5)
     
     async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         
-        while pending_users:
-            rounds += 1
-            print(f"\n>>> INICIANDO RONDA {rounds}")
-            print(f"    Alvos restantes: {len(pending_users)}")
-            
-            tasks = []
-            for uid in pending_users:
-                tasks.append(update_user(session, uid, current_time))
-            
-            results = await asyncio.gather(*tasks)
-            
-            pending_users = []
-            round_failures = 0
-            
-            for uid, status in results:
-                if status != "SUCCESS":
-                    pending_users.append(uid)
-                    round_failures += 1
-                    total_failures_accumulated += 1
-            
-            if pending_users:
-                print(f"    [FALHA] {round_failures} erros. Aguardando recuperacao do servidor...")
-                await asyncio.sleep(2)
-            else:
-                print("    [SUCESSO] Todos processados nesta ronda.")
+        async def send(batch):
+            return [await update_user(session, batch[0], current_time)]
+        
+        # Re-tentativa por item com backoff + jitter no lugar da ronda global
+        stats = await run_with_retry(range(1, TOTAL_USERS + 1), send, CONCURRENCY_LIMIT, total=TOTAL_USERS)
 
     end_time = time.time()
     duration = end_time - start_time
     
     print("------------------------------------------------------------")
     print(f"RELATORIO FINAL (MODIFICACAO):")
-    print(f"[STATUS]  Todos os {TOTAL_USERS} usuarios foram atualizados.")
-    print(f"[RODADAS] Necessarias....: {rounds}")
-    print(f"[FALHAS]  Erros superados: {total_failures_accumulated}")
+    print(f"[STATUS]  {stats['DONE']} usuarios atualizados, {stats['FAILED']} falhas definitivas (de {TOTAL_USERS}).")
+    if stats['FAILED']:
+        print(f"[FALHAS]  Inexistentes...: {stats.get('NOT_FOUND', 0)}")
+    print(f"[TENTATIVAS] Max por user: {stats['MAX_ATTEMPTS'] + 1}")
+    print(f"[FALHAS]  Erros superados: {stats['RETRIES']}")
+    print(f"[CIRCUITO] Aberturas.....: {stats['BREAKER_OPENS']}")
     print("------------------------------------------------------------")
     print(f"Tempo Total: {duration:.2f} segundos")
     print("------------------------------------------------------------")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Concorrência Adaptativa AIMD)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_aimd.py
+# Descrição: Controle adaptativo de requisições em voo (AIMD) para os
+#            jogadores SCIM (asyncio) e LDAP (threads).
+#            - Cresce +1 por janela de respostas saudáveis.
+#            - Corta pela metade em timeout / erro de conexão.
+#            - Registra a janela escolhida ao longo do tempo (CSV).
+# ============================================================
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+
+# --- PARÂMETROS PADRÃO ---
+AIMD_INITIAL = 10           # Janela inicial (requisições em voo)
+AIMD_MIN = 1
+AIMD_MAX = 200              # Teto (e número de workers/threads criados)
+AIMD_DECREASE = 0.5         # Fator multiplicativo em congestionamento
+LATENCY_FACTOR = 3.0        # Latência "saudável" <= fator x menor latência observada
+LATENCY_SLACK = 0.05        # s de folga somados ao limite de latência
+ERROR_RATE_MAX = 0.05       # Taxa de erro (EWMA) acima da qual a janela não cresce
+EWMA_ALPHA = 0.1
+
+LOG_DIR = "/opt/resultados/aimd"
+
+# Resultados de uma requisição, do ponto de vista do controlador
+OK, FAIL, CONGESTION = "ok", "fail", "congestion"
+
+class AIMDController:
+    """ Janela de concorrência estilo TCP (congestion avoidance).
+
+    OK com latência saudável soma 1/janela (≈ +1 por janela completa).
+    CONGESTION (timeout, conexão recusada/derrubada, servidor saturado) multiplica
+    por AIMD_DECREASE; como no TCP, só requisições enviadas depois da última
+    redução podem reduzir de novo, para que a rajada de timeouts de uma mesma
+    perda não zere a janela. FAIL (erro lógico com o servidor respondendo) só
+    entra na taxa de erro.
+    """
+    def __init__(self, initial=AIMD_INITIAL, minimum=AIMD_MIN, maximum=AIMD_MAX, decrease=AIMD_DECREASE, label="aimd"):
+        self.window = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.label = label
+        self.min_latency = None
+        self.ewma_latency = None
+        self.error_rate = 0.0
+        self.last_decrease = 0.0
+        self.decreases = 0
+        self.start = time.monotonic()
+        self.samples = [(0.0, int(self.window), 0)]
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return int(self.window)
+
+    def _healthy(self, latency):
+        if self.error_rate > ERROR_RATE_MAX:
+            return False
+        return latency <= self.min_latency * LATENCY_FACTOR + LATENCY_SLACK
+
+    def update(self, outcome, latency, in_flight=0):
+        with self._lock:
+            before = int(self.window)
+            now = time.monotonic()
+            self.error_rate += EWMA_ALPHA * ((outcome != OK) - self.error_rate)
+
+            if outcome == CONGESTION:
+                # Uma redução por "RTT": timeouts da mesma rajada contam uma vez só
+                if now - latency >= self.last_decrease and self.window > self.minimum:
+                    self.window = max(self.minimum, self.window * self.decrease)
+                    self.last_decrease = now
+                    self.decreases += 1
+            elif outcome == OK:
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+                self.ewma_latency = latency if self.ewma_latency is None else \
+                    self.ewma_latency + EWMA_ALPHA * (latency - self.ewma_latency)
+                if self._healthy(latency):
+                    self.window = min(self.maximum, self.window + 1.0 / self.window)
+
+            if int(self.window) != before:
+                self.samples.append((now - self.start, int(self.window), in_flight))
+
+    def save(self, log_dir=LOG_DIR):
+        """ Grava a série temporal da janela; devolve o caminho do CSV """
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, f"{self.label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(path, "w") as f:
+            f.write("tempo_s,janela,em_voo\n")
+            for t, w, n in self.samples:
+                f.write(f"{t:.3f},{w},{n}\n")
+        return path
+
+class AsyncLimiter:
+    """ Limita requisições em voo à janela do controlador (asyncio) """
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self._cond = None
+
+    async def acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            while self.in_flight >= self.controller.limit:
+                await self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    async def release(self, started, outcome):
+        self.controller.update(outcome, time.monotonic() - started, self.in_flight)
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+class ThreadLimiter:
+    """ Mesma janela para o jogador LDAP (threads) """
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= self.controller.limit:
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self, started, outcome):
+        self.controller.update(outcome, time.monotonic() - started, self.in_flight)
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Histograma de Latência Estilo HDR)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_histograma.py
+# Descrição: Latência por requisição dos jogadores SCIM e LDAP.
+#            - Buckets log-lineares (estilo HdrHistogram): 128 sub-buckets
+#              por potência de 2, erro relativo < 1%, de 1 us a ~1 h.
+#            - Memória constante (~3 mil contadores), independente do
+#              número de requisições.
+#            - Gravado em JSON; histogramas de várias execuções podem ser
+#              somados (mesclar) sem perder precisão dos percentis.
+#            - Uso direto: python3 carto_histograma.py a.json b.json [-o total.json]
+# ============================================================
+
+import argparse
+import json
+import os
+from datetime import datetime
+
+SUB_BITS = 7                        # 2^7 = 128 sub-buckets por potência de 2
+SUB = 1 << SUB_BITS
+VALOR_MAX_US = 3600 * 1000000       # Acima disso (1 h) o valor é saturado
+EXPOENTE_MAX = VALOR_MAX_US.bit_length() - (SUB_BITS + 1)
+N_BUCKETS = SUB * (EXPOENTE_MAX + 2)
+PERCENTIS = (50, 90, 99, 99.9)
+FORMATO = "carto-hist-1"
+
+LOG_DIR = "/opt/resultados/latencia"
+
+def _indice(us):
+    """ Bucket do valor em microssegundos (linear até 2*SUB, depois log-linear) """
+    if us < 2 * SUB:
+        return us
+    e = us.bit_length() - (SUB_BITS + 1)
+    return SUB * e + (us >> e)
+
+def _limites(indice):
+    """ [inferior, superior] em us dos valores que caem no bucket """
+    if indice < 2 * SUB:
+        return indice, indice
+    e = indice // SUB - 1
+    m = indice - SUB * e
+    return m << e, ((m + 1) << e) - 1
+
+class Histograma:
+    """ Contadores de latência (segundos na interface, microssegundos por dentro).
+
+    Não é thread-safe: com threads, registre sob o lock que já protege os
+    contadores do jogador (no asyncio não há concorrência).
+    """
+    def __init__(self):
+        self.contagens = [0] * N_BUCKETS
+        self.total = 0
+        self.soma_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def registrar(self, segundos):
+        us = min(max(int(segundos * 1000000), 0), VALOR_MAX_US)
+        self.contagens[_indice(us)] += 1
+        self.total += 1
+        self.soma_us += us
+        if self.min_us is None or us < self.min_us:
+            self.min_us = us
+        if us > self.max_us:
+            self.max_us = us
+
+    def mesclar(self, outro):
+        for i, n in enumerate(outro.contagens):
+            if n:
+                self.contagens[i] += n
+        self.total += outro.total
+        self.soma_us += outro.soma_us
+        if outro.min_us is not None and (self.min_us is None or outro.min_us < self.min_us):
+            self.min_us = outro.min_us
+        self.max_us = max(self.max_us, outro.max_us)
+        return self
+
+    def percentil(self, p):
+        """ Valor (s) abaixo do qual estão p% das amostras; ponto médio do bucket """
+        if not self.total:
+            return None
+        alvo = max(1, -(-self.total * p // 100))
+        acumulado = 0
+        for i, n in enumerate(self.contagens):
+            acumulado += n
+            if acumulado >= alvo:
+                inferior, superior = _limites(i)
+                valor = (inferior + superior) / 2
+                return min(max(valor, self.min_us), self.max_us) / 1000000
+        return self.max_us / 1000000
+
+    def resumo(self):
+        """ n, média, p50/p90/p99/p99.9 e máximo em milissegundos """
+        if not self.total:
+            return {"n": 0}
+        dados = {"n": self.total, "media_ms": self.soma_us / self.total / 1000}
+        for p in PERCENTIS:
+            dados[f"p{p:g}_ms"] = self.percentil(p) * 1000
+        dados["max_ms"] = self.max_us / 1000
+        return dados
+
+    def linha(self):
+        """ Resumo em uma linha para os relatórios dos jogadores """
+        r = self.resumo()
+        if not r["n"]:
+            return "sem amostras"
+        partes = [f"n={r['n']}"] + [f"p{p:g} {r[f'p{p:g}_ms']:.1f}" for p in PERCENTIS]
+        return " | ".join(partes + [f"max {r['max_ms']:.1f} (ms)"])
+
+    # --- PERSISTÊNCIA ---
+    def para_dict(self):
+        return {"formato": FORMATO, "sub_bits": SUB_BITS, "unidade": "us",
+                "total": self.total, "soma_us": self.soma_us, "min_us": self.min_us, "max_us": self.max_us,
+                "contagens": {str(i): n for i, n in enumerate(self.contagens) if n}}
+
+    @classmethod
+    def de_dict(cls, dados):
+        if dados.get("formato") != FORMATO or dados.get("sub_bits") != SUB_BITS:
+            raise ValueError(f"Histograma incompatível: {dados.get('formato')} / sub_bits {dados.get('sub_bits')}")
+        h = cls()
+        for i, n in dados["contagens"].items():
+            h.contagens[int(i)] = n
+        h.total = dados["total"]
+        h.soma_us = dados["soma_us"]
+        h.min_us = dados["min_us"]
+        h.max_us = dados["max_us"]
+        return h
+
+def salvar(histogramas, label, log_dir=LOG_DIR, extra=None):
+    """ Grava {nome: Histograma} (ex.: geral + por tentativa) em um JSON; devolve o caminho """
+    os.makedirs(log_dir, exist_ok=True)
+    path = os.path.join(log_dir, f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    dados = {"label": label, "gerado_em": datetime.now().isoformat(timespec="seconds"),
+             "histogramas": {nome: h.para_dict() for nome, h in histogramas.items()}}
+    if extra:
+        dados.update(extra)
+    with open(path, "w") as f:
+        json.dump(dados, f)
+    return path
+
+def carregar(path):
+    """ {nome: Histograma} de um arquivo gravado por salvar() """
+    with open(path) as f:
+        dados = json.load(f)
+    return {nome: Histograma.de_dict(h) for nome, h in dados["histogramas"].items()}
+
+def mesclar_arquivos(paths):
+    """ Soma, por nome, os histogramas de vários arquivos (várias execuções) """
+    total = {}
+    for path in paths:
+        for nome, h in carregar(path).items():
+            total.setdefault(nome, Histograma()).mesclar(h)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Soma histogramas de latência de várias execuções")
+    parser.add_argument("arquivos", nargs="+", help="JSONs gravados pelos jogadores")
+    parser.add_argument("-o", "--saida", help="grava o histograma somado neste JSON")
+    args = parser.parse_args()
+
+    total = mesclar_arquivos(args.arquivos)
+    print(f"[INFO] {len(args.arquivos)} arquivo(s) somado(s)")
+    for nome, h in total.items():
+        print(f"[LATENCIA] {nome:<12}: {h.linha()}")
+    if args.saida:
+        dados = {"label": "mesclado", "gerado_em": datetime.now().isoformat(timespec="seconds"),
+                 "origens": args.arquivos,
+                 "histogramas": {nome: h.para_dict() for nome, h in total.items()}}
+        with open(args.saida, "w") as f:
+            json.dump(dados, f)
+        print(f"[SUCESSO] Gravado em: {args.saida}")
+
+if __name__ == "__main__":
+    main()
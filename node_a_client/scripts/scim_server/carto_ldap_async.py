@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.1 (Motor LDAP Assíncrono)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_ldap_async.py
+# Descrição: Cliente LDAP sobre asyncio para o jogador LDAP.
+#            - Poucas conexões TCP, várias operações em voo por conexão
+#              (pipelining), casadas pela resposta via messageID.
+#            - Requisições codificadas/decodificadas com o BER do ldap3
+#              (mesmas PDUs do modo threads, sem uma thread por operação).
+#            - Reconexão + re-bind automáticos quando o socket cai; nada
+#              é enviado na conexão antes da resposta do bind.
+#            - Operações distribuídas pelas vagas reservadas de cada
+#              conexão (a rajada inicial não se acumula na primeira).
+# ============================================================
+
+import asyncio
+import itertools
+import ssl
+
+from ldap3 import SIMPLE
+from ldap3.operation.add import add_operation
+from ldap3.operation.bind import bind_operation
+from ldap3.operation.delete import delete_operation
+from ldap3.operation.modify import modify_operation
+from ldap3.protocol.rfc4511 import LDAPMessage, MessageID, ProtocolOp, UnbindRequest
+from ldap3.strategy.base import BaseStrategy
+from ldap3.utils.asn1 import encode, decode_message_fast, ldap_result_to_dict_fast
+
+ASYNC_CONNECTIONS = 4       # Sockets abertos com o slapd
+ASYNC_DEPTH = 32            # messageIDs pendentes por socket
+READ_CHUNK = 65536
+
+class LDAPConnectionLost(Exception):
+    """ O socket caiu com operações pendentes (equivale ao erro de conexão das threads) """
+
+class AsyncLDAPConnection:
+    """ Uma conexão LDAP com várias operações pendentes.
+
+    Cada requisição recebe um messageID próprio e um future; a tarefa leitora
+    separa as PDUs pelo comprimento BER e entrega cada resposta ao future do
+    seu messageID. Operações que estouram o timeout são esquecidas: a resposta
+    atrasada, se chegar, é descartada.
+    """
+    def __init__(self, host, port, use_ssl=False, timeout=30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.pending = {}           # messageID -> future
+        self.reader = None
+        self.writer = None
+        self.bound = False          # True só depois da resposta de sucesso do bind
+        self._reader_task = None
+        self._ids = itertools.count(1)
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def open(self, bind_dn, password):
+        ctx = None
+        if self.use_ssl:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.verify_mode = ssl.CERT_NONE
+        self.bound = False
+        if self.connected:
+            # Socket de uma tentativa anterior sem bind concluído (timeout)
+            self.writer.close()
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ctx), self.timeout)
+        self._ids = itertools.count(1)
+        # Leitor preso a este socket e a este mapa: o de um socket antigo não falha os novos
+        self.pending = {}
+        self._reader_task = asyncio.create_task(self._read_loop(self.reader, self.writer, self.pending))
+        result = await self.request('bindRequest', bind_operation(3, SIMPLE, bind_dn, password, auto_encode=True))
+        if result['result'] != 0:
+            await self.close()
+            raise LDAPConnectionLost(f"Bind Failed: {result['description']}")
+        self.bound = True
+
+    def _send(self, message_id, message_type, request):
+        message = LDAPMessage()
+        message['messageID'] = MessageID(message_id)
+        message['protocolOp'] = ProtocolOp().setComponentByName(message_type, request)
+        self.writer.write(encode(message))
+
+    async def request(self, message_type, request):
+        if not self.connected:
+            raise LDAPConnectionLost("Conexão fechada")
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message_id] = future
+        try:
+            self._send(message_id, message_type, request)
+            await self.writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self.pending.pop(message_id, None)
+
+    async def _read_loop(self, reader, writer, pending):
+        buffer = b""
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                buffer += data
+                while True:
+                    size = BaseStrategy.compute_ldap_message_size(buffer)
+                    if size == -1 or len(buffer) < size:
+                        break
+                    pdu, buffer = buffer[:size], buffer[size:]
+                    decoded = decode_message_fast(pdu)
+                    future = pending.get(decoded['messageID'])
+                    if future is not None and not future.done():
+                        future.set_result(ldap_result_to_dict_fast(decoded['payload']))
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._fail_pending(writer, pending)
+
+    def _fail_pending(self, writer, pending):
+        if writer is self.writer:
+            self.bound = False
+        writer.close()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(LDAPConnectionLost("Conexão perdida com operações pendentes"))
+
+    async def close(self):
+        self.bound = False
+        if self.connected:
+            try:
+                self._send(next(self._ids), 'unbindRequest', UnbindRequest())
+                await self.writer.drain()
+            except OSError:
+                pass
+            self.writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+class AsyncLDAPPool:
+    """ `size` conexões com até `depth` operações pendentes cada.
+
+    Cada operação vai para a conexão com menos vagas reservadas (contadas
+    antes de qualquer espera, inclusive a do semáforo e a do bind); uma
+    conexão caída é reaberta (e re-autenticada) pela primeira operação que
+    a usar, e as demais esperam o bind terminar.
+    """
+    def __init__(self, host, port, bind_dn, password, size=ASYNC_CONNECTIONS,
+                 depth=ASYNC_DEPTH, use_ssl=False, timeout=30):
+        self.bind_dn = bind_dn
+        self.password = password
+        self.size = size
+        self.depth = depth
+        self.conns = [AsyncLDAPConnection(host, port, use_ssl, timeout) for _ in range(size)]
+        self._slots = None
+        self._locks = None
+        self.reservadas = [0] * size    # operações designadas a cada conexão (em voo ou esperando)
+        self.reconnects = 0
+
+    @property
+    def in_flight(self):
+        return sum(len(c.pending) for c in self.conns)
+
+    async def _ready(self, index):
+        conn = self.conns[index]
+        if conn.bound and conn.connected:
+            return conn
+        async with self._locks[index]:
+            if not (conn.bound and conn.connected):
+                if conn.reader is not None:
+                    self.reconnects += 1
+                await conn.open(self.bind_dn, self.password)
+        return conn
+
+    async def execute(self, message_type, request):
+        """ Envia uma operação e devolve o dicionário de resultado do ldap3 """
+        if self._slots is None:
+            self._slots = [asyncio.Semaphore(self.depth) for _ in range(self.size)]
+            self._locks = [asyncio.Lock() for _ in range(self.size)]
+        index = min(range(self.size), key=lambda i: self.reservadas[i])
+        self.reservadas[index] += 1
+        try:
+            async with self._slots[index]:
+                conn = await self._ready(index)
+                return await conn.request(message_type, request)
+        finally:
+            self.reservadas[index] -= 1
+
+    async def add(self, dn, attributes):
+        return await self.execute('addRequest', add_operation(dn, attributes, True))
+
+    async def modify(self, dn, changes):
+        return await self.execute('modifyRequest', modify_operation(dn, changes, True))
+
+    async def delete(self, dn):
+        return await self.execute('delRequest', delete_operation(dn))
+
+    async def close(self):
+        await asyncio.gather(*[c.close() for c in self.conns], return_exceptions=True)
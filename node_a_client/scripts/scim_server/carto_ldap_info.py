@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Cache de Server Info / Schema LDAP)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_ldap_info.py
+# Descrição: Root DSE + schema do slapd baixados uma única vez.
+#            - Cache em disco por host:porta, invalidado quando a versão
+#              do subschema (entryCSN / modifyTimestamp) muda.
+#            - Cache em memória compartilhado por todas as conexões do
+#              processo: nenhum bind volta a pedir o schema ao servidor.
+# ============================================================
+
+import json
+import os
+import threading
+import time
+
+from ldap3 import Server, Connection, ALL, NONE, BASE
+from ldap3.protocol.rfc4512 import DsaInfo, SchemaInfo
+
+CACHE_DIR = "/var/cache/carto/ldap_info"
+
+_memoria = {}               # (host, porta, ssl) -> (DsaInfo, SchemaInfo)
+_lock = threading.Lock()
+ultimo_carregamento = {}    # origem, csn, segundos (para o relatório do jogador)
+
+def _valor(response, attr):
+    for entry in response or []:
+        vals = entry.get('raw_attributes', {}).get(attr)
+        if vals:
+            return vals[0].decode('utf-8', 'replace')
+    return None
+
+def schema_csn(host, port, use_ssl=False, connect_timeout=None, user=None, password=None):
+    """ Versão do schema publicado (duas buscas BASE pequenas); None se inacessível """
+    server = Server(host, port=port, use_ssl=use_ssl, get_info=NONE, connect_timeout=connect_timeout)
+    try:
+        conn = Connection(server, user, password, auto_bind=True, receive_timeout=connect_timeout)
+        conn.search('', '(objectClass=*)', BASE, attributes=['subschemaSubentry'])
+        subschema = _valor(conn.response, 'subschemaSubentry') or 'cn=Subschema'
+        conn.search(subschema, '(objectClass=subschema)', BASE, attributes=['entryCSN', 'modifyTimestamp'])
+        csn = _valor(conn.response, 'entryCSN') or _valor(conn.response, 'modifyTimestamp')
+        conn.unbind()
+        return csn
+    except Exception:
+        return None
+
+def _baixar(host, port, use_ssl, connect_timeout, user, password):
+    """ Leitura completa (o que get_info=ALL fazia em todo bind) """
+    server = Server(host, port=port, use_ssl=use_ssl, get_info=ALL, connect_timeout=connect_timeout)
+    conn = Connection(server, user, password, auto_bind=True, receive_timeout=connect_timeout)
+    conn.unbind()
+    if server.info is None or server.schema is None:
+        raise ValueError("Servidor não publicou root DSE/schema")
+    return server.info, server.schema
+
+def _arquivo(cache_dir, host, port):
+    return os.path.join(cache_dir, f"{host}_{port}.json")
+
+def _carregar(host, port, use_ssl, connect_timeout, user, password, cache_dir):
+    path = _arquivo(cache_dir, host, port)
+    csn = schema_csn(host, port, use_ssl, connect_timeout, user, password)
+
+    cache = None
+    if os.path.exists(path):
+        try:
+            with open(path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = None
+
+    # Cache vale se o CSN bate; sem CSN (servidor inacessível agora) usa o que houver
+    if cache and (csn is None or cache.get('csn') == csn):
+        schema = SchemaInfo.from_json(cache['schema'])
+        return DsaInfo.from_json(cache['info'], schema), schema, 'disco', cache.get('csn')
+
+    info, schema = _baixar(host, port, use_ssl, connect_timeout, user, password)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({'host': host, 'port': port, 'csn': csn,
+                       'info': info.to_json(), 'schema': schema.to_json()}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+    return info, schema, 'servidor', csn
+
+def cached_server(host, port=389, use_ssl=False, connect_timeout=None, user=None, password=None,
+                  cache_dir=CACHE_DIR):
+    """ Server do ldap3 com DSE/schema pré-carregados e get_info=NONE.
+
+    A primeira chamada do processo resolve o cache (memória -> disco -> servidor);
+    as demais só montam o objeto. Se nada puder ser obtido, devolve um Server sem
+    info, e a conexão segue normalmente (as operações não dependem do schema).
+    """
+    key = (host, port, use_ssl)
+    with _lock:
+        if key not in _memoria:
+            start = time.monotonic()
+            try:
+                info, schema, origem, csn = _carregar(host, port, use_ssl, connect_timeout, user, password, cache_dir)
+                _memoria[key] = (info, schema)
+            except Exception:
+                origem, csn = 'indisponível', None
+                _memoria[key] = None
+            ultimo_carregamento.update(origem=origem, csn=csn, segundos=time.monotonic() - start)
+
+    cached = _memoria[key]
+    if cached is None:
+        return Server(host, port=port, use_ssl=use_ssl, get_info=NONE, connect_timeout=connect_timeout)
+    server = Server.from_definition(host, cached[0], cached[1], port=port, use_ssl=use_ssl)
+    # from_definition liga get_info=ALL, o que refaria a leitura a cada bind
+    server.get_info = NONE
+    server.connect_timeout = connect_timeout
+    return server
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Proxy de Degradação em Espaço de Usuário)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_proxy.py
+# Descrição: Substituto local do tc/netem para os jogadores SCIM e LDAP.
+#            - Proxy TCP asyncio entre jogador e servidor, com os mesmos
+#              cenários do menu (carto_rede.py): atraso, jitter, perda e
+#              banda. Sem root, sem NIC real: roda em loopback / CI.
+#            - Perda num fluxo TCP não some com bytes: cada segmento
+#              (MSS) perdido segura a entrega por um RTO (200 ms + RTT),
+#              que dobra a cada nova perda do mesmo segmento, e o que vem
+#              atrás espera (head-of-line), como a retransmissão do kernel.
+#              SYN perdido atrasa a conexão em 1 s, 2 s, 4 s...
+#            - Banda: fila única por sentido para todas as conexões (como
+#              a qdisc da interface); atraso + jitter por bloco, sem
+#              reordenar dentro da conexão.
+#            - Sentido "ida" (padrão) = egress do nó A, como o netem dos
+#              jogadores; "ambos" degrada também as respostas.
+#            - Uso: python3 carto_proxy.py 127.0.0.1:389 --porta 3890 --cenario 2
+# ============================================================
+
+import argparse
+import asyncio
+import multiprocessing as mp
+import random
+import sys
+
+from carto_rede import CENARIOS, BASELINE, descrever, personalizado
+
+MSS = 1448                  # bytes por segmento TCP (Ethernet, com timestamps)
+RTO_MIN = 0.2               # s, mínimo do RTO no Linux
+RTO_MAX = 120.0             # s, teto do backoff exponencial
+SYN_RTO = 1.0               # s, RTO inicial do SYN (TCP_TIMEOUT_INIT)
+LEITURA = 65536             # bytes por leitura de socket
+FILA_MAX = 256              # blocos aguardando entrega por sentido de cada conexão
+SENTIDOS = ("ida", "ambos")
+
+class Enlace:
+    """ Um sentido do enlace degradado, compartilhado por todas as conexões """
+    def __init__(self, cenario, rtt, semente=None):
+        self.cenario = cenario
+        self.rto = RTO_MIN + rtt
+        self.rng = random.Random(semente)
+        self.livre = 0.0            # fim da transmissão do último bloco (banda)
+        self.bytes = 0
+        self.segmentos = 0
+        self.perdidos = 0
+        self.parado = 0.0           # s somados de retransmissão
+
+    def _perdido(self):
+        return self.cenario.perda and self.rng.random() * 100 < self.cenario.perda
+
+    def retransmissao(self, rto):
+        """ Espera até o segmento passar: cada tentativa perdida custa um RTO, que dobra """
+        espera = 0.0
+        while self._perdido():
+            self.perdidos += 1
+            espera += rto
+            rto = min(rto * 2, RTO_MAX)
+        return espera
+
+    def agendar(self, n, agora):
+        """ Horário (loop.time) de entrega de n bytes lidos agora """
+        segmentos = -(-n // MSS)
+        self.bytes += n
+        self.segmentos += segmentos
+        inicio = max(agora, self.livre)
+        self.livre = inicio + (n * 8 / (self.cenario.banda * 1000) if self.cenario.banda else 0.0)
+        # Segmentos do bloco perdem-se de forma independente; o bloco sai com o pior
+        parada = max(self.retransmissao(self.rto) for _ in range(segmentos))
+        self.parado += parada
+        jitter = self.rng.uniform(-self.cenario.jitter, self.cenario.jitter) if self.cenario.jitter else 0
+        return self.livre + max(0.0, self.cenario.atraso + jitter) / 1000 + parada
+
+    def handshake(self):
+        """ s até o SYN passar (1 s, 2 s, 4 s... por SYN perdido) """
+        return self.retransmissao(SYN_RTO)
+
+class ProxyDegradado:
+    """ Servidor asyncio: aceita o jogador, conecta no destino e bombeia os dois sentidos """
+    def __init__(self, cenario, destino, porta_destino, sentido="ida", semente=None):
+        self.cenario = cenario
+        self.destino = destino
+        self.porta_destino = porta_destino
+        rtt = cenario.atraso / 1000 * (2 if sentido == "ambos" else 1)
+        self.ida = Enlace(cenario, rtt, semente)
+        self.volta = Enlace(cenario if sentido == "ambos" else BASELINE, rtt,
+                            None if semente is None else semente + 1)
+        self.conexoes = 0
+        self.falhas = 0
+        self.syn_espera = 0.0
+        self.servidor = None
+        self.ativas = set()         # Conexões abertas (o pool do jogador mantém várias vivas)
+
+    async def iniciar(self, porta=0, host="127.0.0.1"):
+        self.servidor = await asyncio.start_server(self._conexao, host, porta)
+        return self.servidor.sockets[0].getsockname()[1]
+
+    async def fechar(self):
+        self.servidor.close()
+        for tarefa in self.ativas:
+            tarefa.cancel()
+        await asyncio.gather(*self.ativas, return_exceptions=True)
+        await self.servidor.wait_closed()
+
+    async def _conexao(self, leitor_cliente, escritor_cliente):
+        tarefa = asyncio.current_task()
+        self.ativas.add(tarefa)
+        try:
+            await self._encaminhar(leitor_cliente, escritor_cliente)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.ativas.discard(tarefa)
+            escritor_cliente.close()
+
+    async def _encaminhar(self, leitor_cliente, escritor_cliente):
+        self.conexoes += 1
+        # Handshake atravessa o enlace: 1 RTT + SYNs perdidos
+        espera = self.ida.handshake() + self.volta.handshake()
+        self.syn_espera += espera
+        await asyncio.sleep(espera + (self.cenario.atraso + self.volta.cenario.atraso) / 1000)
+        try:
+            leitor_servidor, escritor_servidor = await asyncio.open_connection(self.destino, self.porta_destino)
+        except OSError:
+            self.falhas += 1
+            return
+        try:
+            await asyncio.gather(self._bombear(leitor_cliente, escritor_servidor, self.ida),
+                                 self._bombear(leitor_servidor, escritor_cliente, self.volta),
+                                 return_exceptions=True)
+        finally:
+            escritor_servidor.close()
+
+    async def _bombear(self, leitor, escritor, enlace):
+        """ Um sentido da conexão: lê, agenda no enlace e entrega em ordem no horário """
+        loop = asyncio.get_running_loop()
+        fila = asyncio.Queue(FILA_MAX)
+
+        async def entregar():
+            quebrado = False
+            while True:
+                quando, dados = await fila.get()
+                if dados is None:
+                    break
+                if quebrado:
+                    continue        # Outra ponta caiu: só esvazia a fila
+                try:
+                    await asyncio.sleep(max(0.0, quando - loop.time()))
+                    escritor.write(dados)
+                    await escritor.drain()
+                except (OSError, RuntimeError):
+                    quebrado = True
+            if not quebrado and escritor.can_write_eof():
+                try: escritor.write_eof()
+                except OSError: pass
+
+        tarefa = asyncio.ensure_future(entregar())
+        ultimo = 0.0
+        try:
+            while True:
+                dados = await leitor.read(LEITURA)
+                if not dados:
+                    break
+                # TCP entrega em ordem: jitter nunca passa um bloco à frente do anterior
+                ultimo = max(ultimo, enlace.agendar(len(dados), loop.time()))
+                await fila.put((ultimo, dados))
+        except OSError:
+            pass
+        except asyncio.CancelledError:
+            # Proxy encerrando: não espera blocos ainda "em trânsito"
+            tarefa.cancel()
+            raise
+        await fila.put((0.0, None))
+        await tarefa
+
+    def resumo(self):
+        return {"cenario": self.cenario.nome, "conexoes": self.conexoes, "falhas": self.falhas,
+                "syn_espera": self.syn_espera,
+                **{f"{nome}_{k}": getattr(e, k) for nome, e in (("ida", self.ida), ("volta", self.volta))
+                   for k in ("bytes", "segmentos", "perdidos", "parado")}}
+
+def imprimir_resumo(r):
+    print(f"[PROXY] Cenário: {r['cenario']} | Conexões: {r['conexoes']} (falhas: {r['falhas']}, "
+          f"SYN retransmitido: {r['syn_espera']:.1f} s)")
+    for nome in ("ida", "volta"):
+        print(f"[PROXY] {nome.capitalize():<5}: {r[f'{nome}_bytes']} bytes | {r[f'{nome}_segmentos']} segmentos | "
+              f"{r[f'{nome}_perdidos']} perdidos | {r[f'{nome}_parado']:.1f} s em retransmissão")
+
+# ============================================================
+# USO PELOS JOGADORES (PROCESSO SEPARADO)
+# ============================================================
+def _servir(cenario, destino, porta_destino, sentido, semente, porta, canal):
+    async def principal():
+        proxy = ProxyDegradado(cenario, destino, porta_destino, sentido, semente)
+        canal.send(await proxy.iniciar(porta))
+        # Espera o "parar" do jogador sem bloquear o loop
+        await asyncio.get_running_loop().run_in_executor(None, canal.recv)
+        await proxy.fechar()
+        canal.send(proxy.resumo())
+    try:
+        asyncio.run(principal())
+    except OSError as e:
+        canal.send(e)
+
+class ProxyLocal:
+    """ Proxy num processo à parte (não disputa o GIL com as threads do jogador) """
+    def __init__(self, cenario, destino, porta_destino, sentido="ida", semente=None, porta=0):
+        self.args = (cenario, destino, porta_destino, sentido, semente, porta)
+        self.porta = None
+        self.processo = None
+        self.canal = None
+
+    def iniciar(self):
+        """ Sobe o proxy; devolve a porta local (127.0.0.1) """
+        self.canal, filho = mp.Pipe()
+        self.processo = mp.Process(target=_servir, args=self.args + (filho,), daemon=True)
+        self.processo.start()
+        resposta = self.canal.recv()
+        if isinstance(resposta, Exception):
+            self.processo.join()
+            raise resposta
+        self.porta = resposta
+        return self.porta
+
+    def parar(self):
+        """ Encerra o proxy; devolve o resumo (contadores de perda / retransmissão) """
+        self.canal.send("parar")
+        resumo = self.canal.recv() if self.canal.poll(5) else None
+        self.processo.join(5)
+        if self.processo.is_alive():
+            self.processo.terminate()
+        return resumo
+
+# ============================================================
+# USO DIRETO
+# ============================================================
+def main():
+    parser = argparse.ArgumentParser(description="Proxy TCP com atraso, jitter, perda e banda (netem em espaço de usuário)")
+    parser.add_argument("destino", help="HOST:PORTA do servidor (ex.: 127.0.0.1:389)")
+    parser.add_argument("--porta", type=int, default=0, help="porta local (padrão: livre)")
+    parser.add_argument("--cenario", type=int, choices=sorted(CENARIOS), help="cenário da tabela dos jogadores")
+    parser.add_argument("--atraso", type=int, default=0, help="ms (sem --cenario)")
+    parser.add_argument("--perda", type=float, default=0, help="%% (sem --cenario)")
+    parser.add_argument("--jitter", type=int, default=0, help="ms")
+    parser.add_argument("--banda", type=float, help="kbit/s")
+    parser.add_argument("--sentido", choices=SENTIDOS, default="ida")
+    parser.add_argument("--semente", type=int, help="semente das perdas / jitter (reprodutível)")
+    args = parser.parse_args()
+
+    host, _, porta = args.destino.rpartition(":")
+    if args.cenario is not None:
+        cenario = CENARIOS[args.cenario]
+        cenario = cenario._replace(jitter=args.jitter or cenario.jitter, banda=args.banda or cenario.banda)
+    else:
+        cenario = personalizado(args.atraso, args.perda, args.jitter, args.banda)
+
+    async def principal():
+        proxy = ProxyDegradado(cenario, host, int(porta), args.sentido, args.semente)
+        local = await proxy.iniciar(args.porta)
+        print(f"[PROXY] 127.0.0.1:{local} -> {host}:{porta} | {cenario.nome} ({descrever(cenario)}, sentido {args.sentido})")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            imprimir_resumo(proxy.resumo())
+
+    try:
+        asyncio.run(principal())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    sys.exit(main())
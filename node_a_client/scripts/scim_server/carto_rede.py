@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Tabela Única de Cenários de Rede)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_rede.py
+# Descrição: Cenários DIL usados pelos jogadores SCIM e LDAP.
+#            - Uma tabela só (atraso, jitter, perda, banda) para o menu,
+#              para a regra tc/netem e para o proxy local (carto_proxy.py).
+#            - Numeração e pastas iguais às dos juízes do nó B
+#              (00_Baseline ... 06_Degradacao_total).
+# ============================================================
+
+from collections import namedtuple
+
+# atraso / jitter em ms, perda em %, banda em kbit/s (None = sem limite)
+Cenario = namedtuple("Cenario", "nome pasta atraso perda jitter banda", defaults=(0, None))
+
+CENARIOS = {
+    0: Cenario("Baseline", "00_Baseline", 0, 0),
+    1: Cenario("Satélite", "01_Satelite", 600, 1),
+    2: Cenario("Rádio Tático", "02_Radio_Tatico", 100, 5),
+    3: Cenario("Desastre", "03_Desastre", 200, 15),
+    4: Cenario("Caos Extremo", "04_Caos", 500, 40),
+    5: Cenario("Degradação Parcial", "05_Degradacao_parcial", 800, 70),
+    6: Cenario("Degradação Total", "06_Degradacao_total", 1200, 95),
+}
+BASELINE = CENARIOS[0]
+
+MODOS_REDE = ("netem", "proxy")
+
+def limpo(cenario):
+    """ Sem degradação nenhuma (nada a aplicar) """
+    return not (cenario.atraso or cenario.perda or cenario.jitter or cenario.banda)
+
+def descrever(cenario):
+    partes = [f"{cenario.atraso}ms" + (f" ±{cenario.jitter}ms" if cenario.jitter else ""), f"{cenario.perda:g}% loss"]
+    if cenario.banda:
+        partes.append(f"{cenario.banda:g} kbit/s")
+    return ", ".join(partes)
+
+def personalizado(atraso=0, perda=0, jitter=0, banda=None):
+    """ Cenário fora da tabela (linha de comando do jogador_fragmentado.py) """
+    c = Cenario("Personalizado", "99_Geral", atraso, perda, jitter, banda)
+    return c._replace(nome=f"Personalizado ({descrever(c)})")
+
+def regra_netem(interface, cenario):
+    """ Comando tc equivalente ao cenário (egress da interface) """
+    regra = f"tc qdisc add dev {interface} root netem delay {cenario.atraso}ms"
+    if cenario.jitter:
+        regra += f" {cenario.jitter}ms"
+    regra += f" loss {cenario.perda:g}%"
+    if cenario.banda:
+        regra += f" rate {cenario.banda:g}kbit"
+    return regra
+
+def escolher_cenario():
+    """ Menu de cenários dos jogadores; opção inválida = Baseline """
+    print("\n" + "=" * 50)
+    print("SELECIONE O CENÁRIO DE REDE:")
+    print("-" * 50)
+    for opt, c in CENARIOS.items():
+        print(f"{opt}) {c.nome} ({descrever(c)})")
+    print("=" * 50)
+    try:
+        return CENARIOS.get(int(input("Opção: ")), BASELINE)
+    except ValueError:
+        return BASELINE
+
+def escolher_modo_rede(root=True):
+    """ netem (kernel, exige root e a interface real) ou proxy local em espaço de usuário """
+    if not root:
+        print("\n[AVISO] Sem ROOT: degradação pelo proxy local (carto_proxy.py).")
+        return "proxy"
+    print("\nDEGRADAÇÃO DA REDE:")
+    print("1) tc/netem na interface (laboratório A <-> B)")
+    print("2) Proxy local em espaço de usuário (sem root, loopback / CI)")
+    return "proxy" if input("Opção [1]: ").strip() == "2" else "netem"
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.2 (Retry Contínuo por Item + Histograma de Latência)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_retry.py
+# Descrição: Agendador de re-tentativas usado pelos jogadores SCIM.
+#            - Cada item que falha volta sozinho para a fila, com
+#              backoff exponencial limitado e jitter (sem ronda global).
+#            - Orçamento de retries (token bucket) limita a taxa de
+#              re-tentativas quando quase nada tem sucesso.
+#            - Circuit breaker pausa o envio nas janelas de perda total.
+#            - Latência de cada requisição em histogramas (geral e por
+#              tentativa: a 1a ida de cada item e as re-tentativas).
+#            - Falha permanente (entrada inexistente, rejeitada) encerra o
+#              item sem sucesso: contada em FAILED, nunca re-tentada.
+# ============================================================
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+
+from carto_histograma import Histograma
+
+# --- BACKOFF ---
+BACKOFF_BASE = 0.2          # s, teto do atraso da 1a re-tentativa
+BACKOFF_CAP = 10.0          # s, teto absoluto do atraso
+
+# --- ORÇAMENTO DE RETRIES ---
+BUDGET_RATIO = 0.2          # Re-tentativas "ganhas" a cada sucesso
+BUDGET_MIN_RATE = 20.0      # Re-tentativas/s sempre liberadas, mesmo sem sucesso
+BUDGET_BURST = 200.0        # Saldo máximo acumulado
+
+# --- CIRCUIT BREAKER ---
+BREAKER_WINDOW = 50         # Últimas requisições avaliadas
+BREAKER_RATIO = 0.9         # Fração de falhas na janela que abre o circuito
+BREAKER_COOLDOWN = 2.0      # s aberto antes da primeira sonda
+BREAKER_COOLDOWN_MAX = 30.0 # s, teto do cooldown (dobra a cada sonda falha)
+
+# --- LATÊNCIA ---
+TENTATIVAS_HIST = 5         # Histogramas por tentativa: 1, 2, ..., 5+
+
+DONE_STATUSES = ("SUCCESS", "ALREADY_EXISTS")
+# Resposta definitiva do servidor, mas sem sucesso: re-tentar não muda nada
+FAILED_STATUSES = ("NOT_FOUND", "REJECTED")
+FINAL_STATUSES = DONE_STATUSES + FAILED_STATUSES
+CONGESTION_STATUSES = ("CONN_ERROR", "SERVER_ERROR")
+
+class Backoff:
+    """ Backoff exponencial com teto e 'full jitter' """
+    def __init__(self, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt):
+        # attempt = número de falhas do item (1 na primeira re-tentativa)
+        return random.uniform(0, min(self.cap, self.base * (2 ** min(attempt - 1, 32))))
+
+class RetryBudget:
+    """ Token bucket de re-tentativas.
+
+    Sucessos depositam BUDGET_RATIO tokens e o tempo deposita BUDGET_MIN_RATE
+    tokens/s. Re-tentativas nunca são descartadas (o teste é persistente):
+    sem saldo, a re-tentativa é adiada pelo tempo necessário para pagar a dívida.
+    """
+    def __init__(self, ratio=BUDGET_RATIO, min_rate=BUDGET_MIN_RATE, burst=BUDGET_BURST):
+        self.ratio = ratio
+        self.min_rate = min_rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.min_rate)
+        self.last = now
+
+    def deposit(self):
+        self._refill()
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def reserve(self):
+        """ Consome um token; devolve o atraso extra (s) se o saldo ficou negativo """
+        self._refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.min_rate
+
+class CircuitBreaker:
+    """ Abre quando a taxa de falha da janela passa de BREAKER_RATIO.
+
+    Aberto, ninguém envia até o cooldown vencer; então uma única sonda passa
+    (meio-aberto). Sonda com sucesso fecha o circuito, sonda com falha reabre
+    com o cooldown dobrado.
+    """
+    CLOSED, OPEN, HALF_OPEN = "FECHADO", "ABERTO", "MEIO-ABERTO"
+
+    def __init__(self, window=BREAKER_WINDOW, ratio=BREAKER_RATIO,
+                 cooldown=BREAKER_COOLDOWN, cooldown_max=BREAKER_COOLDOWN_MAX):
+        self.ratio = ratio
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self.results = deque(maxlen=window)
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.opens = 0
+        self.paused = 0.0           # s acumulados fora do estado fechado
+        self._open_since = None
+        self._probing = False
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        if self._open_since is None:
+            self._open_since = self.opened_at
+            self.opens += 1
+        self.results.clear()
+
+    async def acquire(self):
+        """ Espera o circuito permitir o envio; devolve True se este envio é a sonda """
+        while True:
+            if self.state == self.CLOSED:
+                break
+            if self.state == self.OPEN:
+                remaining = self.opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    await asyncio.sleep(remaining)
+                    continue
+                self.state = self.HALF_OPEN
+            if not self._probing:
+                self._probing = True
+                return True
+            await asyncio.sleep(min(0.25, self.cooldown))
+        return False
+
+    def record(self, ok, probe=False):
+        if probe:
+            self._probing = False
+            if ok:
+                self.state = self.CLOSED
+                self.cooldown = self.base_cooldown
+                self.paused += time.monotonic() - self._open_since
+                self._open_since = None
+            else:
+                self.cooldown = min(self.cooldown_max, self.cooldown * 2)
+                self._open()
+            return
+        if self.state != self.CLOSED:
+            return  # Resposta de requisição enviada antes de abrir
+        self.results.append(ok)
+        if len(self.results) == self.results.maxlen:
+            if self.results.count(False) / len(self.results) >= self.ratio:
+                self._open()
+
+async def run_with_retry(items, send, concurrency, batch_size=1, backoff=None, budget=None,
+                         breaker=None, limiter=None, progress_interval=2.0, total=None):
+    """ Processa `items` até todos convergirem, sem barreira de ronda.
+
+    `send(batch)` recebe uma lista de itens (1 no modo individual) e devolve
+    [(item, status), ...]. Status em DONE_STATUSES encerra o item; em
+    FAILED_STATUSES também, contado em stats["FAILED"]; qualquer outro
+    agenda a re-tentativa só daquele item. Há `concurrency` workers e
+    cada um tem no máximo uma requisição em voo; com `limiter` (AIMD), as
+    requisições em voo ficam limitadas à janela adaptativa.
+
+    stats["LATENCIA"] é o histograma do tempo de `send` de todas as requisições
+    (inclusive as que falharam, que formam a cauda); stats["LATENCIA_TENTATIVAS"]
+    separa por tentativa do item mais atrasado do lote ("1", "2", ..., "5+").
+    """
+    backoff = backoff or Backoff()
+    budget = budget or RetryBudget()
+    breaker = breaker or CircuitBreaker()
+
+    fresh = iter(items)
+    fresh_done = False
+    heap = []                   # (pronto_em, seq, item) das re-tentativas
+    attempts = {}               # item -> falhas acumuladas (só itens que falharam)
+    seq = itertools.count()
+    wake = asyncio.Event()
+    in_flight = 0
+    stats = {"REQUESTS": 0, "RETRIES": 0, "MAX_ATTEMPTS": 0, "DONE": 0, "FAILED": 0,
+             "LATENCIA": Histograma(), "LATENCIA_TENTATIVAS": {}}
+    start = time.monotonic()
+
+    def take():
+        nonlocal fresh_done
+        now = time.monotonic()
+        batch = []
+        while heap and heap[0][0] <= now and len(batch) < batch_size:
+            batch.append(heapq.heappop(heap)[2])
+        while not fresh_done and len(batch) < batch_size:
+            try: batch.append(next(fresh))
+            except StopIteration: fresh_done = True
+        return batch
+
+    async def worker():
+        nonlocal in_flight
+        while True:
+            batch = take()
+            if not batch:
+                if fresh_done and not heap and in_flight == 0:
+                    wake.set()
+                    return
+                wait = heap[0][0] - time.monotonic() if heap else None
+                wake.clear()
+                try: await asyncio.wait_for(wake.wait(), wait)
+                except asyncio.TimeoutError: pass
+                continue
+
+            in_flight += 1
+            probe = await breaker.acquire()
+            started = await limiter.acquire() if limiter else None
+            stats["REQUESTS"] += 1
+            tentativa = max(attempts.get(item, 0) for item in batch) + 1
+            sent_at = time.monotonic()
+            try:
+                results = await send(batch)
+            except Exception:
+                results = [(item, "CONN_ERROR") for item in batch]
+            ok = False
+            now = time.monotonic()
+            stats["LATENCIA"].registrar(now - sent_at)
+            rotulo = str(tentativa) if tentativa < TENTATIVAS_HIST else f"{TENTATIVAS_HIST}+"
+            stats["LATENCIA_TENTATIVAS"].setdefault(rotulo, Histograma()).registrar(now - sent_at)
+            for item, status in results:
+                stats[status] = stats.get(status, 0) + 1
+                if status in DONE_STATUSES:
+                    ok = True
+                    stats["DONE"] += 1
+                    attempts.pop(item, None)
+                    budget.deposit()
+                elif status in FAILED_STATUSES:
+                    # O servidor respondeu: não é congestionamento nem motivo de retry
+                    ok = True
+                    stats["FAILED"] += 1
+                    attempts.pop(item, None)
+                else:
+                    n = attempts.get(item, 0) + 1
+                    attempts[item] = n
+                    stats["RETRIES"] += 1
+                    stats["MAX_ATTEMPTS"] = max(stats["MAX_ATTEMPTS"], n)
+                    heapq.heappush(heap, (now + backoff.delay(n) + budget.reserve(), next(seq), item))
+            breaker.record(ok, probe)
+            if limiter:
+                congested = any(status in CONGESTION_STATUSES for _, status in results)
+                await limiter.release(started, "ok" if ok else "congestion" if congested else "fail")
+            in_flight -= 1
+            wake.set()
+
+    async def progress():
+        while True:
+            await asyncio.sleep(progress_interval)
+            alvo = f" / {total}" if total else ""
+            janela = f" | Janela: {limiter.controller.limit}" if limiter else ""
+            falhas = f" (+{stats['FAILED']} falhas definitivas)" if stats["FAILED"] else ""
+            print(f"    [PROGRESSO] {time.monotonic() - start:6.1f}s | Concluídos: {stats['DONE']}{alvo}{falhas} | "
+                  f"Em voo: {in_flight} | Aguardando retry: {len(heap)} | Circuito: {breaker.state}{janela}")
+
+    reporter = asyncio.create_task(progress()) if progress_interval else None
+    try:
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    finally:
+        if reporter: reporter.cancel()
+
+    stats["BREAKER_OPENS"] = breaker.opens
+    stats["BREAKER_PAUSED"] = breaker.paused
+    stats["ELAPSED"] = time.monotonic() - start
+    return stats
+
+def imprimir_latencias(stats, label, extra=None):
+    """ Bloco [LATENCIA] dos relatórios (geral + por tentativa) e gravação do histograma """
+    from carto_histograma import salvar
+    print(f"[LATENCIA] Geral.........: {stats['LATENCIA'].linha()}")
+    tentativas = stats["LATENCIA_TENTATIVAS"]
+    for rotulo in sorted(tentativas, key=lambda r: int(r.rstrip("+"))):
+        print(f"[LATENCIA] Tentativa {rotulo:<4}: {tentativas[rotulo].linha()}")
+    histogramas = {"geral": stats["LATENCIA"]}
+    histogramas.update({f"tentativa_{r}": h for r, h in tentativas.items()})
+    try:
+        print(f"[LATENCIA] Histograma....: {salvar(histogramas, label, extra=extra)}")
+    except OSError as e:
+        print(f"[AVISO] Histograma não gravado: {e}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.1 (Carga em Malha Aberta / Taxa Controlada)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_taxa.py
+# Descrição: Gerador de carga em malha aberta para os jogadores SCIM e LDAP.
+#            - As operações saem numa agenda de chegadas (taxa fixa,
+#              Poisson ou rampa), não "assim que houver vaga".
+#            - Latência medida a partir do instante PLANEJADO de envio:
+#              fila e atraso de disparo entram na conta (sem omissão
+#              coordenada quando o servidor engasga).
+#            - Série por segundo PLANEJADO (oferecido x concluído x
+#              latência) e estimativa da taxa sustentável do cenário: p99
+#              da latência abaixo do limiar, que cresce com o atraso do
+#              cenário (limiar_para) ou vem da linha de comando.
+# ============================================================
+
+import asyncio
+import math
+import os
+import random
+import time
+from datetime import datetime
+
+from carto_histograma import Histograma, salvar
+from carto_retry import DONE_STATUSES
+
+# --- PARÂMETROS PADRÃO ---
+PERFIS = ("fixa", "poisson", "rampa")
+EM_VOO_MAX = 1000           # Teto de requisições simultâneas (proteção do cliente)
+LIMIAR_LATENCIA = 1.0       # s, p99 máximo (desde o planejado) de um segundo "sustentado" sem atraso de rede
+PERCENTIL_SUSTENTADO = 99   # Percentil da latência comparado ao limiar (o máximo é uma retransmissão só)
+LIMIAR_CONCLUSAO = 0.95     # Fração do oferecido que precisa concluir no segundo
+AQUECIMENTO = 1             # s iniciais fora da estimativa da taxa sustentável
+TOLERANCIA_DISPARO = 0.005  # s de atraso no disparo ainda considerados "no horário"
+
+LOG_DIR = "/opt/resultados/malha_aberta"
+
+def instantes(perfil, n, taxa, taxa_final=None, semente=None):
+    """ Instantes planejados (s desde o início) das n chegadas, em ordem.
+
+    fixa: intervalo constante 1/taxa
+    poisson: intervalos exponenciais de média 1/taxa (semente = agenda reprodutível)
+    rampa: taxa cresce linearmente de `taxa` a `taxa_final` ao longo das n chegadas
+    """
+    if taxa <= 0:
+        raise ValueError("A taxa deve ser positiva")
+    if perfil == "fixa":
+        for k in range(n):
+            yield k / taxa
+    elif perfil == "poisson":
+        rng = random.Random(semente)
+        t = 0.0
+        for _ in range(n):
+            yield t
+            t += rng.expovariate(taxa)
+    elif perfil == "rampa":
+        r0, r1 = taxa, taxa_final or taxa
+        duracao = 2 * n / (r0 + r1)
+        a = (r1 - r0) / (2 * duracao)
+        # Chegadas acumuladas N(t) = r0*t + a*t^2; a k-ésima sai em N(t) = k
+        for k in range(n):
+            yield k / r0 if a == 0 else (-r0 + math.sqrt(r0 * r0 + 4 * a * k)) / (2 * a)
+    else:
+        raise ValueError(f"Perfil desconhecido: {perfil} (use {', '.join(PERFIS)})")
+
+def limiar_para(atraso_ms=0, jitter_ms=0, base=LIMIAR_LATENCIA):
+    """ Limiar de latência (s) do cenário: base + ida e volta com o pior jitter """
+    return base + 2 * (atraso_ms + jitter_ms) / 1000
+
+def descrever(perfil, taxa, taxa_final=None):
+    if perfil == "rampa":
+        return f"rampa {taxa:g} -> {taxa_final:g} req/s"
+    return f"{perfil} {taxa:g} req/s"
+
+class SerieSegundo:
+    """ Contadores por segundo PLANEJADO de envio.
+
+    Oferecidas e concluídas caem no mesmo segundo (o do planejado): numa
+    rampa, o "ok" de um segundo não fica atrás do oferecido só porque as
+    respostas chegam depois. A latência de cada segundo fica num histograma
+    para o teste de percentil.
+    """
+    def __init__(self):
+        self.linhas = []
+
+    def _linha(self, segundo):
+        while len(self.linhas) <= segundo:
+            self.linhas.append({"oferecidas": 0, "concluidas": 0, "ok": 0, "soma_lat": 0.0, "max_lat": 0.0,
+                                "lat": Histograma()})
+        return self.linhas[segundo]
+
+    def oferecida(self, t):
+        self._linha(int(t))["oferecidas"] += 1
+
+    def concluida(self, t_planejado, latencia, ok):
+        linha = self._linha(int(t_planejado))
+        linha["concluidas"] += 1
+        linha["ok"] += ok
+        linha["soma_lat"] += latencia
+        linha["max_lat"] = max(linha["max_lat"], latencia)
+        linha["lat"].registrar(latencia)
+
+    def mesclar(self, outro):
+        """ Soma a série de outro processo (mesma largada) """
+        for segundo, linha in enumerate(outro.linhas):
+            minha = self._linha(segundo)
+            for k in ("oferecidas", "concluidas", "ok", "soma_lat"):
+                minha[k] += linha[k]
+            minha["max_lat"] = max(minha["max_lat"], linha["max_lat"])
+            minha["lat"].mesclar(linha["lat"])
+        return self
+
+    def sustentavel(self, limiar=LIMIAR_LATENCIA, conclusao=LIMIAR_CONCLUSAO, aquecimento=AQUECIMENTO,
+                    percentil=PERCENTIL_SUSTENTADO):
+        """ Maior taxa oferecida antes do primeiro segundo que não deu conta da carga """
+        melhor = None
+        for segundo, linha in enumerate(self.linhas):
+            if not linha["oferecidas"] or segundo < aquecimento:
+                continue
+            cauda = linha["lat"].percentil(percentil)
+            if linha["ok"] < conclusao * linha["oferecidas"] or cauda is None or cauda > limiar:
+                break
+            melhor = max(melhor or 0, linha["oferecidas"])
+        return melhor
+
+    def save(self, label, log_dir=LOG_DIR):
+        """ Grava a série; devolve o caminho do CSV """
+        os.makedirs(log_dir, exist_ok=True)
+        path = os.path.join(log_dir, f"{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+        with open(path, "w") as f:
+            f.write(f"segundo,oferecidas,concluidas,ok,lat_media_ms,lat_p{PERCENTIL_SUSTENTADO}_ms,lat_max_ms\n")
+            for segundo, l in enumerate(self.linhas):
+                media = l["soma_lat"] / l["concluidas"] * 1000 if l["concluidas"] else 0.0
+                cauda = (l["lat"].percentil(PERCENTIL_SUSTENTADO) or 0.0) * 1000
+                f.write(f"{segundo},{l['oferecidas']},{l['concluidas']},{l['ok']},{media:.3f},"
+                        f"{cauda:.3f},{l['max_lat'] * 1000:.3f}\n")
+        return path
+
+async def run_open_loop(items, send, perfil, taxa, taxa_final=None, batch_size=1,
+                        max_in_flight=EM_VOO_MAX, total=None, semente=None, limiar=LIMIAR_LATENCIA):
+    """ Dispara cada lote no seu instante planejado, sem esperar as respostas anteriores.
+
+    `send(batch)` é a mesma corrotina do carto_retry (lista de (item, status)).
+    A taxa é de requisições/s (um lote por chegada). Não há re-tentativa: cada
+    falha é contada e descartada, como no disparo único. Se `max_in_flight`
+    estourar, o disparo atrasa, mas a latência continua contada do planejado.
+
+    stats["LATENCIA"]: fim - instante planejado (o que o usuário sentiria)
+    stats["SERVICO"]: fim - envio real (o que o servidor levou)
+    stats["SUSTENTAVEL"]: maior taxa com p99 <= `limiar` (s) e conclusão >= 95%
+    """
+    stats = {"REQUESTS": 0, "ITEMS": 0, "DONE": 0, "LATE": 0, "MAX_LAG": 0.0,
+             "LATENCIA": Histograma(), "SERVICO": Histograma(), "SERIE": SerieSegundo()}
+    serie = stats["SERIE"]
+    vagas = asyncio.Semaphore(max_in_flight)
+    pendentes = set()
+    items = iter(items)
+    n = -(-total // batch_size) if total else None
+
+    async def one(batch, offset, planejado, enviado):
+        try:
+            results = await send(batch)
+        except Exception:
+            results = [(item, "CONN_ERROR") for item in batch]
+        finally:
+            vagas.release()
+        fim = time.monotonic()
+        ok = 0
+        for _, status in results:
+            stats[status] = stats.get(status, 0) + 1
+            ok += status in DONE_STATUSES
+        stats["DONE"] += ok
+        stats["LATENCIA"].registrar(fim - planejado)
+        stats["SERVICO"].registrar(fim - enviado)
+        serie.concluida(offset, fim - planejado, ok == len(results))
+
+    agenda = instantes(perfil, n if n is not None else 1 << 62, taxa, taxa_final, semente)
+    start = time.monotonic()
+    for offset in agenda:
+        batch = [item for _, item in zip(range(batch_size), items)]
+        if not batch:
+            break
+        planejado = start + offset
+        espera = planejado - time.monotonic()
+        # Mesmo atrasado, cede o loop: as respostas precisam ser processadas
+        await asyncio.sleep(max(espera, 0))
+        await vagas.acquire()
+        enviado = time.monotonic()
+        if enviado - planejado > TOLERANCIA_DISPARO:
+            stats["LATE"] += 1
+        stats["MAX_LAG"] = max(stats["MAX_LAG"], enviado - planejado)
+        stats["REQUESTS"] += 1
+        stats["ITEMS"] += len(batch)
+        serie.oferecida(offset)
+        task = asyncio.ensure_future(one(batch, offset, planejado, enviado))
+        pendentes.add(task)
+        task.add_done_callback(pendentes.discard)
+    if pendentes:
+        await asyncio.gather(*pendentes)
+
+    stats["ELAPSED"] = time.monotonic() - start
+    stats["LIMIAR"] = limiar
+    stats["SUSTENTAVEL"] = serie.sustentavel(limiar)
+    return stats
+
+def imprimir_relatorio(stats, label, extra=None):
+    """ Bloco [MALHA] dos relatórios dos jogadores + gravação da série e dos histogramas """
+    decorrido = stats["ELAPSED"]
+    print(f"[MALHA]   Requisições....: {stats['REQUESTS']} ({stats['ITEMS']} operações, {stats['DONE']} OK)")
+    print(f"[MALHA]   Taxa obtida....: {stats['DONE'] / decorrido if decorrido > 0 else 0:.1f} ops/seg OK")
+    print(f"[MALHA]   Disparos atrasados: {stats['LATE']} (máx. {stats['MAX_LAG'] * 1000:.1f} ms)")
+    sustentavel = stats["SUSTENTAVEL"]
+    print(f"[MALHA]   Taxa sustentável: {f'{sustentavel} req/s' if sustentavel else 'não atingida'} "
+          f"(>= {LIMIAR_CONCLUSAO:.0%} OK e p{PERCENTIL_SUSTENTADO} <= {stats.get('LIMIAR', LIMIAR_LATENCIA):g} s)")
+    print(f"[LATENCIA] Desde o planejado: {stats['LATENCIA'].linha()}")
+    print(f"[LATENCIA] Serviço.........: {stats['SERVICO'].linha()}")
+    try:
+        print(f"[MALHA]   Série temporal.: {stats['SERIE'].save(label)}")
+        print(f"[LATENCIA] Histograma......: "
+              f"{salvar({'planejado': stats['LATENCIA'], 'servico': stats['SERVICO']}, label, extra=extra)}")
+    except OSError as e:
+        print(f"[AVISO] Resultados não gravados: {e}")
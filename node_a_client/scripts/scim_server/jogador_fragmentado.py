@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.3 (Carga Multiprocesso + Proxy de Degradação Local)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: jogador_fragmentado.py
+# Descrição: Dispara a carga dos jogadores SCIM / LDAP em N processos.
+#            - A faixa de usuários é dividida em fragmentos, um por
+#              processo, cada um com seu próprio loop asyncio (sem GIL
+#              nem loop único limitando o cliente no Baseline).
+#            - Largada simultânea (barreira); progresso somado em memória
+#              compartilhada; contadores, histogramas e série por segundo
+#              voltam ao processo pai pelo pipe e são somados no relatório.
+#            - Modos: persistente (retry até convergir) ou malha aberta
+#              (a taxa pedida é dividida entre os processos).
+#            - Rede: cenário da tabela (carto_rede.py) por tc/netem ou pelo
+#              proxy local (carto_proxy.py, sem root): a matriz LDAP x SCIM
+#              roda inteira em loopback, reprodutível (--semente).
+#            - Uso: python3 jogador_fragmentado.py scim insert -p 8
+#                   python3 jogador_fragmentado.py ldap update -p 4 --execucao aberta --perfil poisson --taxa 2000
+#                   python3 jogador_fragmentado.py ldap insert --alvo 127.0.0.1:389 --rede proxy --cenario 2
+# ============================================================
+
+import sys
+import os
+
+# --- AUTO-VERIFICAÇÃO DE AMBIENTE VIRTUAL ---
+VENV_PYTHON = "/opt/scim_client/venv/bin/python3"
+
+if os.path.exists(VENV_PYTHON) and sys.executable != VENV_PYTHON:
+    print(f"[BOOT] Reiniciando no VENV: {VENV_PYTHON}...")
+    os.execv(VENV_PYTHON, [VENV_PYTHON] + sys.argv)
+
+# --- A PARTIR DAQUI, ESTAMOS NO AMBIENTE SEGURO ---
+import argparse
+import asyncio
+import importlib
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.connection import wait
+
+from carto_histograma import Histograma
+from carto_retry import run_with_retry, imprimir_latencias, FINAL_STATUSES
+from carto_taxa import run_open_loop, imprimir_relatorio, descrever, limiar_para, SerieSegundo, PERFIS, EM_VOO_MAX
+from carto_rede import CENARIOS, MODOS_REDE, personalizado, limpo, descrever as descrever_rede
+from carto_proxy import ProxyLocal, SENTIDOS, imprimir_resumo as imprimir_proxy
+
+JOGADORES = {"scim": "scim_py_jogador_master", "ldap": "ldap_py_jogador_master"}
+MAXIMOS = ("MAX_ATTEMPTS", "MAX_LAG", "ELAPSED", "LIMIAR")
+LARGADA_TIMEOUT = 60        # s esperando todos os processos ficarem prontos
+PROGRESSO_INTERVALO = 2.0   # s entre linhas de progresso do pai
+
+# ============================================================
+# FRAGMENTOS (PROCESSOS FILHOS)
+# ============================================================
+def fatias(total, n):
+    """ n faixas [inicio, fim) contíguas cobrindo 0..total, tamanhos diferindo de no máximo 1 """
+    base, resto = divmod(total, n)
+    limites = [0]
+    for k in range(n):
+        limites.append(limites[-1] + base + (k < resto))
+    return list(zip(limites, limites[1:]))
+
+def configurar(jogador, args):
+    """ Alvo e tamanho da carga no módulo do jogador (no pai e em cada filho) """
+    jogador.TOTAL_USERS = args.usuarios
+    if not args.alvo:
+        return
+    host, _, porta = args.alvo.partition(":")
+    if args.protocolo == "scim":
+        jogador.SERVER_ROOT = f"http://{host}:{porta or 5000}"
+        jogador.SERVER_BASE = f"{jogador.SERVER_ROOT}/Users"
+        jogador.SERVER_BULK = f"{jogador.SERVER_ROOT}/Bulk"
+    else:
+        jogador.LDAP_HOST = host
+        jogador.LDAP_PORT = int(porta or jogador.LDAP_PORT)
+
+async def executar_fragmento(jogador, indice, args, inicio, fim, largada, progresso):
+    """ Roda um fragmento no motor asyncio do jogador; devolve os stats de carto_retry/carto_taxa """
+    aberta = args.execucao == "aberta"
+    fechar = None
+    if args.protocolo == "scim":
+        import aiohttp
+        itens = range(inicio + 1, fim + 1)
+        vagas = jogador.CONCURRENCY_LIMIT
+        lote = args.lote if args.envio == "bulk" else 1
+        session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=EM_VOO_MAX if aberta else vagas),
+                                        timeout=aiohttp.ClientTimeout(total=args.timeout))
+        send = lambda batch: jogador.send_item(session, args.modo, batch, args.envio)
+        fechar = session.close
+    else:
+        itens = jogador.gerar_itens(args.modo, inicio, fim)
+        vagas = EM_VOO_MAX if aberta else jogador.ASYNC_CONNECTIONS * jogador.ASYNC_DEPTH
+        lote = 1
+        send, pool, executor = jogador.preparar_envio(args.modo, args.timeout, vagas, True)
+        fechar = lambda: jogador.encerrar_envio(pool, executor)
+
+    async def enviar(batch):
+        results = await send(batch)
+        # Cada fragmento escreve só o seu contador: sem lock
+        progresso[indice] += sum(status in FINAL_STATUSES for _, status in results)
+        return results
+
+    n = args.processos
+    largada.wait(LARGADA_TIMEOUT)
+    try:
+        if aberta:
+            semente = None if args.semente is None else args.semente + indice
+            return await run_open_loop(itens, enviar, args.perfil, args.taxa / n,
+                                       args.taxa_final / n if args.taxa_final else None,
+                                       batch_size=lote, total=fim - inicio, semente=semente, limiar=args.limiar)
+        return await run_with_retry(itens, enviar, vagas, batch_size=lote,
+                                    total=fim - inicio, progress_interval=None)
+    finally:
+        await fechar()
+
+def fragmento(indice, args, inicio, fim, largada, progresso, saida):
+    """ Ponto de entrada do processo filho: manda os stats (ou o erro) pelo pipe """
+    try:
+        jogador = importlib.import_module(JOGADORES[args.protocolo])
+        configurar(jogador, args)
+        stats = asyncio.run(executar_fragmento(jogador, indice, args, inicio, fim, largada, progresso))
+        saida.send(stats)
+    except Exception as e:
+        # Barreira quebrada libera os outros em vez de deixá-los presos na largada
+        largada.abort()
+        saida.send({"ERRO": f"{type(e).__name__}: {e}"})
+    finally:
+        saida.close()
+
+# ============================================================
+# AGREGAÇÃO (PROCESSO PAI)
+# ============================================================
+def agregar(resultados):
+    """ Soma contadores, mescla histogramas e séries; tempos e máximos ficam com o maior """
+    total = {}
+    for stats in resultados:
+        for k, v in stats.items():
+            if isinstance(v, Histograma):
+                total.setdefault(k, Histograma()).mesclar(v)
+            elif isinstance(v, SerieSegundo):
+                total.setdefault(k, SerieSegundo()).mesclar(v)
+            elif isinstance(v, dict):
+                for rotulo, h in v.items():
+                    total.setdefault(k, {}).setdefault(rotulo, Histograma()).mesclar(h)
+            elif k in MAXIMOS:
+                total[k] = max(total.get(k, 0), v)
+            elif isinstance(v, (int, float)) and k != "SUSTENTAVEL":
+                total[k] = total.get(k, 0) + v
+    if "SERIE" in total:
+        total["SUSTENTAVEL"] = total["SERIE"].sustentavel(total["LIMIAR"])
+    return total
+
+def acompanhar(processos, conexoes, progresso, alvo, inicio):
+    """ Imprime o progresso somado e recolhe os stats de cada fragmento """
+    resultados = {}
+    pendentes = dict(conexoes)
+    proximo = inicio + PROGRESSO_INTERVALO
+    while pendentes:
+        for conn in wait(list(pendentes.values()), timeout=max(proximo - time.monotonic(), 0)):
+            indice = next(i for i, c in pendentes.items() if c is conn)
+            try:
+                resultados[indice] = conn.recv()
+            except EOFError:
+                resultados[indice] = {"ERRO": f"processo terminou sem resultado (código {processos[indice].exitcode})"}
+            del pendentes[indice]
+        if pendentes and time.monotonic() < proximo:
+            continue
+        proximo += PROGRESSO_INTERVALO
+        feitos = sum(progresso)
+        decorrido = time.monotonic() - inicio
+        print(f"    [PROGRESSO] {decorrido:6.1f}s | Concluídos: {feitos} / {alvo} | "
+              f"{feitos / decorrido if decorrido > 0 else 0:.0f} ops/seg | Fragmentos ativos: {len(pendentes)}")
+    return resultados
+
+# ============================================================
+# ORQUESTRAÇÃO
+# ============================================================
+def executar(args):
+    jogador = importlib.import_module(JOGADORES[args.protocolo])
+    configurar(jogador, args)
+    n = args.processos
+    faixas = fatias(args.usuarios, n)
+    label = f"{args.protocolo}_{args.modo}_{n}proc"
+
+    print("-" * 60)
+    print(f"INICIANDO: {args.protocolo.upper()} {args.modo.upper()} EM {n} PROCESSOS "
+          f"({'MALHA ABERTA' if args.execucao == 'aberta' else 'PERSISTENTE'})")
+    print(f"Usuários: {args.usuarios} | Timeout: {args.timeout}s"
+          + (f" | Chegadas: {descrever(args.perfil, args.taxa, args.taxa_final)} (total)" if args.execucao == "aberta" else ""))
+    print("-" * 60)
+
+    largada = mp.Barrier(n + 1)
+    progresso = mp.Array("q", n, lock=False)
+    processos, conexoes = [], {}
+    for indice, (inicio, fim) in enumerate(faixas):
+        leitura, escrita = mp.Pipe(duplex=False)
+        p = mp.Process(target=fragmento, args=(indice, args, inicio, fim, largada, progresso, escrita), daemon=True)
+        p.start()
+        escrita.close()
+        processos.append(p)
+        conexoes[indice] = leitura
+
+    try:
+        largada.wait(LARGADA_TIMEOUT)
+    except threading.BrokenBarrierError:
+        print("[AVISO] Largada interrompida (fragmento com erro antes de iniciar); veja o relatório.")
+    inicio = time.monotonic()
+    resultados = acompanhar(processos, conexoes, progresso, args.usuarios, inicio)
+    parede = time.monotonic() - inicio
+    for p in processos:
+        p.join()
+
+    validos = []
+    print("-" * 60)
+    print(f"RELATORIO FINAL {args.protocolo.upper()} ({args.modo.upper()}) - {n} PROCESSOS:")
+    for indice, (a, b) in enumerate(faixas):
+        stats = resultados[indice]
+        if "ERRO" in stats:
+            print(f"[FRAGMENTO {indice}] usuários {a}-{b - 1}: [ERRO] {stats['ERRO']}")
+            continue
+        validos.append(stats)
+        print(f"[FRAGMENTO {indice}] usuários {a}-{b - 1}: {stats['DONE']} OK em {stats['ELAPSED']:.2f} s "
+              f"({stats['DONE'] / stats['ELAPSED'] if stats['ELAPSED'] > 0 else 0:.0f} ops/seg)")
+    if not validos:
+        print("[ERRO] Nenhum fragmento terminou.")
+        return
+
+    total = agregar(validos)
+    print("-" * 60)
+    print(f"[STATUS]  Concluídos.....: {total['DONE']} / {args.usuarios}")
+    if args.execucao == "aberta":
+        imprimir_relatorio(total, f"{label}_{args.perfil}", extra={"processos": n, "perfil": args.perfil,
+                                                                     "taxa": args.taxa, "taxa_final": args.taxa_final})
+    else:
+        print(f"[TENTATIVAS] Máx. por usuário: {total['MAX_ATTEMPTS'] + 1}")
+        print(f"[RETRYS]  Falhas.........: {total['RETRIES']}")
+        if total.get('FAILED'):
+            print(f"[FALHAS]  Definitivas....: {total['FAILED']} (sem re-tentativa)")
+        print(f"[REQS]    Requisições....: {total['REQUESTS']}")
+        print(f"[CIRCUITO] Aberturas.....: {total['BREAKER_OPENS']} ({total['BREAKER_PAUSED']:.1f} s pausado, soma)")
+        imprimir_latencias(total, f"{label}_persistente", extra={"processos": n})
+    print("-" * 60)
+    print(f"Tempo Total: {parede:.2f} s")
+    print(f"Throughput combinado: {total['DONE'] / parede if parede > 0 else 0:.0f} ops/seg")
+    print("-" * 60)
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga SCIM/LDAP dividida em vários processos")
+    parser.add_argument("protocolo", choices=sorted(JOGADORES))
+    parser.add_argument("modo", choices=("insert", "update", "delete"))
+    parser.add_argument("-p", "--processos", type=int, default=os.cpu_count() or 1,
+                        help="processos (fragmentos); padrão: núcleos da máquina (%(default)s)")
+    parser.add_argument("--usuarios", type=int, default=5000, help="total de usuários (padrão: %(default)s)")
+    parser.add_argument("--alvo", help="HOST[:PORTA] no lugar do servidor configurado no jogador")
+    parser.add_argument("--timeout", type=float, default=5, help="s por operação (padrão: %(default)s)")
+    parser.add_argument("--execucao", choices=("persistente", "aberta"), default="persistente")
+    parser.add_argument("--perfil", choices=PERFIS, default="fixa", help="chegadas da malha aberta")
+    parser.add_argument("--taxa", type=float, default=1000, help="req/s TOTAL da malha aberta (padrão: %(default)s)")
+    parser.add_argument("--taxa-final", type=float, help="req/s total no fim da rampa")
+    parser.add_argument("--semente", type=int, help="semente das chegadas Poisson (reprodutível)")
+    parser.add_argument("--limiar", type=float,
+                        help="s, p99 máximo de um segundo sustentado (padrão: 1 s + 2 x atraso/jitter do cenário)")
+    parser.add_argument("--envio", choices=("single", "bulk"), default="single", help="SCIM: individual ou /Bulk")
+    parser.add_argument("--lote", type=int, default=100, help="SCIM: operações por requisição /Bulk")
+    parser.add_argument("--rede", choices=MODOS_REDE, default="netem",
+                        help="degradação por tc/netem (root) ou pelo proxy local (padrão: %(default)s)")
+    parser.add_argument("--cenario", type=int, choices=sorted(CENARIOS), help="cenário da tabela dos jogadores")
+    parser.add_argument("--atraso", type=int, default=0, help="ms de atraso durante a carga (sem --cenario)")
+    parser.add_argument("--perda", type=float, default=0, help="%% de perda durante a carga (sem --cenario)")
+    parser.add_argument("--jitter", type=int, default=0, help="ms de jitter")
+    parser.add_argument("--banda", type=float, help="kbit/s de banda")
+    parser.add_argument("--sentido", choices=SENTIDOS, default="ida", help="proxy: degradar só a ida ou também as respostas")
+    args = parser.parse_args()
+    args.processos = max(1, min(args.processos, args.usuarios))
+    if args.perfil == "rampa" and not args.taxa_final:
+        args.taxa_final = args.taxa * 10
+
+    if args.cenario is not None:
+        cenario = CENARIOS[args.cenario]
+        cenario = cenario._replace(jitter=args.jitter or cenario.jitter, banda=args.banda or cenario.banda)
+    else:
+        cenario = personalizado(args.atraso, args.perda, args.jitter, args.banda)
+    if args.limiar is None:
+        args.limiar = limiar_para(cenario.atraso, cenario.jitter)
+
+    jogador = importlib.import_module(JOGADORES[args.protocolo])
+    proxy = None
+    netem = args.rede == "netem" and not limpo(cenario)
+    if args.rede == "proxy":
+        # Um proxy no processo pai; os fragmentos conectam nele pelo --alvo
+        configurar(jogador, args)
+        if args.protocolo == "scim":
+            host, porta = jogador.SERVER_ROOT.split("://", 1)[1].rsplit(":", 1)
+        else:
+            host, porta = jogador.LDAP_HOST, jogador.LDAP_PORT
+        proxy = ProxyLocal(cenario, host, int(porta), args.sentido, args.semente)
+        args.alvo = f"127.0.0.1:{proxy.iniciar()}"
+        print(f"[REDE] Proxy local: {args.alvo} -> {host}:{porta} | {cenario.nome} ({descrever_rede(cenario)})")
+    elif netem:
+        if os.geteuid() != 0:
+            print("ERRO: netem exige ROOT (sudo). Use --rede proxy para degradar sem root.")
+            sys.exit(1)
+        jogador.apply_network(cenario)
+    try:
+        executar(args)
+    except KeyboardInterrupt:
+        print("\n[!] Interrompido.")
+    finally:
+        if proxy is not None:
+            resumo = proxy.parar()
+            if resumo:
+                imprimir_proxy(resumo)
+        elif netem:
+            jogador.reset_network()
+
+if __name__ == "__main__":
+    main()
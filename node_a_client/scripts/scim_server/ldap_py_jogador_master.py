@@ -3,13 +3,28 @@
 # ============================================================
 # Projeto CARTO
 # Autoria: Wagner P Calazans
-# Versao: 7.0 (Com Validação e Confirmação de Rede)
+# Versao: 8.1 (Proxy de Degradação Local + Cenários Compartilhados)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: ldap_py_jogador_master.py
 # Descrição: Ferramenta unificada para testes de carga LDAP.
 #            - Valida existência da interface de rede.
 #            - Confirma visualmente a regra aplicada pelo Kernel.
+#            - Threads fixas ou janela adaptativa (AIMD).
+#            - Motor asyncio: poucas conexões, várias operações em voo
+#              por conexão (messageIDs pendentes).
+#            - Modo persistente: re-tenta cada falha até convergir
+#              (mesma semântica do jogador SCIM); erro LDAP definitivo
+#              (schema, permissão, entrada inexistente) não volta à fila.
+#            - Root DSE/schema lidos uma vez (cache por CSN), não a cada bind.
+#            - Latência de cada operação em histograma (p50/p90/p99/p99.9),
+#              gravado em JSON para somar execuções.
+#            - Malha aberta: taxa fixa, Poisson ou rampa, latência desde o
+#              instante planejado (mesmo gerador do jogador SCIM).
+#            - description leva "carto_ts=<epoch>" do envio: o juiz mede o
+#              lag cliente -> commit -> réplica MMR por entrada (carto_lag.py).
+#            - Rede degradada por tc/netem ou pelo proxy local em espaço de
+#              usuário (carto_proxy.py, sem root); cenários em carto_rede.py.
 # ============================================================
 
 import sys
@@ -23,11 +38,23 @@ if os.path.exists(TARGET_PYTHON) and sys.executable != TARGET_PYTHON:
 # ---------------------------------------------
 
 import time
+import asyncio
 import threading
 import queue
 import subprocess
-from ldap3 import Server, Connection, ALL, MODIFY_REPLACE
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from ldap3 import Connection, MODIFY_REPLACE
+from ldap3.core.results import RESULT_CODES
 from datetime import datetime
+from carto_aimd import AIMDController, ThreadLimiter, AsyncLimiter, AIMD_MAX, OK, FAIL, CONGESTION
+from carto_retry import run_with_retry, imprimir_latencias
+from carto_histograma import Histograma, salvar as salvar_histograma
+from carto_taxa import run_open_loop, imprimir_relatorio, descrever, limiar_para, EM_VOO_MAX
+from carto_ldap_info import cached_server, ultimo_carregamento
+from carto_ldap_async import AsyncLDAPPool, ASYNC_CONNECTIONS, ASYNC_DEPTH
+from carto_rede import escolher_cenario, escolher_modo_rede, regra_netem, limpo, descrever as descrever_rede
+from carto_proxy import ProxyLocal, imprimir_resumo as imprimir_proxy
 
 # ============================================================
 # CONFIGURACOES GERAIS
@@ -48,13 +75,25 @@ BASE_DN   = 'dc=carto,dc=org'
 TOTAL_USERS = 5000
 NUM_THREADS = 50 
 
+# Códigos LDAP que indicam servidor sobrecarregado (busy, unavailable, unwillingToPerform)
+LDAP_CONGESTION_CODES = (51, 52, 53)
+# Códigos que passam sozinhos (timeLimitExceeded, adminLimitExceeded, other): re-tentados
+LDAP_TRANSIENT_CODES = (3, 11, 80)
+LDAP_NO_SUCH_OBJECT = 32
+LDAP_ALREADY_EXISTS = 68
+
 # ============================================================
 # VARIAVEIS GLOBAIS
 # ============================================================
 user_queue = queue.Queue()
 success_count = 0
 fail_count = 0
+latencias = Histograma()   # Tempo de cada operação (registrar sob `lock` nas threads)
+rejeitados = Counter()     # resultCode -> operações com erro definitivo (modo persistente / malha aberta)
 lock = threading.Lock()
+REDE_MODO = 'netem'        # 'netem' (tc na interface) ou 'proxy' (carto_proxy.py)
+proxy = None               # ProxyLocal ativo; LDAP_HOST/PORT apontam para ele
+alvo_real = None           # (host, porta) do servidor enquanto o proxy está no meio
 
 # ============================================================
 # MÓDULO DE REDE (TRAFFIC SHAPING) - MELHORADO
@@ -67,6 +106,8 @@ def run_shell(command):
 
 def validar_interface():
     """ Verifica se a interface existe no sistema operacional """
+    if REDE_MODO == 'proxy':
+        return True   # Proxy local não depende da interface
     path = f"/sys/class/net/{NET_INTERFACE}"
     if not os.path.exists(path):
         print("\n" + "!"*60)
@@ -90,11 +131,38 @@ def verificar_regra_ativa():
         print(f"   [AVISO] Não foi possível ler o estado da rede: {str(e)}")
 
 def reset_network():
+    global proxy, LDAP_HOST, LDAP_PORT
+    if proxy is not None:
+        print(f"   [REDE] Encerrando proxy local (servidor: {alvo_real[0]}:{alvo_real[1]})...")
+        resumo = proxy.parar()
+        if resumo:
+            imprimir_proxy(resumo)
+        LDAP_HOST, LDAP_PORT = alvo_real
+        proxy = None
+        return
+    if REDE_MODO == 'proxy': return
     if not validar_interface(): return
     print(f"   [REDE] Limpando regras na interface {NET_INTERFACE}...")
     run_shell(f"tc qdisc del dev {NET_INTERFACE} root")
 
-def apply_network(delay, loss, desc):
+def apply_proxy(cenario):
+    """ Mesmo cenário no proxy local: o jogador passa a falar com 127.0.0.1 """
+    global proxy, alvo_real, LDAP_HOST, LDAP_PORT
+    reset_network()
+    # Baseline também passa pelo proxy: o custo dele entra em todos os cenários
+    alvo_real = (LDAP_HOST, LDAP_PORT)
+    proxy = ProxyLocal(cenario, LDAP_HOST, LDAP_PORT)
+    LDAP_HOST, LDAP_PORT = '127.0.0.1', proxy.iniciar()
+    print(f"   [REDE] Proxy local: {LDAP_HOST}:{LDAP_PORT} -> {alvo_real[0]}:{alvo_real[1]} | "
+          f"{cenario.nome} ({descrever_rede(cenario)})")
+
+def apply_network(cenario, modo='netem'):
+    global REDE_MODO
+    REDE_MODO = modo
+    if modo == 'proxy':
+        apply_proxy(cenario)
+        return
+
     # 1. Validação
     if not validar_interface():
         input("Pressione ENTER para voltar e corrigir o script...")
@@ -104,12 +172,11 @@ def apply_network(delay, loss, desc):
     reset_network()
 
     # 3. Aplicação
-    if delay == 0 and loss == 0:
+    if limpo(cenario):
         print(f"   [REDE] Aplicado: Baseline (Sem degradação)")
     else:
-        print(f"   [REDE] Aplicado: {desc} (Delay {delay}ms | Loss {loss}%)")
-        cmd = f"tc qdisc add dev {NET_INTERFACE} root netem delay {delay}ms loss {loss}%"
-        subprocess.run(cmd, shell=True, check=True)
+        print(f"   [REDE] Aplicado: {cenario.nome} ({descrever_rede(cenario)})")
+        subprocess.run(regra_netem(NET_INTERFACE, cenario), shell=True, check=True)
     
     # 4. Confirmação Real
     verificar_regra_ativa()
@@ -117,110 +184,218 @@ def apply_network(delay, loss, desc):
 # ============================================================
 # WORKERS LDAP (THREADS)
 # ============================================================
-
-def worker_add(timeout_val):
+# Com `limiter` (modo adaptativo) cada operação espera vaga na janela AIMD
+# e devolve o resultado ao controlador; sem limiter nada muda.
+
+def ldap_outcome(conn):
+    """ Classifica uma resposta negativa do servidor para o controlador AIMD """
+    return CONGESTION if conn.result.get('result') in LDAP_CONGESTION_CODES else FAIL
+
+def servidor_ldap(timeout_val):
+    """ Server com DSE/schema do cache compartilhado (get_info=ALL refazia a leitura a cada bind) """
+    return cached_server(LDAP_HOST, LDAP_PORT, connect_timeout=timeout_val, user=BIND_DN, password=BIND_PASS)
+
+def carregar_schema(timeout_val):
+    servidor_ldap(timeout_val)
+    print(f"[INFO] Schema LDAP: {ultimo_carregamento['origem']} (CSN {ultimo_carregamento['csn']}) "
+          f"em {ultimo_carregamento['segundos']:.2f} s")
+
+def carimbo(texto):
+    """ Horário de envio no próprio valor gravado (lido pelo juiz / carto_lag.py) """
+    return f"{texto} carto_ts={time.time():.6f}"
+
+def user_attrs(uid, cn, sn):
+    return {
+        'objectClass': ['top', 'person', 'organizationalPerson', 'inetOrgPerson', 'posixAccount'],
+        'cn': cn, 'sn': sn, 'uid': uid, 'userPassword': 'password123',
+        'uidNumber': str(10000 + int(uid.split('_')[-1])),
+        'gidNumber': '500', 'homeDirectory': f'/home/{uid}',
+        'description': carimbo('Carga Inicial LDAP')
+    }
+
+def worker_add(timeout_val, limiter=None):
     global success_count, fail_count
-    server = Server(LDAP_HOST, port=LDAP_PORT, get_info=ALL, connect_timeout=timeout_val)
+    server = servidor_ldap(timeout_val)
     conn = Connection(server, BIND_DN, BIND_PASS, auto_bind=False)
     
     while not user_queue.empty():
+        started, outcome, sent_at = None, CONGESTION, None
         try:
             uid, cn, sn = user_queue.get(block=False)
+            if limiter: started = limiter.acquire()
             if not conn.bound:
                 if not conn.bind(): raise Exception("Bind Failed")
 
             dn = f"uid={uid},{BASE_DN}"
-            attrs = {
-                'objectClass': ['top', 'person', 'organizationalPerson', 'inetOrgPerson', 'posixAccount'],
-                'cn': cn, 'sn': sn, 'uid': uid, 'userPassword': 'password123',
-                'uidNumber': str(10000 + int(uid.split('_')[-1])), 
-                'gidNumber': '500', 'homeDirectory': f'/home/{uid}'
-            }
-
-            if conn.add(dn, attributes=attrs):
+            sent_at = time.monotonic()
+            if conn.add(dn, attributes=user_attrs(uid, cn, sn)):
                 with lock: success_count += 1
+                outcome = OK
             else:
                 with lock: fail_count += 1
+                outcome = ldap_outcome(conn)
             
             user_queue.task_done()
         except queue.Empty: break
         except Exception: 
             with lock: fail_count += 1
             conn.unbind()
+        finally:
+            if sent_at is not None:
+                with lock: latencias.registrar(time.monotonic() - sent_at)
+            if started is not None: limiter.release(started, outcome)
     conn.unbind()
 
-def worker_modify(timeout_val):
+def worker_modify(timeout_val, limiter=None):
     global success_count, fail_count
-    server = Server(LDAP_HOST, port=LDAP_PORT, get_info=ALL, connect_timeout=timeout_val)
+    server = servidor_ldap(timeout_val)
     conn = Connection(server, BIND_DN, BIND_PASS, auto_bind=False)
     
     while not user_queue.empty():
+        started, outcome, sent_at = None, CONGESTION, None
         try:
             uid, new_desc = user_queue.get(block=False)
+            if limiter: started = limiter.acquire()
             if not conn.bound:
                 if not conn.bind(): raise Exception("Bind Failed")
 
             dn = f"uid={uid},{BASE_DN}"
-            changes = {'description': [(MODIFY_REPLACE, [new_desc])]}
+            changes = {'description': [(MODIFY_REPLACE, [carimbo(new_desc)])]}
             
+            sent_at = time.monotonic()
             if conn.modify(dn, changes):
                 with lock: success_count += 1
+                outcome = OK
             else:
                 with lock: fail_count += 1
+                outcome = ldap_outcome(conn)
             user_queue.task_done()
         except queue.Empty: break
         except Exception:
             with lock: fail_count += 1
             conn.unbind()
+        finally:
+            if sent_at is not None:
+                with lock: latencias.registrar(time.monotonic() - sent_at)
+            if started is not None: limiter.release(started, outcome)
     conn.unbind()
 
-def worker_delete(timeout_val):
+def worker_delete(timeout_val, limiter=None):
     global success_count, fail_count
-    server = Server(LDAP_HOST, port=LDAP_PORT, get_info=ALL, connect_timeout=timeout_val)
+    server = servidor_ldap(timeout_val)
     conn = Connection(server, BIND_DN, BIND_PASS, auto_bind=False)
     
     while not user_queue.empty():
+        started, outcome, sent_at = None, CONGESTION, None
         try:
             uid = user_queue.get(block=False)
+            if limiter: started = limiter.acquire()
             if not conn.bound:
                 if not conn.bind(): raise Exception("Bind Failed")
 
             dn = f"uid={uid},{BASE_DN}"
+            sent_at = time.monotonic()
             if conn.delete(dn):
                 with lock: success_count += 1
+                outcome = OK
             else:
                 with lock: fail_count += 1
+                outcome = ldap_outcome(conn)
             user_queue.task_done()
         except queue.Empty: break
         except Exception:
             with lock: fail_count += 1
             conn.unbind()
+        finally:
+            if sent_at is not None:
+                with lock: latencias.registrar(time.monotonic() - sent_at)
+            if started is not None: limiter.release(started, outcome)
     conn.unbind()
 
+# ============================================================
+# MOTOR ASYNCIO (PIPELINING POR CONEXÃO)
+# ============================================================
+# ASYNC_CONNECTIONS sockets com vários messageIDs pendentes cada, no lugar
+# de uma conexão síncrona (e uma operação em voo) por thread.
+
+def async_operation(pool, mode, item):
+    if mode == 'insert':
+        uid, cn, sn = item
+        return pool.add(f"uid={uid},{BASE_DN}", user_attrs(uid, cn, sn))
+    if mode == 'update':
+        uid, new_desc = item
+        return pool.modify(f"uid={uid},{BASE_DN}", {'description': [(MODIFY_REPLACE, [carimbo(new_desc)])]})
+    return pool.delete(f"uid={item},{BASE_DN}")
+
+async def run_async_engine(mode, timeout_val, workers, limiter=None):
+    """ `workers` corrotinas consomem a fila; devolve o pool (para o relatório) """
+    depth = max(ASYNC_DEPTH, -(-workers // ASYNC_CONNECTIONS))
+    pool = AsyncLDAPPool(LDAP_HOST, LDAP_PORT, BIND_DN, BIND_PASS, depth=depth, timeout=timeout_val)
+
+    async def worker():
+        global success_count, fail_count
+        while True:
+            try: item = user_queue.get(block=False)
+            except queue.Empty: return
+            started = await limiter.acquire() if limiter else None
+            outcome = CONGESTION
+            sent_at = time.monotonic()
+            try:
+                result = await async_operation(pool, mode, item)
+                if result['result'] == 0:
+                    outcome = OK
+                elif result['result'] in LDAP_CONGESTION_CODES:
+                    outcome = CONGESTION
+                else:
+                    outcome = FAIL
+            except Exception:
+                pass
+            latencias.registrar(time.monotonic() - sent_at)
+            if outcome == OK: success_count += 1
+            else: fail_count += 1
+            if started is not None: await limiter.release(started, outcome)
+
+    try:
+        await asyncio.gather(*[worker() for _ in range(workers)])
+    finally:
+        await pool.close()
+    return pool
+
 # ============================================================
 # ORQUESTRADOR DO TESTE
 # ============================================================
 
+def gerar_itens(mode, inicio=0, fim=None):
+    """ Itens de trabalho de cada modo (mesmo formato para threads e asyncio).
+
+    inicio/fim recortam a faixa de usuários (fragmentos do jogador_fragmentado.py)
+    """
+    faixa = range(inicio, TOTAL_USERS if fim is None else fim)
+    if mode == 'insert':
+        return [(f"user_ldap_{i}", f"User LDAP {i}", "LDAP Family") for i in faixa]
+    if mode == 'update':
+        ts = datetime.now().strftime('%H:%M:%S')
+        return [(f"user_ldap_{i}", f"LDAP Modificado em {ts}") for i in faixa]
+    return [f"user_ldap_{i}" for i in faixa]
+
 def preparar_fila(mode):
-    global success_count, fail_count
+    global success_count, fail_count, latencias
     with user_queue.mutex: user_queue.queue.clear()
     success_count = 0
     fail_count = 0
-    
+    latencias = Histograma()
+
     print(f"[INFO] Populando fila para {mode.upper()} ({TOTAL_USERS} itens)...")
-    
-    if mode == 'insert':
-        for i in range(TOTAL_USERS):
-            user_queue.put((f"user_ldap_{i}", f"User LDAP {i}", "LDAP Family"))
-    elif mode == 'update':
-        ts = datetime.now().strftime('%H:%M:%S')
-        for i in range(TOTAL_USERS):
-            user_queue.put((f"user_ldap_{i}", f"LDAP Modificado em {ts}"))
-    elif mode == 'delete':
-        for i in range(TOTAL_USERS):
-            user_queue.put(f"user_ldap_{i}")
+    for item in gerar_itens(mode):
+        user_queue.put(item)
 
-def run_test_cycle(mode, timeout_val):
+def monitor_aimd(controller, limiter, stop_event):
+    """ Mostra a janela AIMD enquanto o teste roda """
+    while not stop_event.wait(2):
+        print(f"   [AIMD] Janela: {controller.limit:<4} | Em voo: {limiter.in_flight:<4} | "
+              f"Sucesso: {success_count} | Falha: {fail_count}")
+
+def run_test_cycle(mode, timeout_val, concurrency_mode='fixed', engine='threads'):
     # Verifica se a interface existe antes de gastar tempo preparando fila
     if not validar_interface():
         input("Pressione ENTER para continuar...")
@@ -228,25 +403,44 @@ def run_test_cycle(mode, timeout_val):
 
     preparar_fila(mode)
     
+    adaptive = concurrency_mode == 'adaptive'
+    use_async = engine == 'async'
+    num_workers = AIMD_MAX if adaptive else (ASYNC_CONNECTIONS * ASYNC_DEPTH if use_async else NUM_THREADS)
+    controller = AIMDController(label=f"ldap_{engine}_{mode}") if adaptive else None
+    limiter = (AsyncLimiter(controller) if use_async else ThreadLimiter(controller)) if adaptive else None
+    
     print(f"--- INICIANDO DISPARO LDAP ({mode.upper()}) ---")
-    print(f"Threads: {NUM_THREADS} | Timeout: {timeout_val}s")
+    if use_async:
+        print(f"Motor: asyncio | Conexões: {ASYNC_CONNECTIONS} | Em voo: {num_workers}"
+              f"{' (janela AIMD)' if adaptive else ''} | Timeout: {timeout_val}s")
+    else:
+        print(f"Threads: {num_workers}{' (janela AIMD)' if adaptive else ''} | Timeout: {timeout_val}s")
     
+    if not use_async: carregar_schema(timeout_val)
     start_time = time.time()
+    stop_event = threading.Event()
+    if adaptive:
+        threading.Thread(target=monitor_aimd, args=(controller, limiter, stop_event), daemon=True).start()
     
-    threads = []
-    target_func = None
-    
-    if mode == 'insert': target_func = worker_add
-    elif mode == 'update': target_func = worker_modify
-    elif mode == 'delete': target_func = worker_delete
-    
-    for _ in range(NUM_THREADS):
-        t = threading.Thread(target=target_func, args=(timeout_val,))
-        t.start()
-        threads.append(t)
+    pool = None
+    if use_async:
+        pool = asyncio.run(run_async_engine(mode, timeout_val, num_workers, limiter))
+    else:
+        threads = []
+        target_func = None
+        
+        if mode == 'insert': target_func = worker_add
+        elif mode == 'update': target_func = worker_modify
+        elif mode == 'delete': target_func = worker_delete
         
-    for t in threads:
-        t.join()
+        for _ in range(num_workers):
+            t = threading.Thread(target=target_func, args=(timeout_val, limiter))
+            t.start()
+            threads.append(t)
+            
+        for t in threads:
+            t.join()
+    stop_event.set()
         
     end_time = time.time()
     duration = end_time - start_time
@@ -259,6 +453,198 @@ def run_test_cycle(mode, timeout_val):
     print("-" * 60)
     print(f"Tempo Total: {duration:.2f} s")
     print(f"Throughput:  {throughput:.0f} ops/seg")
+    print(f"[LATENCIA] {latencias.linha()}")
+    try:
+        print(f"[LATENCIA] Histograma: {salvar_histograma({'geral': latencias}, f'ldap_{engine}_{mode}', extra={'concorrencia': concurrency_mode})}")
+    except OSError as e:
+        print(f"[AVISO] Histograma não gravado: {e}")
+    if pool is not None:
+        print(f"[ASYNC] Conexões: {pool.size} | Reconexões: {pool.reconnects}")
+    if adaptive:
+        print(f"[AIMD] Janela final: {controller.limit} | Reduções: {controller.decreases}")
+        print(f"[AIMD] Série temporal: {controller.save()}")
+    print("-" * 60)
+    input("\nPressione Enter para continuar...")
+
+# ============================================================
+# MODO PERSISTENTE (RETRY ATÉ CONVERGIR)
+# ============================================================
+# Mesmo agendador do jogador SCIM (carto_retry): cada operação que falha
+# volta sozinha para a fila com backoff + jitter até todos os usuários
+# convergirem. entryAlreadyExists no insert e noSuchObject no delete são o
+# estado desejado (a tentativa anterior chegou ao servidor mas a resposta
+# se perdeu), então contam como concluídos. Só congestionamento e códigos
+# transitórios voltam para a fila: o resto (objectClassViolation,
+# insufficientAccessRights, noSuchObject no modify...) daria o mesmo erro a
+# cada tentativa e prenderia o teste, então encerra o item como falha.
+
+_thread_conn = threading.local()
+_thread_conns = []
+
+def ldap_status(mode, code):
+    """ Traduz o resultCode LDAP para o status do agendador de retry """
+    if code == 0: return "SUCCESS"
+    if mode == 'insert' and code == LDAP_ALREADY_EXISTS: return "ALREADY_EXISTS"
+    if mode == 'delete' and code == LDAP_NO_SUCH_OBJECT: return "SUCCESS"
+    if code in LDAP_CONGESTION_CODES: return "SERVER_ERROR"
+    if code in LDAP_TRANSIENT_CODES: return "LDAP_ERROR"
+    rejeitados[code] += 1
+    return "NOT_FOUND" if code == LDAP_NO_SUCH_OBJECT else "REJECTED"
+
+def imprimir_rejeitados():
+    """ Falhas definitivas por resultCode (nome do RFC 4511) """
+    if rejeitados:
+        detalhes = ", ".join(f"{RESULT_CODES.get(c, c)} ({c}): {n}" for c, n in rejeitados.most_common())
+        print(f"[FALHAS]  Definitivas....: {sum(rejeitados.values())} ({detalhes})")
+
+def sync_operation(mode, item, timeout_val):
+    """ Uma operação na conexão síncrona da thread atual; devolve o resultCode """
+    conn = getattr(_thread_conn, 'conn', None)
+    if conn is None:
+        server = servidor_ldap(timeout_val)
+        conn = _thread_conn.conn = Connection(server, BIND_DN, BIND_PASS, auto_bind=False)
+        with lock: _thread_conns.append(conn)
+    try:
+        if not conn.bound:
+            if not conn.bind(): raise Exception("Bind Failed")
+        if mode == 'insert':
+            uid, cn, sn = item
+            conn.add(f"uid={uid},{BASE_DN}", attributes=user_attrs(uid, cn, sn))
+        elif mode == 'update':
+            uid, new_desc = item
+            conn.modify(f"uid={uid},{BASE_DN}", {'description': [(MODIFY_REPLACE, [carimbo(new_desc)])]})
+        else:
+            conn.delete(f"uid={item},{BASE_DN}")
+        return conn.result['result']
+    except Exception:
+        conn.unbind()
+        raise
+
+def preparar_envio(mode, timeout_val, workers, use_async):
+    """ send(batch) do motor escolhido (para carto_retry / carto_taxa) e os recursos a liberar """
+    pool, executor = None, None
+    if use_async:
+        depth = max(ASYNC_DEPTH, -(-workers // ASYNC_CONNECTIONS))
+        pool = AsyncLDAPPool(LDAP_HOST, LDAP_PORT, BIND_DN, BIND_PASS, depth=depth, timeout=timeout_val)
+
+        async def send(batch):
+            result = await async_operation(pool, mode, batch[0])
+            return [(batch[0], ldap_status(mode, result['result']))]
+    else:
+        # Uma conexão síncrona por thread do executor, reaproveitada entre operações
+        executor = ThreadPoolExecutor(max_workers=workers)
+        loop = asyncio.get_running_loop()
+
+        async def send(batch):
+            code = await loop.run_in_executor(executor, sync_operation, mode, batch[0], timeout_val)
+            return [(batch[0], ldap_status(mode, code))]
+    return send, pool, executor
+
+async def encerrar_envio(pool, executor):
+    if pool is not None:
+        await pool.close()
+    if executor is not None:
+        executor.shutdown(wait=True)
+        for conn in _thread_conns: conn.unbind()
+        _thread_conns.clear()
+
+async def run_persistent_cycle(mode, timeout_val, concurrency_mode='fixed', engine='threads'):
+    if not validar_interface():
+        input("Pressione ENTER para continuar...")
+        return
+
+    adaptive = concurrency_mode == 'adaptive'
+    use_async = engine == 'async'
+    workers = AIMD_MAX if adaptive else (ASYNC_CONNECTIONS * ASYNC_DEPTH if use_async else NUM_THREADS)
+    controller = AIMDController(label=f"ldap_{engine}_{mode}") if adaptive else None
+
+    print("-" * 60)
+    print(f"INICIANDO: LDAP {mode.upper()} (MODO PERSISTENTE/RETRY)")
+    print(f"Motor: {engine} | Workers: {'AIMD (até ' + str(AIMD_MAX) + ')' if adaptive else workers} | Timeout: {timeout_val}s")
+    print("-" * 60)
+
+    if not use_async: carregar_schema(timeout_val)
+    rejeitados.clear()
+    start_time = time.time()
+    send, pool, executor = preparar_envio(mode, timeout_val, workers, use_async)
+    try:
+        stats = await run_with_retry(
+            gerar_itens(mode),
+            send,
+            workers,
+            limiter=AsyncLimiter(controller) if adaptive else None,
+            total=TOTAL_USERS,
+        )
+    finally:
+        await encerrar_envio(pool, executor)
+
+    total_time = time.time() - start_time
+
+    print("-" * 60)
+    print(f"RELATORIO FINAL LDAP ({mode.upper()}) - PERSISTENTE:")
+    print(f"[STATUS]  {stats['DONE']} concluídos, {stats['FAILED']} falhas definitivas (de {TOTAL_USERS}).")
+    print(f"[TENTATIVAS] Máx. por usuário: {stats['MAX_ATTEMPTS'] + 1}")
+    if mode == 'insert':
+        print(f"[CRIADOS] Novos..........: {stats.get('SUCCESS', 0)}")
+        print(f"[EXISTE]  Já existiam....: {stats.get('ALREADY_EXISTS', 0)}")
+    print(f"[RETRYS]  Falhas.........: {stats['RETRIES']} (rede: {stats.get('CONN_ERROR', 0)} | "
+          f"servidor ocupado: {stats.get('SERVER_ERROR', 0)} | LDAP: {stats.get('LDAP_ERROR', 0)})")
+    imprimir_rejeitados()
+    print(f"[LDAP]    Operações......: {stats['REQUESTS']}")
+    print(f"[CIRCUITO] Aberturas.....: {stats['BREAKER_OPENS']} ({stats['BREAKER_PAUSED']:.1f} s pausado)")
+    if pool is not None:
+        print(f"[ASYNC]   Reconexões.....: {pool.reconnects}")
+    if adaptive:
+        print(f"[AIMD]    Janela final...: {controller.limit} | Reduções: {controller.decreases}")
+        print(f"[AIMD]    Série temporal.: {controller.save()}")
+    imprimir_latencias(stats, f"ldap_{engine}_{mode}_persistente", extra={"concorrencia": concurrency_mode})
+    print("-" * 60)
+    print(f"Tempo até convergência: {total_time:.2f} s")
+    print(f"Throughput:  {TOTAL_USERS / total_time if total_time > 0 else 0:.0f} ops/seg")
+    print("-" * 60)
+    input("\nPressione Enter para continuar...")
+
+# ============================================================
+# MALHA ABERTA (TAXA CONTROLADA)
+# ============================================================
+# As operações saem na agenda de chegadas, sem esperar as anteriores. No
+# motor asyncio cabem até EM_VOO_MAX em voo; no de threads, cada thread é
+# uma vaga (NUM_THREADS), e o que não couber espera na fila do executor,
+# mas a latência continua contada desde o instante planejado.
+async def run_open_loop_cycle(mode, timeout_val, profile, engine='threads', limiar=None):
+    if not validar_interface():
+        input("Pressione ENTER para continuar...")
+        return
+
+    perfil, taxa, taxa_final = profile
+    use_async = engine == 'async'
+    workers = EM_VOO_MAX if use_async else NUM_THREADS
+
+    print("-" * 60)
+    print(f"INICIANDO: LDAP {mode.upper()} (MALHA ABERTA)")
+    print(f"Motor: {engine} | Chegadas: {descrever(perfil, taxa, taxa_final)} | Timeout: {timeout_val}s")
+    print("-" * 60)
+
+    if not use_async: carregar_schema(timeout_val)
+    rejeitados.clear()
+    send, pool, executor = preparar_envio(mode, timeout_val, workers, use_async)
+    try:
+        stats = await run_open_loop(gerar_itens(mode), send, perfil, taxa, taxa_final, total=TOTAL_USERS,
+                                    limiar=limiar or limiar_para())
+    finally:
+        await encerrar_envio(pool, executor)
+
+    print("-" * 60)
+    print(f"RELATORIO FINAL LDAP ({mode.upper()}) - MALHA ABERTA:")
+    print(f"[FALHAS]  Rede / Ocupado / LDAP: {stats.get('CONN_ERROR', 0)} / "
+          f"{stats.get('SERVER_ERROR', 0)} / {stats.get('LDAP_ERROR', 0)}")
+    imprimir_rejeitados()
+    if pool is not None:
+        print(f"[ASYNC]   Reconexões.....: {pool.reconnects}")
+    imprimir_relatorio(stats, f"ldap_{engine}_{mode}_{perfil}", extra={"perfil": perfil, "taxa": taxa,
+                                                                        "taxa_final": taxa_final})
+    print("-" * 60)
+    print(f"Tempo Total: {stats['ELAPSED']:.2f} s")
     print("-" * 60)
     input("\nPressione Enter para continuar...")
 
@@ -267,44 +653,53 @@ def run_test_cycle(mode, timeout_val):
 # ============================================================
 
 def get_network_scenario():
-    print("\n" + "="*50)
-    print("SELECIONE O CENÁRIO DE REDE:")
-    print("-" * 50)
-    print("0) Baseline (0ms, 0% loss)")
-    print("1) Satélite (600ms, 1% loss)")
-    print("2) Rádio Tático (100ms, 5% loss)")
-    print("3) Desastre (200ms, 15% loss)")
-    print("4) Caos Extremo (500ms, 40% loss)")
-    print("5) Degradação Parcial (800ms, 70% loss)")
-    print("6) Degradação Total (1200ms, 95% loss)")
-    print("=" * 50)
+    return escolher_cenario()
+
+def get_concurrency_mode():
+    print("\nCONCORRÊNCIA:")
+    print(f"1) Fixa ({NUM_THREADS} threads)")
+    print(f"2) Adaptativa (AIMD, até {AIMD_MAX} operações em voo)")
+    return 'adaptive' if input("Opção [1]: ").strip() == '2' else 'fixed'
+
+def get_engine():
+    print("\nMOTOR DE ENVIO:")
+    print(f"1) Threads ({NUM_THREADS} conexões síncronas)")
+    print(f"2) Asyncio ({ASYNC_CONNECTIONS} conexões, até {ASYNC_DEPTH} operações em voo cada)")
+    return 'async' if input("Opção [1]: ").strip() == '2' else 'threads'
+
+def get_run_mode():
+    print("\nMODO DE EXECUÇÃO:")
+    print("1) Disparo único (falhas são contadas e descartadas)")
+    print("2) Persistente (re-tenta cada falha até todos convergirem)")
+    print("3) Malha aberta (taxa controlada, sem re-tentativa)")
+    return {'2': 'persistent', '3': 'open'}.get(input("Opção [1]: ").strip(), 'single')
+
+def get_load_profile():
+    print("\nCHEGADAS (operações/s):")
+    print("1) Taxa fixa")
+    print("2) Poisson (intervalos exponenciais)")
+    print("3) Rampa (taxa inicial -> final)")
+    perfil = {'2': 'poisson', '3': 'rampa'}.get(input("Opção [1]: ").strip(), 'fixa')
     try:
-        opt = int(input("Opção: "))
-        scenarios = {
-            0: (0, 0, "Baseline"),
-            1: (600, 1, "Satélite"),
-            2: (100, 5, "Rádio Tático"),
-            3: (200, 15, "Desastre"),
-            4: (500, 40, "Caos Extremo"),
-            5: (800, 70, "Degradação Parcial"),
-            6: (1200, 95, "Degradação Total")
-        }
-        return scenarios.get(opt, (0, 0, "Baseline"))
-    except:
-        return (0, 0, "Baseline")
+        taxa = float(input("Taxa (ops/s) [200]: ") or 200)
+        taxa_final = float(input(f"Taxa final (ops/s) [{taxa * 10:g}]: ") or taxa * 10) if perfil == 'rampa' else None
+    except ValueError:
+        taxa, taxa_final = 200.0, 2000.0 if perfil == 'rampa' else None
+    return perfil, max(taxa, 0.1), taxa_final and max(taxa_final, 0.1)
 
 def main_menu():
-    if os.geteuid() != 0:
-        print("ERRO: Execute este script como ROOT (sudo) para controlar a rede.")
-        sys.exit(1)
-
-    # Validacao inicial ao abrir o programa
-    validar_interface()
+    root = os.geteuid() == 0
+    if root:
+        # Validacao inicial ao abrir o programa
+        validar_interface()
+    else:
+        print("[AVISO] Sem ROOT: tc/netem indisponível, a rede será degradada pelo proxy local.")
+        time.sleep(2)
 
     while True:
         os.system('clear')
         print("="*60)
-        print("   MASTER JOGADOR LDAP - IME (Python Threading)")
+        print("   MASTER JOGADOR LDAP - IME (Threads / Asyncio)")
         print("="*60)
         print("1) Inserir Usuários (Carga Massiva)")
         print("2) Modificar Usuários (Stress Update)")
@@ -326,19 +721,33 @@ def main_menu():
             elif opt == '3': mode = "delete"
             
             # 1. Configurar Rede
-            delay, loss, desc = get_network_scenario()
+            cenario = get_network_scenario()
+            rede = escolher_modo_rede(root)
+            engine = get_engine()
+            run_mode = get_run_mode()
+            if run_mode == 'open':
+                profile = get_load_profile()
+            else:
+                concurrency_mode = get_concurrency_mode()
             
             # Timeout inteligente
             timeout = 1000
             
 
-            apply_network(delay, loss, desc)
+            apply_network(cenario, rede)
             
             # 2. Rodar Teste
             print(f"\nPreparando ambiente LDAP ({mode.upper()})...")
             time.sleep(1)
             try:
-                run_test_cycle(mode, timeout)
+                if run_mode == 'open':
+                    # Limiar da taxa sustentável cresce com o atraso do cenário
+                    asyncio.run(run_open_loop_cycle(mode, timeout, profile, engine,
+                                                    limiar_para(cenario.atraso, cenario.jitter)))
+                elif run_mode == 'persistent':
+                    asyncio.run(run_persistent_cycle(mode, timeout, concurrency_mode, engine))
+                else:
+                    run_test_cycle(mode, timeout, concurrency_mode, engine)
             except KeyboardInterrupt:
                 print("\n[!] Interrompido pelo usuário.")
             
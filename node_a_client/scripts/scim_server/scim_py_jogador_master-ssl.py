@@ -3,12 +3,13 @@
 # ============================================================
 # Projeto CARTO
 # Autoria: Wagner P Calazans
-# Versao: 2.0 (SSL/HTTPS - Security Mode)
+# Versao: 2.1 (SSL/HTTPS - Security Mode)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_py_jogador_master.py
 # Descrição: Cliente SCIM via HTTPS (Porta 5000).
 #            - Ignora validação de certificado (Self-Signed).
+#            - Modificação de usuário inexistente (404) não volta à ronda.
 # ============================================================
 
 import sys
@@ -95,6 +96,7 @@ async def update_user(session, user_id):
     try:
         async with session.put(url, json=payload) as response:
             if response.status == 200: return user_id, "SUCCESS"
+            elif response.status == 404: return user_id, "NOT_FOUND"
             else: return user_id, "SERVER_ERROR"
     except: return user_id, "CONN_ERROR"
 
@@ -118,7 +120,7 @@ async def run_persistent_test(mode, timeout_val):
     start_time = time.time()
     pending_users = list(range(1, TOTAL_USERS + 1))
     rounds = 0
-    stats = {"SUCCESS": 0, "ALREADY_EXISTS": 0, "RETRIES": 0}
+    stats = {"SUCCESS": 0, "ALREADY_EXISTS": 0, "NOT_FOUND": 0, "RETRIES": 0}
     
     # --- AQUI ESTA A MUDANCA PARA SSL ---
     # ssl=False desativa a verificacao do certificado, mas mantem a criptografia
@@ -141,6 +143,7 @@ async def run_persistent_test(mode, timeout_val):
             for uid, status in results:
                 if status == "SUCCESS": stats["SUCCESS"] += 1
                 elif status == "ALREADY_EXISTS": stats["ALREADY_EXISTS"] += 1
+                elif status == "NOT_FOUND": stats["NOT_FOUND"] += 1
                 else: pending_users.append(uid); stats["RETRIES"] += 1
             
             if pending_users: await asyncio.sleep(2)
@@ -148,6 +151,7 @@ async def run_persistent_test(mode, timeout_val):
     total_time = time.time() - start_time
     print("-" * 60)
     print(f"FIM ({mode.upper()}) | Tempo: {total_time:.2f}s | Retries: {stats['RETRIES']}")
+    if stats["NOT_FOUND"]: print(f"[AVISO] Usuários inexistentes: {stats['NOT_FOUND']}")
     print("-" * 60)
     input("Enter...")
 
@@ -3,7 +3,7 @@
 # ============================================================
 # Projeto CARTO
 # Autoria: Wagner P Calazans
-# Versao: 1.6 (Auto-Detecção de Interface de Rede)
+# Versao: 2.6 (Proxy de Degradação Local + Cenários Compartilhados)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_py_jogador_master.py
@@ -11,6 +11,18 @@
 #            1. Detecta Interface de Rede ativa Automaticamente.
 #            2. Auto-VENV.
 #            3. Carga, Modificação e Deleção Persistente.
+#            4. Envio individual ou em lotes via /Bulk.
+#            5. Re-tentativa contínua por item (backoff + circuit breaker).
+#            6. Concorrência fixa ou adaptativa (AIMD).
+#            7. Latência por requisição (p50/p90/p99/p99.9) geral e por tentativa.
+#            8. Malha aberta: taxa fixa, Poisson ou rampa (latência desde o
+#               instante planejado, taxa sustentável por cenário).
+#            9. description leva "carto_ts=<epoch>" do envio (lag por
+#               registro calculado pelo juiz com carto_lag.py).
+#           10. Rede degradada por tc/netem ou pelo proxy local em espaço
+#               de usuário (carto_proxy.py, sem root); cenários em carto_rede.py.
+#           11. Modificação de usuário inexistente (404, individual ou /Bulk)
+#               é falha definitiva: contada no relatório, sem re-tentativa.
 # ============================================================
 
 import sys
@@ -31,11 +43,25 @@ import subprocess
 import asyncio
 import aiohttp
 from datetime import datetime
+from urllib.parse import urlsplit
+from carto_retry import run_with_retry, imprimir_latencias
+from carto_aimd import AIMDController, AsyncLimiter, AIMD_MAX
+from carto_taxa import run_open_loop, imprimir_relatorio, descrever, limiar_para, EM_VOO_MAX
+from carto_rede import escolher_cenario, escolher_modo_rede, regra_netem, limpo, descrever as descrever_rede
+from carto_proxy import ProxyLocal, imprimir_resumo as imprimir_proxy
 
 # --- CONFIGURAÇÕES SCIM ---
-SERVER_BASE = "http://172.16.102.100:5000/Users"
+SERVER_ROOT = "http://172.16.102.100:5000"
+SERVER_BASE = f"{SERVER_ROOT}/Users"
+SERVER_BULK = f"{SERVER_ROOT}/Bulk"
 TOTAL_USERS = 5000
 CONCURRENCY_LIMIT = 50 
+BULK_SIZE = 100  # Operações por requisição no modo bulk (servidor aceita até 1000)
+
+# --- REDE DEGRADADA ---
+REDE_MODO = 'netem'   # 'netem' (tc na interface) ou 'proxy' (carto_proxy.py)
+proxy = None          # ProxyLocal ativo; SERVER_* apontam para ele
+raiz_real = None      # SERVER_ROOT do servidor enquanto o proxy está no meio
 
 # ============================================================
 # FUNÇÃO INTELIGENTE DE DETECÇÃO DE REDE
@@ -88,20 +114,52 @@ def verificar_regra_ativa():
     except Exception:
         pass
 
+def apontar_servidor(root):
+    global SERVER_ROOT, SERVER_BASE, SERVER_BULK
+    SERVER_ROOT = root
+    SERVER_BASE = f"{SERVER_ROOT}/Users"
+    SERVER_BULK = f"{SERVER_ROOT}/Bulk"
+
 def reset_network():
+    global proxy
+    if proxy is not None:
+        print(f"   [REDE] Encerrando proxy local (servidor: {raiz_real})...")
+        resumo = proxy.parar()
+        if resumo:
+            imprimir_proxy(resumo)
+        apontar_servidor(raiz_real)
+        proxy = None
+        return
+    if REDE_MODO == 'proxy': return
     print(f"   [REDE] Limpando regras na interface {INTERFACE}...")
     run_shell(f"tc qdisc del dev {INTERFACE} root")
 
-def apply_network(delay, loss, desc):
+def apply_proxy(cenario):
+    """ Mesmo cenário no proxy local: o jogador passa a falar com 127.0.0.1 """
+    global proxy, raiz_real
+    reset_network()
+    # Baseline também passa pelo proxy: o custo dele entra em todos os cenários
+    raiz_real = SERVER_ROOT
+    url = urlsplit(SERVER_ROOT)
+    proxy = ProxyLocal(cenario, url.hostname, url.port or 80)
+    apontar_servidor(f"{url.scheme}://127.0.0.1:{proxy.iniciar()}")
+    print(f"   [REDE] Proxy local: {SERVER_ROOT} -> {raiz_real} | {cenario.nome} ({descrever_rede(cenario)})")
+
+def apply_network(cenario, modo='netem'):
+    global REDE_MODO
+    REDE_MODO = modo
+    if modo == 'proxy':
+        apply_proxy(cenario)
+        return
+
     reset_network()
     
-    if delay == 0 and loss == 0:
+    if limpo(cenario):
         print(f"   [REDE] Aplicado: Baseline (Sem degradação)")
     else:
-        print(f"   [REDE] Aplicado: {desc} (Delay {delay}ms | Loss {loss}%)")
-        cmd = f"tc qdisc add dev {INTERFACE} root netem delay {delay}ms loss {loss}%"
+        print(f"   [REDE] Aplicado: {cenario.nome} ({descrever_rede(cenario)})")
         try:
-            subprocess.run(cmd, shell=True, check=True)
+            subprocess.run(regra_netem(INTERFACE, cenario), shell=True, check=True)
         except subprocess.CalledProcessError:
             print("\n" + "!"*60)
             print(f"[ERRO] Falha ao aplicar regra na interface '{INTERFACE}'.")
@@ -116,11 +174,15 @@ def apply_network(delay, loss, desc):
 # ============================================================
 # WORKERS SCIM (ASYNC)
 # ============================================================
+def carimbo(texto):
+    """ Horário de envio no próprio valor gravado (lido pelo juiz / carto_lag.py) """
+    return f"{texto} carto_ts={time.time():.6f}"
+
 async def create_user(session, user_id):
     payload = {
         "id": f"user{user_id}",
         "userName": f"Utilizador Teste {user_id}",
-        "description": "Carga Inicial SCIM"
+        "description": carimbo("Carga Inicial SCIM")
     }
     try:
         async with session.post(SERVER_BASE, json=payload) as response:
@@ -132,10 +194,11 @@ async def create_user(session, user_id):
 async def update_user(session, user_id):
     ts = datetime.now().strftime("%H:%M:%S")
     url = f"{SERVER_BASE}/user{user_id}"
-    payload = {"description": f"Modificado em {ts} via SCIM (Ronda Persistente)"}
+    payload = {"description": carimbo(f"Modificado em {ts} via SCIM (Ronda Persistente)")}
     try:
         async with session.put(url, json=payload) as response:
             if response.status == 200: return user_id, "SUCCESS"
+            elif response.status == 404: return user_id, "NOT_FOUND"
             else: return user_id, "SERVER_ERROR"
     except Exception: return user_id, "CONN_ERROR"
 
@@ -148,95 +211,204 @@ async def delete_user(session, user_id):
     except Exception: return user_id, "CONN_ERROR"
 
 # ============================================================
-# CORE DO TESTE (LOOP PERSISTENTE)
+# MODO BULK (RFC 7644 /Bulk)
 # ============================================================
-async def run_persistent_test(mode, timeout_val):
+def build_operation(mode, user_id, ts):
+    """ Monta a operação Bulk equivalente à requisição individual do modo """
+    bulk_id = f"user{user_id}"
+    if mode == 'insert':
+        return {"method": "POST", "path": "/Users", "bulkId": bulk_id,
+                "data": {"id": bulk_id, "userName": f"Utilizador Teste {user_id}", "description": carimbo("Carga Inicial SCIM")}}
+    elif mode == 'update':
+        return {"method": "PUT", "path": f"/Users/{bulk_id}", "bulkId": bulk_id,
+                "data": {"description": carimbo(f"Modificado em {ts} via SCIM (Ronda Persistente)")}}
+    return {"method": "DELETE", "path": f"/Users/{bulk_id}", "bulkId": bulk_id}
+
+def bulk_status(mode, status):
+    """ Traduz o status de uma operação da BulkResponse para o status do worker """
+    if mode == 'insert':
+        if status == "201": return "SUCCESS"
+        if status == "409": return "ALREADY_EXISTS"
+    elif mode == 'update':
+        if status == "200": return "SUCCESS"
+        if status == "404": return "NOT_FOUND"
+    elif status in ("204", "404"): return "SUCCESS"
+    return "SERVER_ERROR"
+
+async def send_bulk(session, mode, user_ids):
+    """ Envia um lote; devolve (uid, status) por usuário para re-tentar só as falhas """
+    ts = datetime.now().strftime("%H:%M:%S")
+    payload = {
+        "schemas": ["urn:ietf:params:scim:api:messages:2.0:BulkRequest"],
+        "Operations": [build_operation(mode, uid, ts) for uid in user_ids]
+    }
+    try:
+        async with session.post(SERVER_BULK, json=payload) as response:
+            if response.status != 200:
+                return [(uid, "SERVER_ERROR") for uid in user_ids]
+            body = await response.json()
+    except Exception:
+        return [(uid, "CONN_ERROR") for uid in user_ids]
+
+    by_bulk_id = {op.get("bulkId"): op.get("status") for op in body.get("Operations", [])}
+    # Operação ausente na resposta (failOnErrors) = não processada, volta para a fila
+    return [(uid, bulk_status(mode, by_bulk_id[f"user{uid}"]) if f"user{uid}" in by_bulk_id else "NOT_PROCESSED")
+            for uid in user_ids]
+
+# ============================================================
+# CORE DO TESTE (RETRY CONTÍNUO POR ITEM)
+# ============================================================
+async def send_item(session, mode, batch, send_mode):
+    """ Envia um lote (bulk) ou um único usuário e devolve a lista de (uid, status) """
+    if send_mode == 'bulk':
+        return await send_bulk(session, mode, batch)
+    if mode == 'insert': return [await create_user(session, batch[0])]
+    elif mode == 'update': return [await update_user(session, batch[0])]
+    return [await delete_user(session, batch[0])]
+
+async def run_persistent_test(mode, timeout_val, send_mode='single', bulk_size=BULK_SIZE, concurrency_mode='fixed'):
+    adaptive = concurrency_mode == 'adaptive'
+    workers = AIMD_MAX if adaptive else CONCURRENCY_LIMIT
     print("-" * 60)
     print(f"INICIANDO: SCIM {mode.upper()} (MODO PERSISTENTE/RETRY)")
-    print(f"Workers: {CONCURRENCY_LIMIT} | Timeout: {timeout_val}s | Alvo: {SERVER_BASE}")
+    print(f"Workers: {'AIMD (até ' + str(AIMD_MAX) + ')' if adaptive else CONCURRENCY_LIMIT} | Timeout: {timeout_val}s | Alvo: {SERVER_BULK if send_mode == 'bulk' else SERVER_BASE}")
+    if send_mode == 'bulk':
+        print(f"Envio: BULK ({bulk_size} operações por requisição)")
     print("-" * 60)
     
     start_time = time.time()
-    pending_users = list(range(1, TOTAL_USERS + 1))
-    rounds = 0
-    stats = {"SUCCESS": 0, "ALREADY_EXISTS": 0, "RETRIES": 0}
     
-    connector = aiohttp.TCPConnector(limit=CONCURRENCY_LIMIT)
+    # CONCURRENCY_LIMIT workers, cada um com uma requisição em voo: o timeout
+    # começa no envio e não na espera por vaga no TCPConnector. Os usuários
+    # vêm de um range preguiçoso e só os que falharam ficam em memória,
+    # agendados individualmente com backoff + jitter (sem barreira de ronda).
+    # No modo adaptativo a janela AIMD decide quantas requisições ficam em voo
+    controller = AIMDController(label=f"scim_{mode}") if adaptive else None
+    connector = aiohttp.TCPConnector(limit=workers)
     timeout = aiohttp.ClientTimeout(total=timeout_val)
     
     async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        while pending_users:
-            rounds += 1
-            print(f"\n>>> RONDA {rounds}: {len(pending_users)} itens pendentes...")
-            
-            tasks = []
-            for uid in pending_users:
-                if mode == 'insert': tasks.append(create_user(session, uid))
-                elif mode == 'update': tasks.append(update_user(session, uid))
-                else: tasks.append(delete_user(session, uid))
-            
-            results = await asyncio.gather(*tasks)
-            pending_users = [] 
-            round_failures = 0
-            
-            for uid, status in results:
-                if status == "SUCCESS": stats["SUCCESS"] += 1
-                elif status == "ALREADY_EXISTS": stats["ALREADY_EXISTS"] += 1
-                else:
-                    pending_users.append(uid)
-                    round_failures += 1
-                    stats["RETRIES"] += 1
-            
-            if pending_users:
-                print(f"    [FALHA] {round_failures} erros. Aguardando recuperação...")
-                await asyncio.sleep(2)
-            else:
-                print("    [SUCESSO] Ronda limpa.")
+        stats = await run_with_retry(
+            range(1, TOTAL_USERS + 1),
+            lambda batch: send_item(session, mode, batch, send_mode),
+            workers,
+            batch_size=bulk_size if send_mode == 'bulk' else 1,
+            limiter=AsyncLimiter(controller) if adaptive else None,
+            total=TOTAL_USERS,
+        )
 
     total_time = time.time() - start_time
     
     print("-" * 60)
     print(f"RELATORIO FINAL ({mode.upper()}):")
-    print(f"[STATUS]  Todos os {TOTAL_USERS} usuários processados.")
-    print(f"[RODADAS] Necessárias....: {rounds}")
+    print(f"[STATUS]  {stats['DONE']} concluídos, {stats['FAILED']} falhas definitivas (de {TOTAL_USERS}).")
+    print(f"[TENTATIVAS] Máx. por usuário: {stats['MAX_ATTEMPTS'] + 1}")
     if mode == 'insert':
-        print(f"[CRIADOS] Novos..........: {stats['SUCCESS']}")
-        print(f"[EXISTE]  Já existiam....: {stats['ALREADY_EXISTS']}")
+        print(f"[CRIADOS] Novos..........: {stats.get('SUCCESS', 0)}")
+        print(f"[EXISTE]  Já existiam....: {stats.get('ALREADY_EXISTS', 0)}")
     print(f"[RETRYS]  Falhas de Rede.: {stats['RETRIES']}")
+    if stats['FAILED']:
+        print(f"[FALHAS]  Definitivas....: {stats['FAILED']} (inexistentes: {stats.get('NOT_FOUND', 0)})")
+    print(f"[HTTP]    Requisições....: {stats['REQUESTS']}")
+    print(f"[CIRCUITO] Aberturas.....: {stats['BREAKER_OPENS']} ({stats['BREAKER_PAUSED']:.1f} s pausado)")
+    if adaptive:
+        print(f"[AIMD]    Janela final...: {controller.limit} | Reduções: {controller.decreases}")
+        print(f"[AIMD]    Série temporal.: {controller.save()}")
+    imprimir_latencias(stats, f"scim_{mode}", extra={"envio": send_mode, "concorrencia": concurrency_mode})
     print("-" * 60)
     print(f"Tempo Total: {total_time:.2f} s")
     print("-" * 60)
     input("\nPressione Enter para continuar...")
 
+# ============================================================
+# MALHA ABERTA (TAXA CONTROLADA)
+# ============================================================
+async def run_open_loop_test(mode, timeout_val, send_mode, bulk_size, profile, limiar=None):
+    perfil, taxa, taxa_final = profile
+    print("-" * 60)
+    print(f"INICIANDO: SCIM {mode.upper()} (MALHA ABERTA)")
+    print(f"Chegadas: {descrever(perfil, taxa, taxa_final)} | Em voo até: {EM_VOO_MAX} | Timeout: {timeout_val}s")
+    if send_mode == 'bulk':
+        print(f"Envio: BULK ({bulk_size} operações por requisição)")
+    print("-" * 60)
+
+    # Sem limite de vagas do cliente abaixo de EM_VOO_MAX: quem dita o ritmo é a agenda
+    connector = aiohttp.TCPConnector(limit=EM_VOO_MAX)
+    timeout = aiohttp.ClientTimeout(total=timeout_val)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        stats = await run_open_loop(
+            range(1, TOTAL_USERS + 1),
+            lambda batch: send_item(session, mode, batch, send_mode),
+            perfil, taxa, taxa_final,
+            batch_size=bulk_size if send_mode == 'bulk' else 1,
+            total=TOTAL_USERS,
+            limiar=limiar or limiar_para(),
+        )
+
+    print("-" * 60)
+    print(f"RELATORIO FINAL ({mode.upper()}) - MALHA ABERTA:")
+    if mode == 'insert':
+        print(f"[CRIADOS] Novos..........: {stats.get('SUCCESS', 0)}")
+        print(f"[EXISTE]  Já existiam....: {stats.get('ALREADY_EXISTS', 0)}")
+    print(f"[FALHAS]  Rede / Servidor: {stats.get('CONN_ERROR', 0)} / {stats.get('SERVER_ERROR', 0)}")
+    if stats.get('NOT_FOUND'):
+        print(f"[FALHAS]  Inexistentes...: {stats['NOT_FOUND']}")
+    imprimir_relatorio(stats, f"scim_{mode}_{perfil}", extra={"envio": send_mode, "perfil": perfil,
+                                                               "taxa": taxa, "taxa_final": taxa_final})
+    print("-" * 60)
+    print(f"Tempo Total: {stats['ELAPSED']:.2f} s")
+    print("-" * 60)
+    input("\nPressione Enter para continuar...")
+
 # ============================================================
 # MENU
 # ============================================================
 def get_network_scenario():
-    print("\n" + "="*50)
-    print("SELECIONE O CENÁRIO DE REDE:")
-    print("-" * 50)
-    print("0) Baseline (0ms, 0% loss)")
-    print("1) Satélite (600ms, 1% loss)")
-    print("2) Rádio Tático (100ms, 5% loss)")
-    print("3) Desastre (200ms, 15% loss)")
-    print("4) Caos Extremo (500ms, 40% loss)")
-    print("5) Degradação Parcial (800ms, 70% loss)")
-    print("6) Degradação Total (1200ms, 95% loss)")
-    print("=" * 50)
+    return escolher_cenario()
+
+def get_concurrency_mode():
+    print("\nCONCORRÊNCIA:")
+    print(f"1) Fixa ({CONCURRENCY_LIMIT} requisições em voo)")
+    print(f"2) Adaptativa (AIMD, até {AIMD_MAX})")
+    return 'adaptive' if input("Opção [1]: ").strip() == '2' else 'fixed'
+
+def get_send_mode():
+    print("\nMODO DE ENVIO:")
+    print("1) Individual (1 usuário por requisição)")
+    print(f"2) Bulk (/Bulk, padrão {BULK_SIZE} operações por requisição)")
+    opt = input("Opção [1]: ").strip()
+    if opt != '2':
+        return 'single', BULK_SIZE
     try:
-        opt = int(input("Opção: "))
-        scenarios = {
-            0: (0, 0, "Baseline"), 1: (600, 1, "Satélite"), 2: (100, 5, "Rádio Tático"),
-            3: (200, 15, "Desastre"), 4: (500, 40, "Caos Extremo"), 5: (800, 70, "Degradação Parcial"),
-            6: (1200, 95, "Degradação Total")
-        }
-        return scenarios.get(opt, (0, 0, "Baseline"))
-    except: return (0, 0, "Baseline")
+        size = int(input(f"Operações por requisição [{BULK_SIZE}]: ") or BULK_SIZE)
+        return 'bulk', max(1, size)
+    except ValueError: return 'bulk', BULK_SIZE
+
+def get_run_mode():
+    print("\nMODO DE EXECUÇÃO:")
+    print("1) Persistente (re-tenta cada falha até todos convergirem)")
+    print("2) Malha aberta (taxa controlada, sem re-tentativa)")
+    return 'open' if input("Opção [1]: ").strip() == '2' else 'persistent'
+
+def get_load_profile():
+    print("\nCHEGADAS (requisições/s):")
+    print("1) Taxa fixa")
+    print("2) Poisson (intervalos exponenciais)")
+    print("3) Rampa (taxa inicial -> final)")
+    perfil = {'2': 'poisson', '3': 'rampa'}.get(input("Opção [1]: ").strip(), 'fixa')
+    try:
+        taxa = float(input("Taxa (req/s) [100]: ") or 100)
+        taxa_final = float(input(f"Taxa final (req/s) [{taxa * 10:g}]: ") or taxa * 10) if perfil == 'rampa' else None
+    except ValueError:
+        taxa, taxa_final = 100.0, 1000.0 if perfil == 'rampa' else None
+    return perfil, max(taxa, 0.1), taxa_final and max(taxa_final, 0.1)
 
 def main_menu():
-    if os.geteuid() != 0:
-        print("ERRO: Execute como ROOT (sudo).")
-        sys.exit(1)
+    root = os.geteuid() == 0
+    if not root:
+        print("[AVISO] Sem ROOT: tc/netem indisponível, a rede será degradada pelo proxy local.")
+        time.sleep(2)
         
     print(f"[SISTEMA] Interface detectada: {INTERFACE}")
 
@@ -245,9 +417,9 @@ def main_menu():
         print("="*60)
         print(f"   MASTER JOGADOR SCIM - IME (Interface: {INTERFACE})")
         print("="*60)
-        print("1) Inserir Usuários (Persistente)")
-        print("2) Modificar Usuários (Persistente)")
-        print("3) Deletar Usuários (Persistente)")
+        print("1) Inserir Usuários")
+        print("2) Modificar Usuários")
+        print("3) Deletar Usuários")
         print("0) Sair e Limpar Rede")
         print("="*60)
         
@@ -261,16 +433,26 @@ def main_menu():
         elif opt in ['1', '2', '3']:
             mode = "insert" if opt == '1' else "update" if opt == '2' else "delete"
             
-            delay, loss, desc = get_network_scenario()
-            timeout = 3 if loss >= 90 else 5
+            cenario = get_network_scenario()
+            rede = escolher_modo_rede(root)
+            send_mode, bulk_size = get_send_mode()
+            run_mode = get_run_mode()
+            if run_mode == 'open':
+                profile = get_load_profile()
+            else:
+                concurrency_mode = get_concurrency_mode()
+            timeout = 3 if cenario.perda >= 90 else 5
             
-            apply_network(delay, loss, desc)
+            apply_network(cenario, rede)
             
             print(f"\nIniciando bateria SCIM ({mode.upper()})...")
             time.sleep(1)
             try:
-                if sys.version_info >= (3, 7): asyncio.run(run_persistent_test(mode, timeout))
-                else: loop = asyncio.get_event_loop(); loop.run_until_complete(run_persistent_test(mode, timeout))
+                # Limiar da taxa sustentável cresce com o atraso do cenário
+                if run_mode == 'open': asyncio.run(run_open_loop_test(mode, timeout, send_mode, bulk_size, profile,
+                                                                      limiar_para(cenario.atraso, cenario.jitter)))
+                elif sys.version_info >= (3, 7): asyncio.run(run_persistent_test(mode, timeout, send_mode, bulk_size, concurrency_mode))
+                else: loop = asyncio.get_event_loop(); loop.run_until_complete(run_persistent_test(mode, timeout, send_mode, bulk_size, concurrency_mode))
             except KeyboardInterrupt: print("\n[!] Interrompido.")
             
             reset_network()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Lag Ponta a Ponta por Entrada)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_lag.py
+# Descrição: Lag de cada operação, do envio no cliente até a réplica.
+#            - Os jogadores gravam "carto_ts=<epoch>" (horário do envio)
+#              na description; os juízes gravam as chegadas em CSV.
+#            - Junta por (uid, carimbo): envio -> commit no servidor
+#              (entryCSN / clock_timestamp) -> visto pelo juiz local ->
+#              visto na réplica MMR (CSV --par, só LDAP).
+#            - Distribuição (p50 / p90 / p99 / máx.) por etapa e série
+#              temporal por janela de envio (resolução abaixo de 1 s).
+#            - Relógios de A e B precisam estar sincronizados (NTP/PTP):
+#              lag negativo indica desvio de relógio, não viagem no tempo.
+#            - Uso: python3 carto_lag.py X_chegadas.csv [--par X_chegadas_par.csv]
+# ============================================================
+
+import argparse
+import csv
+import math
+import os
+import re
+import sys
+
+CARIMBO = re.compile(r"carto_ts=(\d+(?:\.\d+)?)")
+LARGURA = 0.1               # s por janela da série temporal
+PERCENTIS = (50, 90, 99)
+
+# Etapas: (nome, início, fim); cada ponto é uma coluna do CSV por entrada
+ETAPAS = (
+    ("envio_commit", "ts_envio", "ts_commit"),
+    ("envio_local", "ts_envio", "ts_local"),
+    ("envio_replica", "ts_envio", "ts_replica"),
+    ("replicacao", "ts_commit", "ts_replica"),
+)
+
+def extrair_carimbo(descricao):
+    """ Horário de envio gravado pelo jogador (None se a entrada não tem) """
+    m = CARIMBO.search(descricao or "")
+    return float(m.group(1)) if m else None
+
+def _numero(texto):
+    return float(texto) if texto else None
+
+def carregar(caminho):
+    """ {(uid, carimbo): (ts chegada, ts commit)} + contagem das linhas sem carimbo.
+
+    O commit vem de ts_commit (juiz LDAP, entryCSN) ou ts_linha (juiz SCIM,
+    clock_timestamp da escrita). Deleções não levam carimbo.
+    """
+    chegadas, sem_carimbo = {}, 0
+    with open(caminho, newline="") as f:
+        for linha in csv.DictReader(f):
+            envio = extrair_carimbo(linha.get("description"))
+            if envio is None:
+                sem_carimbo += 1
+                continue
+            commit = _numero(linha.get("ts_commit") or linha.get("ts_linha"))
+            # A mesma escrita vista duas vezes (refresh + persist) conta na primeira
+            chegadas.setdefault((linha["uid"], envio), (float(linha["ts_epoch"]), commit))
+    return chegadas, sem_carimbo
+
+def juntar(local, par=None):
+    """ Uma linha por operação carimbada, com os horários de cada ponto """
+    entradas = []
+    for (uid, envio), (ts_local, ts_commit) in local.items():
+        ts_replica = par[(uid, envio)][0] if par and (uid, envio) in par else None
+        entradas.append({"uid": uid, "ts_envio": envio, "ts_commit": ts_commit,
+                         "ts_local": ts_local, "ts_replica": ts_replica})
+    entradas.sort(key=lambda e: e["ts_envio"])
+    for e in entradas:
+        for nome, inicio, fim in ETAPAS:
+            e[nome] = e[fim] - e[inicio] if e[inicio] is not None and e[fim] is not None else None
+    return entradas
+
+def percentil(ordenados, p):
+    """ Percentil pelo posto mais próximo (valores já em ordem) """
+    return ordenados[max(0, math.ceil(len(ordenados) * p / 100) - 1)]
+
+def resumo(valores):
+    valores = sorted(v for v in valores if v is not None)
+    if not valores:
+        return {"n": 0}
+    dados = {"n": len(valores), "min": valores[0], "media": sum(valores) / len(valores)}
+    for p in PERCENTIS:
+        dados[f"p{p}"] = percentil(valores, p)
+    dados["max"] = valores[-1]
+    return dados
+
+def serie(entradas, largura=LARGURA):
+    """ Por janela de envio: operações enviadas e p50 / p99 / máx. de cada etapa """
+    if not entradas:
+        return []
+    inicio = entradas[0]["ts_envio"]
+    janelas = {}
+    for e in entradas:
+        janelas.setdefault(int((e["ts_envio"] - inicio) / largura), []).append(e)
+    linhas = []
+    for k in sorted(janelas):
+        linha = {"janela_s": round(k * largura, 6), "enviadas": len(janelas[k])}
+        for nome, _, _ in ETAPAS:
+            r = resumo(e[nome] for e in janelas[k])
+            for chave in ("p50", "p99", "max"):
+                linha[f"{nome}_{chave}_ms"] = r[chave] * 1000 if r["n"] else None
+        linhas.append(linha)
+    return linhas
+
+def _ms(v):
+    return "" if v is None else f"{v * 1000:.3f}"
+
+def gravar(entradas, linhas, prefixo):
+    """ <prefixo>_lag.csv (1 linha por operação) e <prefixo>_lag_serie.csv """
+    caminho_lag, caminho_serie = f"{prefixo}_lag.csv", f"{prefixo}_lag_serie.csv"
+    with open(caminho_lag, "w", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["uid", "ts_envio", "ts_commit", "ts_local", "ts_replica"] + [f"{n}_ms" for n, _, _ in ETAPAS])
+        for e in entradas:
+            escritor.writerow([e["uid"]] + ["" if e[c] is None else f"{e[c]:.6f}"
+                                            for c in ("ts_envio", "ts_commit", "ts_local", "ts_replica")]
+                              + [_ms(e[n]) for n, _, _ in ETAPAS])
+    with open(caminho_serie, "w", newline="") as f:
+        colunas = ["janela_s", "enviadas"] + [f"{n}_{c}_ms" for n, _, _ in ETAPAS for c in ("p50", "p99", "max")]
+        escritor = csv.writer(f)
+        escritor.writerow(colunas)
+        for linha in linhas:
+            escritor.writerow([linha["janela_s"], linha["enviadas"]]
+                              + ["" if linha[c] is None else f"{linha[c]:.3f}" for c in colunas[2:]])
+    return caminho_lag, caminho_serie
+
+def main():
+    parser = argparse.ArgumentParser(description="Lag por entrada: envio (jogador) -> commit -> réplica")
+    parser.add_argument("chegadas", help="CSV do juiz local (*_chegadas.csv)")
+    parser.add_argument("--par", help="CSV do juiz na réplica MMR (*_chegadas_par.csv)")
+    parser.add_argument("--largura", type=float, default=LARGURA, help="s por janela da série temporal")
+    parser.add_argument("--prefixo", help="prefixo dos CSVs de saída (padrão: o do CSV de chegadas)")
+    args = parser.parse_args()
+
+    local, sem_carimbo = carregar(args.chegadas)
+    par = None
+    if args.par:
+        if os.path.exists(args.par):
+            par, _ = carregar(args.par)
+        else:
+            print(f"[AVISO] CSV da réplica não encontrado: {args.par}")
+    entradas = juntar(local, par)
+    print(f"[INFO] Operações carimbadas: {len(entradas)} (sem carimbo: {sem_carimbo}, ex.: deleções)")
+    if not entradas:
+        print("[AVISO] Nenhuma chegada com carto_ts: jogador antigo ou só deleções.")
+        return 1
+
+    negativos = False
+    for nome, _, _ in ETAPAS:
+        r = resumo(e[nome] for e in entradas)
+        if not r["n"]:
+            continue
+        partes = [f"n={r['n']}"] + [f"p{p} {r[f'p{p}'] * 1000:.1f}" for p in PERCENTIS]
+        partes.append(f"max {r['max'] * 1000:.1f} (ms)")
+        print(f"[LAG] {nome:<14}: {' | '.join(partes)}")
+        negativos = negativos or r["min"] < 0
+    if negativos:
+        print("[AVISO] Lag negativo: relógios de A e B fora de sincronia (confira o NTP).")
+
+    prefixo = args.prefixo or re.sub(r"_chegadas\.csv$|\.csv$", "", args.chegadas)
+    caminho_lag, caminho_serie = gravar(entradas, serie(entradas, args.largura), prefixo)
+    print(f"[INFO] Lag por entrada: {caminho_lag}")
+    print(f"[INFO] Série ({args.largura:g} s): {caminho_serie}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.2 (Leitor pcap/pcapng Nativo + Acumuladores por Intervalo)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_pcap.py
+# Descrição: Leitura das capturas do tcpdump sem tshark.
+#            - Arquivo mapeado em memória (mmap): nada é copiado além
+#              dos cabeçalhos de registro.
+#            - Decodifica só timestamp e tamanho de cada pacote para
+#              arrays NumPy, em blocos de tamanho fixo (memória limitada).
+#            - Suporta pcap clássico (us/ns, ambas as ordens de byte) e
+#              pcapng (EPB/OPB, if_tsresol por interface).
+#            - ler_registros() devolve também offset/caplen/linktype de
+#              cada pacote para a análise de fluxos TCP (carto_tcp).
+#            - Acumulador: soma por intervalo (1 s ou sub-segundo) bloco a
+#              bloco; a memória depende da duração, não do nº de pacotes.
+# ============================================================
+
+import mmap
+import struct
+
+import numpy as np
+
+CHUNK_RECORDS = 1_000_000   # Pacotes por bloco devolvido
+
+# --- PCAP CLÁSSICO ---
+PCAP_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),   # little-endian, microssegundos
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),   # little-endian, nanossegundos
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+
+# --- PCAPNG ---
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_OPB = 0x00000002     # Obsolete Packet Block
+PCAPNG_EPB = 0x00000006     # Enhanced Packet Block
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+IF_TSRESOL = 9
+
+class FormatoDesconhecido(ValueError):
+    """ O arquivo não é pcap nem pcapng (ex.: comprimido) """
+
+class Bloco:
+    """ Acumula um bloco de registros em arrays pré-alocados """
+    def __init__(self, size):
+        self.ts = np.empty(size, dtype=np.float64)
+        self.length = np.empty(size, dtype=np.int64)
+        self.offset = np.empty(size, dtype=np.int64)     # Início dos dados do pacote no arquivo
+        self.caplen = np.empty(size, dtype=np.int64)
+        self.linktype = np.empty(size, dtype=np.int32)
+        self.n = 0
+
+    def cheio(self):
+        return self.n == len(self.ts)
+
+    def fechar(self):
+        n = self.n
+        return self.ts[:n], self.length[:n], self.offset[:n], self.caplen[:n], self.linktype[:n]
+
+def _ler_pcap(mm, endian, resolucao, chunk_records):
+    header = struct.Struct(endian + "IIII")
+    unpack_from = header.unpack_from
+    linktype = struct.unpack_from(endian + "I", mm, 20)[0] & 0xFFFF
+    size = len(mm)
+    offset = 24
+    bloco = Bloco(chunk_records)
+    ts, length, data, caplen = bloco.ts, bloco.length, bloco.offset, bloco.caplen
+    n = 0
+    while offset + 16 <= size:
+        sec, frac, incl_len, orig_len = unpack_from(mm, offset)
+        if offset + 16 + incl_len > size:
+            break           # Último registro truncado (captura interrompida)
+        ts[n] = sec + frac * resolucao
+        length[n] = orig_len
+        data[n] = offset + 16
+        caplen[n] = incl_len
+        offset += 16 + incl_len
+        n += 1
+        if n == chunk_records:
+            bloco.n = n
+            bloco.linktype[:] = linktype
+            yield bloco.fechar()
+            bloco = Bloco(chunk_records)
+            ts, length, data, caplen = bloco.ts, bloco.length, bloco.offset, bloco.caplen
+            n = 0
+    bloco.n = n
+    if n:
+        bloco.linktype[:n] = linktype
+        yield bloco.fechar()
+
+def _tsresol(mm, endian, start, end):
+    """ Resolução do timestamp declarada nas opções de uma IDB (padrão 1e-6) """
+    offset = start
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + "HH", mm, offset)
+        if code == 0:
+            break
+        if code == IF_TSRESOL and length >= 1:
+            value = mm[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
+
+def _ler_pcapng(mm, chunk_records):
+    size = len(mm)
+    offset = 0
+    endian = "<"
+    interfaces = []         # (linktype, resolução) de cada interface da seção atual
+    bloco = Bloco(chunk_records)
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(endian + "I", mm, offset)[0]
+        if block_type == PCAPNG_SHB:
+            # A ordem de bytes é redefinida a cada seção
+            endian = "<" if struct.unpack_from("<I", mm, offset + 8)[0] == PCAPNG_BYTE_ORDER else ">"
+            interfaces = []
+        block_len = struct.unpack_from(endian + "I", mm, offset + 4)[0]
+        if block_len < 12 or offset + block_len > size:
+            break           # Bloco truncado ou corrompido
+        body = offset + 8
+
+        if block_type == PCAPNG_EPB or block_type == PCAPNG_OPB:
+            if block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + "IIIII", mm, body)
+            else:
+                iface, _, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + "HHIIII", mm, body)
+            linktype, resolucao = interfaces[iface] if iface < len(interfaces) else (-1, 1e-6)
+            i = bloco.n
+            bloco.ts[i] = ((ts_high << 32) | ts_low) * resolucao
+            bloco.length[i] = orig_len
+            bloco.offset[i] = body + 20
+            bloco.caplen[i] = cap_len
+            bloco.linktype[i] = linktype
+            bloco.n += 1
+            if bloco.cheio():
+                yield bloco.fechar()
+                bloco = Bloco(chunk_records)
+        elif block_type == PCAPNG_IDB:
+            linktype = struct.unpack_from(endian + "H", mm, body)[0]
+            interfaces.append((linktype, _tsresol(mm, endian, body + 8, offset + block_len - 4)))
+
+        offset += block_len
+    if bloco.n:
+        yield bloco.fechar()
+
+def ler_registros(caminho, chunk_records=CHUNK_RECORDS):
+    """ Gera (buf, ts, length, offset, caplen, linktype) em blocos de até `chunk_records` pacotes.
+
+    `buf` é o arquivo inteiro como array uint8 (sem cópia, válido só durante a
+    iteração); os dados do pacote i são buf[offset[i]:offset[i] + caplen[i]].
+    Timestamps são absolutos (época); `length` é o tamanho original do pacote
+    no fio (frame.len do tshark), não o capturado.
+    """
+    with open(caminho, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return          # Arquivo vazio
+        if hasattr(mm, "madvise"):
+            # Leitura sequencial: o kernel lê adiante e pode descartar as páginas já lidas
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        try:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            magic = mm[:4]
+            if magic in PCAP_MAGICS:
+                endian, resolucao = PCAP_MAGICS[magic]
+                blocos = _ler_pcap(mm, endian, resolucao, chunk_records)
+            elif len(mm) >= 12 and struct.unpack_from("<I", mm, 0)[0] == PCAPNG_SHB:
+                blocos = _ler_pcapng(mm, chunk_records)
+            else:
+                raise FormatoDesconhecido(f"Formato de captura não reconhecido: {caminho}")
+            for bloco in blocos:
+                yield (buf,) + bloco
+        finally:
+            buf = None
+            try:
+                mm.close()
+            except BufferError:
+                pass        # O consumidor ainda segura uma view; o GC fecha o mapa depois
+
+def ler_cabecalhos(caminho, chunk_records=CHUNK_RECORDS):
+    """ Gera só (timestamps_s, tamanhos_bytes) em blocos """
+    for _, ts, length, _, _, _ in ler_registros(caminho, chunk_records):
+        yield ts, length
+
+class Acumulador:
+    """ Soma de pesos por intervalo fixo de `largura` segundos (np.bincount por bloco).
+
+    Só guarda um valor por intervalo: uma captura de 10M pacotes ocupa o
+    mesmo que uma de 10 mil com a mesma duração.
+    """
+    def __init__(self, largura=1.0):
+        self.largura = largura
+        self.total = np.zeros(0, dtype=np.float64)
+
+    def indices(self, t_rel):
+        # Pacotes fora de ordem antes do primeiro (raro no tcpdump) caem no intervalo 0;
+        # o epsilon evita que 0.3 / 0.1 = 2.999... vá para o intervalo anterior
+        return np.maximum(np.floor(t_rel / self.largura + 1e-9).astype(np.int64), 0)
+
+    def somar(self, t_rel, pesos):
+        parcial = np.bincount(self.indices(t_rel), weights=pesos)
+        if len(parcial) > len(self.total):
+            parcial[:len(self.total)] += self.total
+            self.total = parcial
+        else:
+            self.total[:len(parcial)] += parcial
+
+    def valores(self, n=None):
+        """ Totais por intervalo, completados com zero (ou cortados) até `n` intervalos """
+        if n is None:
+            return self.total
+        return np.pad(self.total, (0, max(0, n - len(self.total))))[:n]
+
+def throughput_por_segundo(caminho, chunk_records=CHUNK_RECORDS, largura=1.0):
+    """ Bytes por intervalo (padrão: segundo) relativo ao primeiro pacote """
+    acumulador = Acumulador(largura)
+    inicio = None
+    for ts, length in ler_cabecalhos(caminho, chunk_records):
+        if inicio is None:
+            inicio = ts[0]
+        acumulador.somar(ts - inicio, length)
+    return acumulador.valores()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Base Colunar de Resultados)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_resultados.py
+# Descrição: Base única com todos os resultados processados.
+#            - Tabelas: series (1 linha por segundo de captura),
+#              execucoes (1 linha por captura) e fluxos (1 por fluxo TCP).
+#            - Particionada em disco por protocolo / tls / cenário
+#              (layout hive: protocolo=ldap/tls=true/cenario=04_Caos).
+#            - Parquet via pyarrow (filtro empurrado para as partições e
+#              estatísticas dos arquivos); sem pyarrow, NumPy .npz no mesmo
+#              layout, com poda pelas pastas.
+#            - Um arquivo por captura e tabela: reprocessar uma captura
+#              substitui só os arquivos dela (workers não disputam nada).
+# ============================================================
+
+import os
+import re
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+TABELAS = ("series", "execucoes", "fluxos")
+PARTICOES = ("protocolo", "tls", "cenario")
+CHAVES = PARTICOES + ("operacao", "run_id")
+OPERACOES = ("criacao", "modificacao", "delecao")
+CENARIO_PADRAO = "99_Geral"     # Mesmo nome usado pelos juízes para opção inválida
+
+def formato_padrao():
+    return "parquet" if pa is not None else "npz"
+
+# ============================================================
+# CHAVES DA CAPTURA
+# ============================================================
+def chaves_da_captura(caminho_relativo):
+    """ Chaves da captura a partir do caminho relativo a /opt/resultados.
+
+    Layout dos juízes: <protocolo>[_ssl]/<NN_Cenario>/resultado_<operacao>_<protocolo>[...].pcap
+    O run_id é o próprio caminho sem extensão (único por captura).
+    """
+    partes = caminho_relativo.replace(os.sep, "/").split("/")
+    topo = partes[0] if len(partes) > 1 else ""
+    tls = topo.endswith("_ssl")
+    protocolo = topo[:-4] if tls else topo
+    cenario = next((p for p in partes[1:-1] if re.match(r"^\d\d_", p)), CENARIO_PADRAO)
+    nome = os.path.splitext(partes[-1])[0]
+    operacao = next((op for op in OPERACOES if op in nome), "outra")
+    return {"protocolo": protocolo or "desconhecido", "tls": tls, "cenario": cenario,
+            "operacao": operacao, "run_id": os.path.splitext(caminho_relativo.replace(os.sep, "/"))[0]}
+
+def _pasta_particao(raiz, tabela, chaves):
+    return os.path.join(raiz, tabela, f"protocolo={chaves['protocolo']}",
+                        f"tls={str(chaves['tls']).lower()}", f"cenario={chaves['cenario']}")
+
+def _nome_arquivo(chaves):
+    digest = hashlib.blake2b(chaves["run_id"].encode("utf-8"), digest_size=8).hexdigest()
+    return f"{chaves['operacao']}-{digest}"
+
+# ============================================================
+# GRAVAÇÃO
+# ============================================================
+def _gravar_tabela(raiz, tabela, chaves, df, formato):
+    """ Grava o DataFrame de uma captura (sem as colunas de partição, que ficam no caminho) """
+    pasta = _pasta_particao(raiz, tabela, chaves)
+    os.makedirs(pasta, exist_ok=True)
+    df = df.assign(operacao=chaves["operacao"], run_id=chaves["run_id"])
+    destino = os.path.join(pasta, f"{_nome_arquivo(chaves)}.{formato}")
+    # Prefixo "." fica de fora das leituras enquanto o arquivo é escrito
+    tmp = os.path.join(pasta, f".{os.path.basename(destino)}.tmp")
+    if formato == "parquet":
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp)
+    else:
+        with open(tmp, "wb") as f:
+            # Texto como unicode de tamanho fixo: o .npz abre sem pickle
+            np.savez(f, **{c: df[c].to_numpy() if pd.api.types.is_numeric_dtype(df[c]) or pd.api.types.is_bool_dtype(df[c])
+                           else df[c].astype(str).to_numpy(dtype=str) for c in df.columns})
+    os.replace(tmp, destino)
+    return destino
+
+def gravar_captura(raiz, chaves, series, execucao, fluxos=None, formato=None):
+    """ Grava (substituindo) todas as tabelas de uma captura; devolve os arquivos escritos.
+
+    series: DataFrame com segundo, mbps, goodput_mbps, retrans_mbps
+    execucao: dict com as métricas-resumo da captura
+    fluxos: lista de dicts (carto_tcp.AnaliseCaptura.tabela_fluxos)
+    """
+    formato = formato or formato_padrao()
+    arquivos = [
+        _gravar_tabela(raiz, "series", chaves, series, formato),
+        _gravar_tabela(raiz, "execucoes", chaves, pd.DataFrame([execucao]), formato),
+    ]
+    if fluxos:
+        arquivos.append(_gravar_tabela(raiz, "fluxos", chaves, pd.DataFrame(fluxos), formato))
+    return arquivos
+
+# ============================================================
+# CONSULTA
+# ============================================================
+def _valores(v):
+    return list(v) if isinstance(v, (list, tuple, set)) else [v]
+
+def _expressao(filtros):
+    expr = None
+    for coluna, valor in filtros.items():
+        termo = ds.field(coluna).isin(_valores(valor))
+        expr = termo if expr is None else expr & termo
+    return expr
+
+def _particao_do_caminho(pasta):
+    valores = {}
+    for parte in pasta.replace(os.sep, "/").split("/"):
+        if "=" in parte:
+            k, v = parte.split("=", 1)
+            valores[k] = (v == "true") if k == "tls" else v
+    return valores
+
+def _consultar_npz(caminho, colunas, filtros):
+    por_particao = {k: set(_valores(v)) for k, v in filtros.items() if k in PARTICOES}
+    por_linha = {k: _valores(v) for k, v in filtros.items() if k not in PARTICOES}
+    frames = []
+    for pasta, _, arquivos in os.walk(caminho):
+        particao = _particao_do_caminho(os.path.relpath(pasta, caminho))
+        # Poda: pastas de partição que não batem nem são abertas
+        if any(k in particao and particao[k] not in v for k, v in por_particao.items()):
+            continue
+        for arquivo in sorted(a for a in arquivos if a.endswith(".npz") and not a.startswith(".")):
+            with np.load(os.path.join(pasta, arquivo)) as dados:
+                df = pd.DataFrame({c: dados[c] for c in dados.files})
+            for k, v in particao.items():
+                df[k] = v
+            for k, v in por_linha.items():
+                df = df[df[k].isin(v)]
+            frames.append(df[colunas] if colunas else df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=colunas or [])
+
+def consultar(raiz, tabela, colunas=None, **filtros):
+    """ Lê uma tabela com filtros de igualdade (valor único ou lista) em qualquer coluna.
+
+    Ex.: consultar(raiz, "series", protocolo="ldap", tls=True, cenario="04_Caos")
+    Filtros nas colunas de partição não abrem os arquivos das outras partições.
+    """
+    if tabela not in TABELAS:
+        raise ValueError(f"Tabela desconhecida: {tabela} (use {', '.join(TABELAS)})")
+    caminho = os.path.join(raiz, tabela)
+    if not os.path.isdir(caminho):
+        return pd.DataFrame(columns=colunas or [])
+
+    arquivos = []
+    if pa is not None:
+        arquivos = [os.path.join(pasta, a) for pasta, _, fs in os.walk(caminho)
+                    for a in sorted(fs) if a.endswith(".parquet") and not a.startswith(".")]
+    if not arquivos:
+        return _consultar_npz(caminho, colunas, filtros)
+
+    particoes = ds.partitioning(pa.schema([("protocolo", pa.string()), ("tls", pa.bool_()),
+                                           ("cenario", pa.string())]), flavor="hive")
+    dataset = ds.dataset(arquivos, format="parquet", partitioning=particoes, partition_base_dir=caminho)
+    tabela_arrow = dataset.to_table(columns=colunas, filter=_expressao(filtros) if filtros else None)
+    return tabela_arrow.to_pandas()
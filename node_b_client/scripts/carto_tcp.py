@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Análise de Fluxos TCP)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: carto_tcp.py
+# Descrição: Reconstrói os fluxos TCP dos serviços testados a partir das
+#            capturas (leitor nativo carto_pcap), em uma única passada.
+#            - SCIM (5000), LDAP (389) e LDAPS (636).
+#            - Goodput x throughput: bytes de payload novos separados dos
+#              retransmitidos (maior sequência já vista por direção).
+#            - Handshakes, SYNs retransmitidos e RSTs por fluxo.
+#            - RTT do handshake e amostras de RTT por segmento (Karn:
+#              segmentos retransmitidos não geram amostra).
+#            - Operações concluídas (PDUs de resposta) e bytes por operação.
+#            - Latência pedido -> resposta vista no ponto de captura (pares
+#              casados em ordem FIFO por fluxo).
+# ============================================================
+
+import ipaddress
+from collections import deque
+
+import numpy as np
+
+from carto_pcap import ler_registros, Acumulador, CHUNK_RECORDS
+
+PORTAS_SERVICO = {5000: "SCIM", 389: "LDAP", 636: "LDAPS"}
+
+# --- LINKTYPES (tcpdump -i any grava LINUX_SLL) ---
+LINK_NULL, LINK_ETHERNET, LINK_RAW, LINK_LOOP = 0, 1, 101, 108
+LINK_SLL, LINK_SLL2, LINK_IPV4, LINK_IPV6 = 113, 276, 228, 229
+
+TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK = 0x01, 0x02, 0x04, 0x10
+
+SEQ_MOD = 1 << 32
+RTT_AMOSTRAS_MAX = 20000    # Por série; acima disso as amostras são dizimadas
+PENDENTES_MAX = 100000      # Segmentos ainda sem ACK guardados por direção
+
+def _u16(buf, idx):
+    return (buf[idx].astype(np.int64) << 8) | buf[idx + 1]
+
+def _u32(buf, idx):
+    return (_u16(buf, idx) << 16) | _u16(buf, idx + 2)
+
+def _u64(buf, idx):
+    return (_u32(buf, idx).astype(np.uint64) << np.uint64(32)) | _u32(buf, idx + 4).astype(np.uint64)
+
+def _cabecalho_enlace(buf, offset, caplen, linktype):
+    """ Offset da camada IP de cada pacote (-1 se não for IPv4/IPv6) """
+    l3 = np.full(len(offset), -1, dtype=np.int64)
+    ok = caplen >= 24
+
+    eth = ok & (linktype == LINK_ETHERNET)
+    if eth.any():
+        i = np.nonzero(eth)[0]
+        etype = _u16(buf, offset[i] + 12)
+        vlan = etype == 0x8100
+        etype = np.where(vlan, _u16(buf, offset[i] + 16), etype)
+        l3[i] = np.where((etype == 0x0800) | (etype == 0x86DD), np.where(vlan, 18, 14), -1)
+
+    sll = ok & (linktype == LINK_SLL)
+    if sll.any():
+        i = np.nonzero(sll)[0]
+        etype = _u16(buf, offset[i] + 14)
+        l3[i] = np.where((etype == 0x0800) | (etype == 0x86DD), 16, -1)
+
+    sll2 = ok & (linktype == LINK_SLL2)
+    if sll2.any():
+        i = np.nonzero(sll2)[0]
+        etype = _u16(buf, offset[i])
+        l3[i] = np.where((etype == 0x0800) | (etype == 0x86DD), 20, -1)
+
+    # Sem cabeçalho de enlace (ou só a família): a versão do IP decide
+    l3[ok & np.isin(linktype, (LINK_RAW, LINK_IPV4, LINK_IPV6))] = 0
+    l3[ok & np.isin(linktype, (LINK_NULL, LINK_LOOP))] = 4
+    return l3
+
+def extrair_segmentos(buf, ts, length, offset, caplen, linktype):
+    """ Segmentos TCP dos serviços monitorados de um bloco do leitor, como dict de arrays """
+    l3 = _cabecalho_enlace(buf, offset, caplen, linktype)
+    i = np.nonzero(l3 >= 0)[0]
+    ip = offset[i] + l3[i]
+    cap_ip = caplen[i] - l3[i]
+    versao = buf[ip] >> 4
+    # Só lê além do byte de versão quando o pacote capturado comporta IP + TCP mínimos
+    ok = ((versao == 4) & (cap_ip >= 40)) | ((versao == 6) & (cap_ip >= 60))
+    i, ip, cap_ip, versao = i[ok], ip[ok], cap_ip[ok], versao[ok]
+
+    v4 = versao == 4
+    v6 = versao == 6
+    ihl = np.where(v6, 40, (buf[ip] & 0x0F).astype(np.int64) * 4)
+    proto = np.where(v6, buf[np.where(v6, ip + 6, ip)], buf[ip + 9])
+    frag = np.where(v4, _u16(buf, ip + 6) & 0x1FFF, 0)
+    tcp = (v4 | v6) & (proto == 6) & (frag == 0) & (cap_ip >= ihl + 20)
+    i, ip, ihl, v6 = i[tcp], ip[tcp], ihl[tcp], v6[tcp]
+    i_fim = offset[i] + caplen[i]
+
+    t = ip + ihl
+    sport, dport = _u16(buf, t), _u16(buf, t + 2)
+    portas = np.array(list(PORTAS_SERVICO))
+    do_servidor = np.isin(sport, portas)
+    servico = do_servidor | np.isin(dport, portas)
+    i, ip, ihl, v6, t, i_fim = i[servico], ip[servico], ihl[servico], v6[servico], t[servico], i_fim[servico]
+    sport, dport, do_servidor = sport[servico], dport[servico], do_servidor[servico]
+
+    ip_len = np.where(v6, _u16(buf, ip + 4) + 40, _u16(buf, ip + 2))
+    thl = (buf[t + 12] >> 4).astype(np.int64) * 4
+    # IPv4 em (hi=0, lo=endereço); IPv6 nos dois inteiros de 64 bits
+    src_lo = np.where(v6, _u64(buf, np.where(v6, ip + 16, ip)), _u32(buf, ip + 12).astype(np.uint64))
+    dst_lo = np.where(v6, _u64(buf, np.where(v6, ip + 32, ip)), _u32(buf, ip + 16).astype(np.uint64))
+    src_hi = np.where(v6, _u64(buf, np.where(v6, ip + 8, ip)), np.uint64(0))
+    dst_hi = np.where(v6, _u64(buf, np.where(v6, ip + 24, ip)), np.uint64(0))
+
+    def lado(servidor, cliente):
+        return np.where(do_servidor, servidor, cliente)
+
+    return {
+        "ts": ts[i], "wire": length[i], "dir": do_servidor.astype(np.int8),
+        "seq": _u32(buf, t + 4), "ack": _u32(buf, t + 8), "flags": buf[t + 13].astype(np.int64),
+        "plen": np.maximum(ip_len - ihl - thl, 0), "payload": t + thl, "cap_fim": i_fim,
+        "cli_hi": lado(dst_hi, src_hi), "cli_lo": lado(dst_lo, src_lo), "cli_port": lado(dport, sport),
+        "srv_hi": lado(src_hi, dst_hi), "srv_lo": lado(src_lo, dst_lo), "srv_port": lado(sport, dport),
+        "v6": v6,
+    }
+
+def _ip_texto(hi, lo, v6):
+    if v6:
+        return str(ipaddress.IPv6Address((int(hi) << 64) | int(lo)))
+    return str(ipaddress.IPv4Address(int(lo)))
+
+METODOS_HTTP = (b"POST ", b"PUT ", b"PATCH ", b"DELETE ", b"GET ")
+
+def _contar_pdus(buf, inicio, fim, servico, do_servidor=True):
+    """ PDUs (respostas do servidor ou pedidos do cliente) que começam no segmento.
+
+    Heurística por serviço; `fim` = fim capturado do payload.
+    """
+    if servico == "SCIM":
+        cabeca = bytes(buf[inicio:inicio + 7])
+        if do_servidor:
+            return 1 if cabeca.startswith(b"HTTP/") else 0
+        return 1 if cabeca.startswith(METODOS_HTTP) else 0
+
+    total = 0
+    pos = inicio
+    while pos + 2 <= fim:
+        if servico == "LDAP":
+            # LDAPMessage: SEQUENCE (0x30) com comprimento BER
+            if buf[pos] != 0x30:
+                break
+            b1 = int(buf[pos + 1])
+            if b1 < 0x80:
+                tamanho = 2 + b1
+            else:
+                n = b1 & 0x7F
+                if n == 0 or n > 4 or pos + 2 + n > fim:
+                    break
+                tamanho = 2 + n + int.from_bytes(bytes(buf[pos + 2:pos + 2 + n]), "big")
+        else:
+            # Registro TLS: tipo, versão 3.x, comprimento; só application_data conta
+            if pos + 5 > fim or buf[pos] not in (20, 21, 22, 23) or buf[pos + 1] != 3:
+                break
+            tamanho = 5 + ((int(buf[pos + 3]) << 8) | int(buf[pos + 4]))
+            if buf[pos] != 23:
+                pos += tamanho
+                continue
+        total += 1
+        pos += tamanho
+    return total
+
+class Amostras:
+    """ Série de amostras com memória limitada (dizimação por 2 ao passar do limite) """
+    def __init__(self, limite=RTT_AMOSTRAS_MAX):
+        self.limite = limite
+        self.partes = []
+        self.n = 0
+        self.passo = 1
+
+    def guardar(self, amostras):
+        if self.passo > 1:
+            amostras = amostras[::self.passo]
+        self.partes.append(np.asarray(amostras, dtype=np.float64))
+        self.n += len(amostras)
+        if self.n > 2 * self.limite:
+            todas = np.concatenate(self.partes)[::2]
+            self.partes, self.n = [todas], len(todas)
+            self.passo *= 2
+
+    def valores(self):
+        return np.concatenate(self.partes) if self.partes else np.zeros(0)
+
+class Direcao:
+    """ Estado de um sentido do fluxo (cliente->servidor ou servidor->cliente) """
+    def __init__(self):
+        self.isn = None
+        self.max_end = 0            # Maior sequência relativa já coberta
+        self.ack_max = 0            # Maior ACK (relativo a este sentido) vindo do outro lado
+        self.pacotes = 0
+        self.bytes_fio = 0
+        self.bytes_payload = 0
+        self.bytes_novos = 0
+        self.bytes_retrans = 0
+        self.segs_dados = 0
+        self.segs_retrans = 0
+        self.pend_end = np.zeros(0, dtype=np.int64)
+        self.pend_t = np.zeros(0, dtype=np.float64)
+        self.rtt = Amostras()
+
+class Fluxo:
+    """ Um fluxo TCP cliente <-> serviço, atualizado bloco a bloco """
+    def __init__(self, servico, cliente, servidor):
+        self.servico = servico
+        self.cliente = cliente
+        self.servidor = servidor
+        self.dirs = (Direcao(), Direcao())      # 0: cliente->servidor, 1: servidor->cliente
+        self.inicio = None
+        self.fim = None
+        self.syn_pacotes = 0
+        self.syn_isns = set()
+        self.synack_isns = set()
+        self.rst = 0
+        self.t_syn = None
+        self.t_synack = None
+        self.rtt_handshake = None
+        self.operacoes = 0
+        self.pedidos = deque()          # Início dos pedidos ainda sem resposta
+        self.latencia = Amostras()
+
+    def registrar_pdus(self, t, n, do_servidor):
+        """ Pedidos entram na fila; cada resposta fecha o pedido mais antigo (FIFO) """
+        if not do_servidor:
+            self.pedidos.extend([t] * n)
+            return
+        self.operacoes += n
+        fechados = [t - self.pedidos.popleft() for _ in range(min(n, len(self.pedidos)))]
+        if fechados:
+            self.latencia.guardar(fechados)
+
+    def atualizar(self, seg):
+        """ Processa os segmentos do fluxo (ordem de captura); devolve os bytes novos de cada um """
+        ts, direcao, flags, plen = seg["ts"], seg["dir"], seg["flags"], seg["plen"]
+        if self.inicio is None:
+            self.inicio = ts[0]
+        self.fim = ts[-1]
+        self.rst += int(np.count_nonzero(flags & TCP_RST))
+        self._handshake(seg)
+
+        novos = np.zeros(len(ts), dtype=np.int64)
+        for d in (0, 1):
+            m = direcao == d
+            D = self.dirs[d]
+            seq, t, p, f = seg["seq"][m], ts[m], plen[m], flags[m]
+            D.pacotes += len(t)
+            D.bytes_fio += int(seg["wire"][m].sum())
+            if D.isn is None:
+                if not len(t):
+                    continue        # Sentido ainda não visto: nada a confirmar
+                syn = np.nonzero(f & TCP_SYN)[0]
+                D.isn = int(seq[syn[0]] if len(syn) else seq[0])
+
+            dados = p > 0
+            if dados.any():
+                rel = (seq[dados] - D.isn) % SEQ_MOD
+                tam = p[dados]
+                end = rel + tam
+                # Maior fim já visto antes de cada segmento (estado + blocos anteriores)
+                anterior = np.maximum.accumulate(np.concatenate(([D.max_end], end)))[:-1]
+                n = np.clip(end - np.maximum(rel, anterior), 0, tam)
+                retrans = rel < anterior
+                D.max_end = max(D.max_end, int(end.max()))
+                D.segs_dados += len(tam)
+                D.segs_retrans += int(retrans.sum())
+                D.bytes_payload += int(tam.sum())
+                D.bytes_novos += int(n.sum())
+                D.bytes_retrans += int((tam - n).sum())
+                idx = np.nonzero(m)[0][dados]
+                novos[idx] = n
+                self._candidatos_rtt(D, end[~retrans], t[dados][~retrans], rel[retrans], t[dados][retrans])
+
+            # ACKs do outro sentido confirmam os segmentos deste (mesmo sem pacotes deste no bloco)
+            O = np.nonzero((direcao != d) & ((flags & TCP_ACK) != 0))[0]
+            if len(O):
+                a = (seg["ack"][O] - D.isn) % SEQ_MOD
+                a[a > SEQ_MOD // 2] = 0         # ACK anterior ao ISN visto (captura começou no meio)
+                cum = np.maximum.accumulate(np.maximum(a, D.ack_max))
+                D.ack_max = int(cum[-1])
+                self._casar_acks(D, ts[O], cum)
+        return novos
+
+    def _handshake(self, seg):
+        flags, direcao, ts = seg["flags"], seg["dir"], seg["ts"]
+        syn = (flags & TCP_SYN) != 0
+        ack = (flags & TCP_ACK) != 0
+        s = np.nonzero(syn & ~ack & (direcao == 0))[0]
+        if len(s):
+            self.syn_pacotes += len(s)
+            self.syn_isns.update(seg["seq"][s].tolist())
+            if self.t_syn is None:
+                self.t_syn = ts[s[0]]
+        sa = np.nonzero(syn & ack & (direcao == 1))[0]
+        if len(sa):
+            self.synack_isns.update(seg["seq"][sa].tolist())
+            if self.t_synack is None:
+                self.t_synack = ts[sa[0]]
+        # ACK do cliente que fecha o 3-way: SYN -> ACK final = 1 RTT visto de qualquer ponta
+        if self.rtt_handshake is None and self.t_synack is not None and self.t_syn is not None:
+            c = np.nonzero(ack & ~syn & (direcao == 0) & (ts >= self.t_synack))[0]
+            if len(c):
+                self.rtt_handshake = ts[c[0]] - self.t_syn
+
+    def _candidatos_rtt(self, D, end, t, rel_retrans, t_retrans):
+        """ Guarda segmentos originais à espera de ACK; descarta os que foram retransmitidos (Karn) """
+        pend_end = np.concatenate((D.pend_end, end))
+        pend_t = np.concatenate((D.pend_t, t))
+        if len(rel_retrans) and len(pend_end):
+            # Menor início retransmitido depois de cada segmento pendente
+            sufixo = np.minimum.accumulate(rel_retrans[::-1])[::-1]
+            j = np.searchsorted(t_retrans, pend_t, side="right")
+            valido = j < len(sufixo)
+            ambiguo = np.zeros(len(pend_end), dtype=bool)
+            ambiguo[valido] = sufixo[j[valido]] < pend_end[valido]
+            pend_end, pend_t = pend_end[~ambiguo], pend_t[~ambiguo]
+        D.pend_end, D.pend_t = pend_end[-PENDENTES_MAX:], pend_t[-PENDENTES_MAX:]
+
+    def _casar_acks(self, D, t_ack, cum):
+        if not len(D.pend_end):
+            return
+        # Primeiro ACK depois do envio cujo acumulado cobre o fim do segmento
+        k = np.maximum(np.searchsorted(t_ack, D.pend_t, side="right"),
+                       np.searchsorted(cum, D.pend_end, side="left"))
+        ok = k < len(t_ack)
+        if ok.any():
+            D.rtt.guardar(t_ack[k[ok]] - D.pend_t[ok])
+        D.pend_end, D.pend_t = D.pend_end[~ok], D.pend_t[~ok]
+
+    def resumo(self):
+        c, s = self.dirs
+        payload = c.bytes_payload + s.bytes_payload
+        retrans = c.bytes_retrans + s.bytes_retrans
+        novos = c.bytes_novos + s.bytes_novos
+        fio = c.bytes_fio + s.bytes_fio
+        duracao = (self.fim - self.inicio) if self.inicio is not None else 0.0
+        # Sentido com a espera real: perto do ponto de captura o RTT medido é ~0
+        rtts = [d.rtt.valores() for d in self.dirs]
+        rtt = max(rtts, key=lambda a: np.median(a) if len(a) else -1)
+        lat = self.latencia.valores()
+        return {
+            "servico": self.servico, "cliente": self.cliente, "servidor": self.servidor,
+            "inicio": self.inicio, "duracao_s": duracao,
+            "pacotes": c.pacotes + s.pacotes, "bytes_fio": fio, "bytes_payload": payload,
+            "bytes_goodput": novos, "bytes_retrans": retrans,
+            "retrans_ratio": retrans / payload if payload else 0.0,
+            "segs_retrans": c.segs_retrans + s.segs_retrans,
+            "goodput_kbps": novos * 8 / 1000 / duracao if duracao > 0 else 0.0,
+            "handshakes": len(self.synack_isns), "syn_tentativas": len(self.syn_isns),
+            "syn_retrans": max(0, self.syn_pacotes - len(self.syn_isns)), "rst": self.rst,
+            "rtt_handshake_ms": self.rtt_handshake * 1000 if self.rtt_handshake is not None else np.nan,
+            "rtt_amostras": len(rtt),
+            "rtt_mediana_ms": float(np.median(rtt)) * 1000 if len(rtt) else np.nan,
+            "rtt_p90_ms": float(np.percentile(rtt, 90)) * 1000 if len(rtt) else np.nan,
+            "operacoes": self.operacoes,
+            "bytes_por_op": fio / self.operacoes if self.operacoes else np.nan,
+            "lat_amostras": len(lat),
+            "lat_mediana_ms": float(np.median(lat)) * 1000 if len(lat) else np.nan,
+            "lat_p99_ms": float(np.percentile(lat, 99)) * 1000 if len(lat) else np.nan,
+        }
+
+class AnaliseCaptura:
+    """ Resultado da passada única: séries por intervalo + fluxos.
+
+    Guarda só acumuladores (bytes, goodput, retransmissão) por segundo e,
+    se `sub_intervalo` for dado (ex.: 0.1), também na resolução fina.
+    """
+    def __init__(self, sub_intervalo=None):
+        self.inicio = None
+        self.larguras = (1.0,) + ((sub_intervalo,) if sub_intervalo else ())
+        self.acumuladores = {largura: {nome: Acumulador(largura) for nome in ("bytes", "goodput", "retrans")}
+                             for largura in self.larguras}
+        self.fluxos = {}
+
+    def _somar(self, nome, ts, pesos):
+        for largura in self.larguras:
+            self.acumuladores[largura][nome].somar(ts - self.inicio, pesos)
+
+    def processar_bloco(self, buf, ts, length, offset, caplen, linktype):
+        if self.inicio is None:
+            self.inicio = ts[0]
+        self._somar("bytes", ts, length)
+
+        seg = extrair_segmentos(buf, ts, length, offset, caplen, linktype)
+        if not len(seg["ts"]):
+            return
+        chaves = np.rec.fromarrays([seg["cli_hi"], seg["cli_lo"], seg["cli_port"],
+                                    seg["srv_hi"], seg["srv_lo"], seg["srv_port"]])
+        unicas, inverso = np.unique(chaves, return_inverse=True)
+        ordem = np.argsort(inverso, kind="stable")
+        limites = np.searchsorted(inverso[ordem], np.arange(len(unicas) + 1))
+
+        novos = np.zeros(len(ordem), dtype=np.int64)
+        for k, chave in enumerate(unicas):
+            idx = ordem[limites[k]:limites[k + 1]]
+            fluxo = self._fluxo(tuple(chave.tolist()), bool(seg["v6"][idx[0]]))
+            parte = {nome: valores[idx] for nome, valores in seg.items()}
+            novos[idx] = fluxo.atualizar(parte)
+
+            # Pedidos e respostas: segmentos novos (não retransmitidos) que começam PDUs
+            dados = np.nonzero((parte["plen"] > 0) & (novos[idx] == parte["plen"]))[0]
+            for r in dados:
+                inicio = int(parte["payload"][r])
+                fim = min(inicio + int(parte["plen"][r]), int(parte["cap_fim"][r]))
+                do_servidor = bool(parte["dir"][r])
+                n = _contar_pdus(buf, inicio, fim, fluxo.servico, do_servidor)
+                if n:
+                    fluxo.registrar_pdus(float(parte["ts"][r]), n, do_servidor)
+
+        self._somar("goodput", seg["ts"], novos)
+        self._somar("retrans", seg["ts"], seg["plen"] - novos)
+
+    def _fluxo(self, chave, v6):
+        fluxo = self.fluxos.get(chave)
+        if fluxo is None:
+            cli_hi, cli_lo, cli_port, srv_hi, srv_lo, srv_port = chave
+            fluxo = Fluxo(PORTAS_SERVICO[srv_port],
+                          f"{_ip_texto(cli_hi, cli_lo, v6)}:{cli_port}",
+                          f"{_ip_texto(srv_hi, srv_lo, v6)}:{srv_port}")
+            self.fluxos[chave] = fluxo
+        return fluxo
+
+    def series(self, largura=1.0):
+        """ Bytes, goodput e retransmissão por intervalo, alinhados no mesmo eixo """
+        acumuladores = self.acumuladores[largura]
+        bytes_intervalo = acumuladores["bytes"].valores()
+        n = len(bytes_intervalo)
+        return bytes_intervalo, acumuladores["goodput"].valores(n), acumuladores["retrans"].valores(n)
+
+    def latencias(self):
+        """ Todas as amostras de latência pedido -> resposta da captura (segundos) """
+        partes = [f.latencia.valores() for f in self.fluxos.values()]
+        return np.concatenate(partes) if partes else np.zeros(0)
+
+    def tabela_fluxos(self):
+        return [f.resumo() for f in sorted(self.fluxos.values(), key=lambda f: f.inicio)]
+
+def analisar_pcap(caminho, chunk_records=CHUNK_RECORDS, sub_intervalo=None):
+    analise = AnaliseCaptura(sub_intervalo)
+    for bloco in ler_registros(caminho, chunk_records):
+        analise.processar_bloco(*bloco)
+    return analise
@@ -1,10 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
 import subprocess
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Sem display: renderização headless em cada worker
 import matplotlib.pyplot as plt
-import io
+
+from carto_pcap import FormatoDesconhecido, Acumulador, CHUNK_RECORDS
+from carto_tcp import analisar_pcap
+import carto_resultados
 
 # --- CONFIGURAÇÕES DE DIRETÓRIO ---
 # Onde estão os arquivos originais (.pcap)
@@ -13,13 +25,28 @@ DIR_ORIGEM = "/opt/resultados"
 # Onde serão salvos os gráficos e CSVs (Estrutura Espelhada)
 DIR_DESTINO = "/opt/resultados_graph"
 
-def processar_pcap(caminho_pcap, pasta_saida):
-    nome_arquivo = os.path.basename(caminho_pcap)
-    base_name = nome_arquivo.replace('.pcap', '')
-    
-    print(f" -> Processando: {nome_arquivo}")
+# Base colunar única com todas as capturas processadas (ver carto_resultados)
+DATASET = "_dataset"                   # Dentro de DIR_DESTINO
+
+# --- PARALELISMO ---
+# Cada worker processa uma captura por vez com memória limitada pelo bloco do
+# leitor nativo; é reciclado após WORKER_MAX_TAREFAS capturas para devolver a
+# memória do matplotlib/pandas ao sistema.
+WORKERS = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+WORKER_MAX_TAREFAS = 20
 
-    # 1. TShark: Extração
+# --- CACHE INCREMENTAL ---
+# Capturas com mesmo tamanho/mtime (ou mesmo conteúdo) e mesma versão da
+# análise não são reprocessadas. Incremente ANALISE_VERSAO sempre que mudar
+# o que é extraído ou desenhado, para invalidar as saídas antigas.
+ANALISE_VERSAO = 4                     # 2: goodput/retransmissão + _fluxos.csv; 3: base colunar; 4: latência
+MANIFESTO = ".manifesto.json"          # Dentro de DIR_DESTINO
+HASH_BLOCO = 8 * 1024 * 1024
+RESUMO_CACHE = ("duracao", "mb", "pico", "retrans", "fluxos")   # Colunas da tabela guardadas no manifesto
+
+def bytes_por_intervalo_tshark(caminho_pcap, larguras=(1.0,), linhas_bloco=CHUNK_RECORDS):
+    """ Extração via tshark em fluxo: a saída é lida em blocos de `linhas_bloco` pacotes
+    e só os acumuladores ficam na memória; devolve {largura: bytes por intervalo} ou None """
     cmd = [
         "tshark", "-r", caminho_pcap, 
         "-T", "fields", 
@@ -28,63 +55,228 @@ def processar_pcap(caminho_pcap, pasta_saida):
         "-E", "separator=,", 
         "-E", "header=n"
     ]
-    
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if not result.stdout:
-            print(f"    [AVISO] Arquivo vazio ou inválido: {nome_arquivo}")
-            return
-
-        # 2. Pandas: Cálculos
-        data = io.StringIO(result.stdout)
+    acumuladores = {largura: Acumulador(largura) for largura in larguras}
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True) as proc:
         # Tenta ler, se falhar (arquivo vazio ou corrompido), pula
         try:
-            df = pd.read_csv(data, names=["time", "bytes"])
+            for bloco in pd.read_csv(proc.stdout, names=["time", "bytes"], chunksize=linhas_bloco):
+                tempos = bloco["time"].to_numpy(dtype=np.float64)
+                tamanhos = bloco["bytes"].to_numpy(dtype=np.float64)
+                for acumulador in acumuladores.values():
+                    acumulador.somar(tempos, tamanhos)
         except pd.errors.EmptyDataError:
-            print(f"    [PULADO] Sem dados no pcap.")
-            return
+            return None
+        finally:
+            proc.stdout.close()
+            proc.kill()     # Sem efeito se já terminou; encerra o tshark se a leitura falhou no meio
+    if not len(acumuladores[larguras[0]].valores()):
+        return None
+    return {largura: acumulador.valores() for largura, acumulador in acumuladores.items()}
 
-        df['segundo'] = df['time'].astype(float).astype(int)
-        
-        # Converte Bytes -> Megabits (Mbps)
-        throughput = df.groupby('segundo')['bytes'].sum() * 8 / 1000000
-        
-        # Preenche buracos de tempo com 0
-        if not throughput.empty:
-            throughput = throughput.reindex(range(int(throughput.index.min()), int(throughput.index.max()) + 1), fill_value=0)
+def dir_dataset():
+    return os.path.join(DIR_DESTINO, DATASET)
+
+def desenhar_grafico(vetor, base_name, caminho_png):
+    """ PNG do throughput (e goodput, se houver) a partir do vetor por segundo """
+    throughput = vetor["Mbps"]
+    fig = plt.figure(figsize=(10, 5))
+    plt.plot(throughput.index, throughput.values, label=f'{base_name}', color='#1f77b4', linewidth=1.5)
+    plt.fill_between(throughput.index, throughput.values, color='#1f77b4', alpha=0.1) # Um charme visual
+    if "Goodput_Mbps" in vetor and vetor["Goodput_Mbps"].notna().any():
+        plt.plot(vetor.index, vetor["Goodput_Mbps"], label='Goodput (TCP)', color='#2ca02c', linewidth=1.2)
+    
+    plt.title(f"Throughput Network: {base_name}")
+    plt.xlabel("Tempo (segundos)")
+    plt.ylabel("Throughput (Mbps)")
+    plt.grid(True, linestyle='--', alpha=0.5)
+    plt.legend()
+    plt.tight_layout()
+    
+    plt.savefig(caminho_png, dpi=100)
+    plt.close(fig)
+
+def metricas_execucao(resumo, fluxos, latencias):
+    """ Linha da tabela `execucoes` da base colunar (latências em segundos) """
+    df = pd.DataFrame(fluxos)
+    p50, p95, p99 = np.percentile(latencias, [50, 95, 99]) * 1000 if len(latencias) else (np.nan,) * 3
+    operacoes = int(df["operacoes"].sum()) if fluxos else 0
+    mediana = lambda coluna: float(df[coluna].median()) if fluxos else np.nan
+    return {
+        "processado_em": time.time(), "duracao_s": int(resumo["duracao"]), "mb": float(resumo["mb"]),
+        "pico_mbps": float(resumo["pico"]),
+        "retrans_pct": float(resumo["retrans"]) if resumo["retrans"] is not None else np.nan,
+        "fluxos": len(fluxos), "operacoes": operacoes,
+        "bytes_por_op": float(df["bytes_fio"].sum()) / operacoes if operacoes else np.nan,
+        "handshakes": int(df["handshakes"].sum()) if fluxos else 0,
+        "syn_retrans": int(df["syn_retrans"].sum()) if fluxos else 0,
+        "rst": int(df["rst"].sum()) if fluxos else 0,
+        "rtt_handshake_ms": mediana("rtt_handshake_ms"), "rtt_mediana_ms": mediana("rtt_mediana_ms"),
+        "lat_amostras": len(latencias), "lat_p50_ms": float(p50), "lat_p95_ms": float(p95), "lat_p99_ms": float(p99),
+    }
+
+def vetor_mbps(bytes_intervalo, largura, goodput=None, retrans=None):
+    """ DataFrame Mbps (+ goodput/retransmissão) indexado pelo início do intervalo """
+    escala = 8 / 1000000 / largura
+    vetor = pd.DataFrame({"Mbps": bytes_intervalo * escala})
+    if goodput is not None:
+        vetor["Goodput_Mbps"] = goodput * escala
+        vetor["Retrans_Mbps"] = retrans * escala
+    return vetor
+
+def processar_pcap(caminho_pcap, pasta_saida, usar_tshark=False, bin_ms=None, chunk=CHUNK_RECORDS):
+    """ Gera _vetor.csv, _fluxos.csv, _grafico.png e as linhas da base colunar; devolve o resumo para a tabela final.
+
+    Memória constante no tamanho da captura: os pacotes são lidos em blocos de
+    `chunk` e só ficam acumuladores por segundo (e por `bin_ms`, se pedido,
+    gravados em _vetor_<bin_ms>ms.csv).
+    """
+    nome_arquivo = os.path.basename(caminho_pcap)
+    base_name = os.path.splitext(nome_arquivo)[0]
+    inicio = time.monotonic()
+    resumo = {"arquivo": caminho_pcap, "status": "OK", "duracao": 0, "mb": 0.0,
+              "pico": 0.0, "retrans": None, "fluxos": 0, "tempo": 0.0, "detalhe": "", "saidas": []}
+
+    sub_intervalo = bin_ms / 1000 if bin_ms else None
+    try:
+        # 1. Extração: uma passada no arquivo mapeado gera throughput e fluxos TCP
+        #    (o tshark só entrega o throughput)
+        bytes_segundo = None
+        analise = None
+        fino = None
+        if not usar_tshark:
+            try:
+                analise = analisar_pcap(caminho_pcap, chunk, sub_intervalo)
+                bytes_segundo = analise.series()[0] if analise.inicio is not None else np.zeros(0)
+                if sub_intervalo and analise.inicio is not None:
+                    bytes_fino, goodput_fino, retrans_fino = analise.series(sub_intervalo)
+                    fino = vetor_mbps(bytes_fino, sub_intervalo, goodput_fino, retrans_fino)
+            except FormatoDesconhecido:
+                if not shutil.which("tshark"):
+                    raise
+                resumo["detalhe"] = "formato não suportado pelo leitor nativo, usado tshark"
+        if bytes_segundo is None:
+            larguras = (1.0,) + ((sub_intervalo,) if sub_intervalo else ())
+            intervalos = bytes_por_intervalo_tshark(caminho_pcap, larguras, chunk)
+            if intervalos is not None:
+                bytes_segundo = intervalos[1.0]
+                if sub_intervalo:
+                    fino = vetor_mbps(intervalos[sub_intervalo], sub_intervalo)
+
+        if bytes_segundo is None or len(bytes_segundo) == 0:
+            resumo["status"] = "VAZIO"
+            resumo["detalhe"] = "arquivo vazio ou inválido"
+            return resumo
+
+        # 2. Converte Bytes -> Megabits (Mbps); segundos sem pacote já valem 0
+        vetor = vetor_mbps(bytes_segundo, 1.0, *(analise.series()[1:] if analise is not None else ()))
+        vetor.index.name = "segundo"
+        throughput = vetor["Mbps"]
 
         # 3. Exportação
         
-        # A) CSV (Vetor numérico)
+        # A) CSV (Vetor numérico); a coluna Mbps continua sendo a primeira
         caminho_csv = os.path.join(pasta_saida, f"{base_name}_vetor.csv")
-        throughput.to_csv(caminho_csv, header=["Mbps"])
-        
-        # B) Gráfico PNG
-        plt.figure(figsize=(10, 5))
-        plt.plot(throughput.index, throughput.values, label=f'{base_name}', color='#1f77b4', linewidth=1.5)
-        plt.fill_between(throughput.index, throughput.values, color='#1f77b4', alpha=0.1) # Um charme visual
-        
-        plt.title(f"Throughput Network: {base_name}")
-        plt.xlabel("Tempo (segundos)")
-        plt.ylabel("Throughput (Mbps)")
-        plt.grid(True, linestyle='--', alpha=0.5)
-        plt.legend()
-        plt.tight_layout()
+        vetor.to_csv(caminho_csv)
+        saidas = [caminho_csv]
+        if fino is not None:
+            # Mesmo vetor em intervalos de bin_ms (início do intervalo em segundos)
+            fino.index = np.round(fino.index * sub_intervalo, 6)
+            fino.index.name = "tempo_s"
+            caminho_fino = os.path.join(pasta_saida, f"{base_name}_vetor_{bin_ms}ms.csv")
+            fino.to_csv(caminho_fino)
+            saidas.append(caminho_fino)
+
+        # B) CSV por fluxo TCP (goodput, retransmissão, handshakes, RTT, bytes/operação)
+        fluxos = analise.tabela_fluxos() if analise is not None else []
+        latencias = analise.latencias() if analise is not None else np.zeros(0)
+        if fluxos:
+            caminho_fluxos = os.path.join(pasta_saida, f"{base_name}_fluxos.csv")
+            pd.DataFrame(fluxos).to_csv(caminho_fluxos, index=False)
+            saidas.append(caminho_fluxos)
+            payload = float(vetor["Goodput_Mbps"].sum() + vetor["Retrans_Mbps"].sum())
+            resumo.update(retrans=100 * float(vetor["Retrans_Mbps"].sum()) / payload if payload else 0.0,
+                          fluxos=len(fluxos))
         
+        resumo.update(duracao=len(throughput), mb=float(bytes_segundo.sum()) / 1e6, pico=float(throughput.max()))
+
+        # C) Base colunar (série por segundo + resumo + fluxos desta captura)
+        chaves = carto_resultados.chaves_da_captura(os.path.relpath(caminho_pcap, DIR_ORIGEM))
+        serie = vetor.reindex(columns=["Mbps", "Goodput_Mbps", "Retrans_Mbps"]).rename(columns=str.lower).reset_index()
+        saidas += carto_resultados.gravar_captura(dir_dataset(), chaves, serie,
+                                                  metricas_execucao(resumo, fluxos, latencias), fluxos)
+
+        # D) Gráfico PNG
         caminho_png = os.path.join(pasta_saida, f"{base_name}_grafico.png")
-        plt.savefig(caminho_png, dpi=100)
-        plt.close()
-        
+        desenhar_grafico(vetor, base_name, caminho_png)
+        resumo["saidas"] = saidas + [caminho_png]
     except Exception as e:
-        print(f"    [ERRO CRÍTICO] Falha em {nome_arquivo}: {e}")
+        resumo["status"] = "ERRO"
+        resumo["detalhe"] = str(e)
+    finally:
+        resumo["tempo"] = time.monotonic() - inicio
+    return resumo
 
-def main():
-    print("="*60)
-    print(f"INICIANDO PROCESSAMENTO MASSIVO")
-    print(f"Origem:  {DIR_ORIGEM}")
-    print(f"Destino: {DIR_DESTINO}")
-    print("="*60)
+# ============================================================
+# CACHE INCREMENTAL (MANIFESTO)
+# ============================================================
+def hash_arquivo(caminho):
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(HASH_BLOCO), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def carregar_manifesto():
+    try:
+        with open(os.path.join(DIR_DESTINO, MANIFESTO)) as f:
+            return json.load(f).get("capturas", {})
+    except (OSError, ValueError):
+        return {}
+
+def salvar_manifesto(capturas):
+    os.makedirs(DIR_DESTINO, exist_ok=True)
+    caminho = os.path.join(DIR_DESTINO, MANIFESTO)
+    with open(caminho + ".tmp", "w") as f:
+        json.dump({"versao_analise": ANALISE_VERSAO, "capturas": capturas}, f, indent=1, sort_keys=True)
+    os.replace(caminho + ".tmp", caminho)
+
+def entrada_valida(entrada, bin_ms=None):
+    """ Entrada da mesma versão da análise, mesma resolução fina e com todas as saídas ainda no disco """
+    return (entrada is not None and entrada.get("versao") == ANALISE_VERSAO
+            and entrada.get("bin_ms") == bin_ms
+            and all(os.path.exists(s) for s in entrada.get("saidas", [])))
+
+def processar_tarefa(caminho_pcap, pasta_saida, usar_tshark, hash_anterior, bin_ms=None, chunk=CHUNK_RECORDS):
+    """ Executa no worker: confere o conteúdo antes de reprocessar uma captura cujo mtime mudou """
+    h = hash_arquivo(caminho_pcap)
+    if h == hash_anterior:
+        return {"arquivo": caminho_pcap, "status": "CACHE", "hash": h, "tempo": 0.0, "detalhe": ""}
+    resumo = processar_pcap(caminho_pcap, pasta_saida, usar_tshark, bin_ms, chunk)
+    resumo["hash"] = h
+    return resumo
+
+def remover_saidas(saidas, manter=()):
+    """ Apaga as saídas antigas de uma captura, exceto as que a nova entrada ainda usa """
+    manter = set(manter)
+    for saida in saidas:
+        if saida in manter:
+            continue
+        try:
+            os.remove(saida)
+        except FileNotFoundError:
+            pass
 
+def podar_saidas(manifesto, vistos):
+    """ Remove saídas (e entradas) de capturas que não existem mais na origem """
+    removidos = 0
+    for rel in [r for r in manifesto if r not in vistos]:
+        remover_saidas(manifesto.pop(rel).get("saidas", []))
+        removidos += 1
+    return removidos
+
+def listar_capturas():
+    """ (pcap, pasta de destino) de toda a árvore, criando as pastas espelhadas """
+    tarefas = []
     # Caminha recursivamente por todas as pastas
     for root, dirs, files in os.walk(DIR_ORIGEM):
         
@@ -92,25 +284,158 @@ def main():
         if DIR_DESTINO in root:
             continue
 
+        # Filtra apenas capturas (.pcap / .pcapng)
+        pcaps = sorted(f for f in files if f.endswith(('.pcap', '.pcapng')))
+        if not pcaps:
+            continue
+
         # Calcula o caminho relativo (ex: ldap_ssl/02_Radio_Tatico)
         caminho_relativo = os.path.relpath(root, DIR_ORIGEM)
         
         # Cria o caminho correspondente no destino
         pasta_atual_destino = os.path.join(DIR_DESTINO, caminho_relativo)
-        
-        if not os.path.exists(pasta_atual_destino):
-            os.makedirs(pasta_atual_destino)
+        os.makedirs(pasta_atual_destino, exist_ok=True)
 
-        # Filtra apenas arquivos .pcap
-        pcaps = [f for f in files if f.endswith('.pcap')]
-        
-        if pcaps:
-            print(f"\n📂 Pasta: {caminho_relativo}")
-            for arquivo in pcaps:
-                caminho_completo_origem = os.path.join(root, arquivo)
-                processar_pcap(caminho_completo_origem, pasta_atual_destino)
+        for arquivo in pcaps:
+            tarefas.append((os.path.join(root, arquivo), pasta_atual_destino))
+    return tarefas
+
+def redesenhar_do_dataset(filtros):
+    """ Refaz os PNGs só com a base colunar (sem abrir nenhum pcap) """
+    series = carto_resultados.consultar(dir_dataset(), "series", **filtros)
+    if series.empty:
+        print("[AVISO] Nenhuma série na base para os filtros informados.")
+        return
+    colunas = {"mbps": "Mbps", "goodput_mbps": "Goodput_Mbps", "retrans_mbps": "Retrans_Mbps"}
+    for run_id, grupo in series.groupby("run_id"):
+        pasta = os.path.join(DIR_DESTINO, os.path.dirname(run_id))
+        os.makedirs(pasta, exist_ok=True)
+        base_name = os.path.basename(run_id)
+        vetor = grupo.sort_values("segundo").set_index("segundo")[list(colunas)].rename(columns=colunas)
+        desenhar_grafico(vetor, base_name, os.path.join(pasta, f"{base_name}_grafico.png"))
+        print(f" [GRAFICO] {run_id}")
+    print(f"[SUCESSO] {series['run_id'].nunique()} gráficos refeitos a partir de {dir_dataset()}")
+
+def imprimir_resumo(resumos, tempo_total):
+    print("\n" + "="*116)
+    print(f"{'CAPTURA':<55} {'STATUS':<6} {'DUR(s)':>7} {'MB':>9} {'PICO Mbps':>10} {'FLUXOS':>7} {'RETR%':>6} {'PROC(s)':>8}")
+    print("-"*116)
+    for r in sorted(resumos, key=lambda r: r["arquivo"]):
+        nome = os.path.relpath(r["arquivo"], DIR_ORIGEM)
+        if len(nome) > 55: nome = "..." + nome[-52:]
+        retrans = f"{r['retrans']:>6.2f}" if r.get("retrans") is not None else f"{'-':>6}"
+        print(f"{nome:<55} {r['status']:<6} {r['duracao']:>7} {r['mb']:>9.1f} {r['pico']:>10.2f} "
+              f"{r.get('fluxos', 0):>7} {retrans} {r['tempo']:>8.1f}")
+        if r["detalhe"]:
+            print(f"{'':<4}[{r['status']}] {r['detalhe']}")
+    print("-"*116)
+    ok = sum(r["status"] == "OK" for r in resumos)
+    print(f"Capturas: {len(resumos)} | OK: {ok} | Cache: {sum(r['status'] == 'CACHE' for r in resumos)} | Vazias: {sum(r['status'] == 'VAZIO' for r in resumos)} | "
+          f"Erros: {sum(r['status'] == 'ERRO' for r in resumos)} | Tempo total: {tempo_total:.1f} s")
+    print("="*116)
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera vetores de throughput, fluxos TCP e gráficos a partir dos pcaps")
+    parser.add_argument("--tshark", action="store_true",
+                        help="extrai com tshark em vez do leitor nativo (mais lento)")
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS,
+                        help=f"processos em paralelo (padrão: {WORKERS} = núcleos; 1 = serial)")
+    parser.add_argument("--force", action="store_true",
+                        help="reprocessa todas as capturas, ignorando o manifesto")
+    parser.add_argument("--prune", action="store_true",
+                        help="apaga saídas de capturas que não existem mais na origem")
+    parser.add_argument("--bin-ms", type=int, default=None,
+                        help="também gera _vetor_<N>ms.csv com intervalos de N ms (ex.: 100)")
+    parser.add_argument("--chunk", type=int, default=CHUNK_RECORDS,
+                        help=f"pacotes lidos por bloco; limita a memória por worker (padrão: {CHUNK_RECORDS})")
+    parser.add_argument("--graficos", action="store_true",
+                        help="só refaz os gráficos lendo a base colunar (não lê pcaps)")
+    parser.add_argument("--protocolo", help="filtro do --graficos (ex.: ldap, scim)")
+    parser.add_argument("--tls", choices=["sim", "nao"], help="filtro do --graficos")
+    parser.add_argument("--cenario", help="filtro do --graficos (ex.: 04_Caos)")
+    parser.add_argument("--operacao", choices=carto_resultados.OPERACOES, help="filtro do --graficos")
+    args = parser.parse_args()
+
+    if args.graficos:
+        filtros = {k: getattr(args, k) for k in ("protocolo", "cenario", "operacao") if getattr(args, k)}
+        if args.tls:
+            filtros["tls"] = args.tls == "sim"
+        redesenhar_do_dataset(filtros)
+        return
+
+    print("="*60)
+    print(f"INICIANDO PROCESSAMENTO MASSIVO")
+    print(f"Origem:  {DIR_ORIGEM}")
+    print(f"Destino: {DIR_DESTINO}")
+    print(f"Leitor:  {'tshark' if args.tshark else 'nativo (mmap + NumPy, fluxos TCP)'}")
+    print(f"Workers: {args.workers} | Bloco: {args.chunk} pacotes" + (f" | Intervalo fino: {args.bin_ms} ms" if args.bin_ms else ""))
+    print(f"Base:    {dir_dataset()} ({carto_resultados.formato_padrao()})")
+    print("="*60)
+
+    tarefas = listar_capturas()
+    manifesto = carregar_manifesto()
+    vistos = set()
+    resumos = []
+    pendentes = []
+    inicio = time.monotonic()
+
+    def progresso(resumo):
+        resumos.append(resumo)
+        nome = os.path.relpath(resumo["arquivo"], DIR_ORIGEM)
+        print(f" [{len(resumos):>4}/{len(tarefas)}] {resumo['status']:<5} {nome} ({resumo['tempo']:.1f} s)")
+
+    def registrar(resumo, st):
+        """ Atualiza o manifesto com o resultado de uma captura """
+        rel = os.path.relpath(resumo["arquivo"], DIR_ORIGEM)
+        if resumo["status"] == "CACHE":
+            entrada = manifesto[rel]
+            entrada.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            resumo.update({k: entrada[k] for k in RESUMO_CACHE})
+        elif resumo["status"] == "OK":
+            # Entrada substituída (--bin-ms, versão da análise, pcap novo): some com o que
+            # a anterior gerou e a nova não regrava (ex.: <captura>_vetor_<N>ms.csv)
+            if rel in manifesto:
+                remover_saidas(manifesto[rel].get("saidas", []), resumo["saidas"])
+            manifesto[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": resumo["hash"],
+                              "versao": ANALISE_VERSAO, "bin_ms": args.bin_ms, "saidas": resumo["saidas"],
+                              **{k: resumo[k] for k in RESUMO_CACHE}}
+        elif rel in manifesto:
+            # Vazia/erro: tenta de novo na próxima execução; as saídas antigas ficam
+            # registradas (entrada inválida) para o próximo OK ou a poda apagarem
+            manifesto[rel] = {"saidas": manifesto[rel].get("saidas", [])}
+        progresso(resumo)
+
+    # Decide, só com stat(), o que pode ser reaproveitado sem abrir o arquivo
+    for caminho, pasta in tarefas:
+        rel = os.path.relpath(caminho, DIR_ORIGEM)
+        vistos.add(rel)
+        st = os.stat(caminho)
+        entrada = manifesto.get(rel)
+        valida = not args.force and entrada_valida(entrada, args.bin_ms)
+        if valida and entrada["size"] == st.st_size and entrada["mtime_ns"] == st.st_mtime_ns:
+            progresso({"arquivo": caminho, "status": "CACHE", "tempo": 0.0, "detalhe": "",
+                       **{k: entrada[k] for k in RESUMO_CACHE}})
+        else:
+            pendentes.append((caminho, pasta, st, entrada["hash"] if valida else None))
+
+    try:
+        if args.workers <= 1:
+            for caminho, pasta, st, hash_anterior in pendentes:
+                registrar(processar_tarefa(caminho, pasta, args.tshark, hash_anterior, args.bin_ms, args.chunk), st)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, max_tasks_per_child=WORKER_MAX_TAREFAS) as executor:
+                futuros = {executor.submit(processar_tarefa, caminho, pasta, args.tshark, hash_anterior,
+                                           args.bin_ms, args.chunk): st
+                           for caminho, pasta, st, hash_anterior in pendentes}
+                for futuro in as_completed(futuros):
+                    registrar(futuro.result(), futuros[futuro])
+    finally:
+        # Grava mesmo se interrompido: o que já terminou não é refeito
+        if args.prune:
+            print(f"[PODA] Capturas removidas da origem: {podar_saidas(manifesto, vistos)}")
+        salvar_manifesto(manifesto)
 
-    print("\n" + "="*60)
+    imprimir_resumo(resumos, time.monotonic() - inicio)
     print("PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
     print(f"Verifique os resultados em: {DIR_DESTINO}")
 
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Relatório Comparativo entre Cenários)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: gerador_relatorio_comparativo.py
+# Descrição: Lê de uma vez todas as execuções da base colunar (gerada
+#            pelo gerador_graficos_massivo.py) e compara LDAP x SCIM,
+#            com e sem TLS, nos cenários de rede.
+#            - Média e IC 95% (t de Student) entre repetições de cada
+#              protocolo / TLS / cenário / operação.
+#            - Tempo de convergência, volume total, bytes por operação e
+#              latência p50/p95/p99 (pedido -> resposta na captura).
+#            - Gráficos comparativos numa única passada + resumo.json
+#              (para a dissertação e para as revisões de operação).
+# ============================================================
+
+import os
+import json
+import math
+import argparse
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import carto_resultados
+
+# --- CONFIGURAÇÕES DE DIRETÓRIO (mesmas do gerador_graficos_massivo.py) ---
+DIR_DESTINO = "/opt/resultados_graph"
+DATASET = "_dataset"
+RELATORIO = "_relatorio"
+
+# Variantes comparadas, na ordem das barras
+VARIANTES = [
+    (("ldap", False), "LDAP", "#1f77b4"),
+    (("ldap", True), "LDAP SSL", "#aec7e8"),
+    (("scim", False), "SCIM", "#d62728"),
+    (("scim", True), "SCIM SSL", "#ff9896"),
+]
+OPERACOES = carto_resultados.OPERACOES
+
+METRICAS = {
+    "duracao_s": "Tempo de convergência (s)",
+    "mb": "Volume total (MB)",
+    "bytes_por_op": "Bytes por operação",
+    "lat_p50_ms": "Latência p50 (ms)",
+    "lat_p95_ms": "Latência p95 (ms)",
+    "lat_p99_ms": "Latência p99 (ms)",
+}
+FIGURAS = [
+    ("convergencia.png", ["duracao_s"]),
+    ("volume.png", ["mb"]),
+    ("bytes_por_op.png", ["bytes_por_op"]),
+    ("latencia.png", ["lat_p50_ms", "lat_p95_ms", "lat_p99_ms"]),
+]
+
+# t de Student bicaudal 95% por graus de liberdade (acima de 30: normal)
+T_975 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+         9: 2.262, 10: 2.228, 11: 2.201, 12: 2.179, 13: 2.160, 14: 2.145, 15: 2.131,
+         16: 2.120, 17: 2.110, 18: 2.101, 19: 2.093, 20: 2.086, 25: 2.060, 30: 2.042}
+
+def t_critico(gl):
+    if gl > 30:
+        return 1.960
+    return T_975[max(k for k in T_975 if k <= gl)]
+
+def estatistica(valores):
+    """ n, média, desvio e meia-largura do IC 95% (None com menos de 2 repetições) """
+    v = np.asarray(valores, dtype=np.float64)
+    v = v[~np.isnan(v)]
+    n = len(v)
+    if n == 0:
+        return {"n": 0, "media": None, "desvio": None, "ic95": None, "ic_inf": None, "ic_sup": None}
+    media = float(v.mean())
+    desvio = float(v.std(ddof=1)) if n > 1 else None
+    ic = t_critico(n - 1) * desvio / math.sqrt(n) if n > 1 else None
+    return {"n": n, "media": media, "desvio": desvio, "ic95": ic,
+            "ic_inf": media - ic if ic is not None else None,
+            "ic_sup": media + ic if ic is not None else None}
+
+# ============================================================
+# AGREGAÇÃO
+# ============================================================
+def agregar(execucoes):
+    """ Uma entrada por protocolo / TLS / cenário / operação com as estatísticas de cada métrica """
+    grupos = []
+    for (protocolo, tls, cenario, operacao), df in execucoes.groupby(
+            ["protocolo", "tls", "cenario", "operacao"], sort=True):
+        grupos.append({
+            "protocolo": protocolo, "tls": bool(tls), "cenario": cenario, "operacao": operacao,
+            "repeticoes": len(df), "run_ids": sorted(df["run_id"]),
+            "metricas": {m: estatistica(df[m]) for m in METRICAS if m in df},
+        })
+    return grupos
+
+def comparar(grupos):
+    """ Razões entre médias: SCIM/LDAP (mesmo TLS) e com/sem TLS (mesmo protocolo) """
+    indice = {(g["protocolo"], g["tls"], g["cenario"], g["operacao"]): g for g in grupos}
+    pares = []
+    for (protocolo, tls, cenario, operacao), g in sorted(indice.items()):
+        if protocolo == "ldap":
+            pares.append(("scim_vs_ldap", indice.get(("scim", tls, cenario, operacao)), g))
+        if tls:
+            pares.append(("ssl_vs_plain", g, indice.get((protocolo, False, cenario, operacao))))
+
+    comparacoes = []
+    for tipo, a, b in pares:
+        if a is None or b is None:
+            continue
+        razoes = {}
+        for m in METRICAS:
+            ma = a["metricas"].get(m, {}).get("media")
+            mb = b["metricas"].get(m, {}).get("media")
+            razoes[m] = ma / mb if ma is not None and mb else None
+        comparacoes.append({"tipo": tipo, "cenario": a["cenario"], "operacao": a["operacao"],
+                            "a": f"{a['protocolo']}{'_ssl' if a['tls'] else ''}",
+                            "b": f"{b['protocolo']}{'_ssl' if b['tls'] else ''}", "razao": razoes})
+    return comparacoes
+
+# ============================================================
+# GRÁFICOS
+# ============================================================
+def desenhar(grupos, cenarios, metricas, caminho_png):
+    """ Barras agrupadas (variantes) por cenário, uma coluna por operação, uma linha por métrica """
+    indice = {(g["protocolo"], g["tls"], g["cenario"], g["operacao"]): g for g in grupos}
+    fig, eixos = plt.subplots(len(metricas), len(OPERACOES), squeeze=False,
+                              figsize=(5 * len(OPERACOES), 3.6 * len(metricas)))
+    x = np.arange(len(cenarios))
+    largura = 0.8 / len(VARIANTES)
+    for linha, metrica in enumerate(metricas):
+        for coluna, operacao in enumerate(OPERACOES):
+            ax = eixos[linha][coluna]
+            for k, ((protocolo, tls), rotulo, cor) in enumerate(VARIANTES):
+                medias, erros = [], []
+                for cenario in cenarios:
+                    est = indice.get((protocolo, tls, cenario, operacao), {}).get("metricas", {}).get(metrica, {})
+                    medias.append(est.get("media") if est.get("media") is not None else np.nan)
+                    erros.append(est.get("ic95") or 0.0)
+                ax.bar(x + (k - (len(VARIANTES) - 1) / 2) * largura, medias, largura,
+                       yerr=erros, capsize=2, label=rotulo, color=cor)
+            ax.set_title(f"{METRICAS[metrica]} - {operacao}", fontsize=10)
+            ax.set_xticks(x)
+            ax.set_xticklabels(cenarios, rotation=30, ha="right", fontsize=8)
+            ax.grid(True, axis="y", linestyle="--", alpha=0.5)
+    eixos[0][0].legend(fontsize=8)
+    fig.suptitle("LDAP x SCIM por cenário (média, IC 95% entre repetições)")
+    fig.tight_layout()
+    fig.savefig(caminho_png, dpi=100)
+    plt.close(fig)
+
+# ============================================================
+# SAÍDAS
+# ============================================================
+def _sem_nan(obj):
+    """ NaN vira null: o JSON de saída precisa ser válido para outras ferramentas """
+    if isinstance(obj, dict):
+        return {k: _sem_nan(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_sem_nan(v) for v in obj]
+    if isinstance(obj, float) and math.isnan(obj):
+        return None
+    return obj
+
+def tabela_plana(grupos):
+    linhas = []
+    for g in grupos:
+        linha = {k: g[k] for k in ("protocolo", "tls", "cenario", "operacao", "repeticoes")}
+        for m, est in g["metricas"].items():
+            linha[f"{m}_media"] = est["media"]
+            linha[f"{m}_ic95"] = est["ic95"]
+        linhas.append(linha)
+    return pd.DataFrame(linhas)
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatório comparativo LDAP x SCIM a partir da base colunar")
+    parser.add_argument("--dataset", default=os.path.join(DIR_DESTINO, DATASET),
+                        help="pasta da base colunar (padrão: %(default)s)")
+    parser.add_argument("--saida", default=os.path.join(DIR_DESTINO, RELATORIO),
+                        help="pasta dos gráficos e do resumo.json (padrão: %(default)s)")
+    args = parser.parse_args()
+
+    print("="*60)
+    print("RELATÓRIO COMPARATIVO (LDAP x SCIM, com e sem TLS)")
+    print(f"Base:  {args.dataset}")
+    print(f"Saída: {args.saida}")
+    print("="*60)
+
+    execucoes = carto_resultados.consultar(args.dataset, "execucoes")
+    if execucoes.empty:
+        print("[ERRO] Base vazia. Rode antes o gerador_graficos_massivo.py.")
+        return
+    print(f"[INFO] Execuções lidas: {len(execucoes)}")
+
+    grupos = agregar(execucoes)
+    comparacoes = comparar(grupos)
+    cenarios = sorted(execucoes["cenario"].unique())
+    os.makedirs(args.saida, exist_ok=True)
+
+    for nome, metricas in FIGURAS:
+        desenhar(grupos, cenarios, metricas, os.path.join(args.saida, nome))
+        print(f" [GRAFICO] {nome}")
+
+    tabela_plana(grupos).to_csv(os.path.join(args.saida, "resumo.csv"), index=False)
+    resumo = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "dataset": os.path.abspath(args.dataset),
+        "execucoes": len(execucoes),
+        "confianca": 0.95,
+        "metricas": METRICAS,
+        "cenarios": cenarios,
+        "grupos": grupos,
+        "comparacoes": comparacoes,
+    }
+    with open(os.path.join(args.saida, "resumo.json"), "w") as f:
+        json.dump(_sem_nan(resumo), f, indent=1, ensure_ascii=False)
+
+    sem_repeticao = sum(g["repeticoes"] < 2 for g in grupos)
+    if sem_repeticao:
+        print(f"[AVISO] {sem_repeticao} de {len(grupos)} grupos têm uma só execução (sem IC).")
+    print(f"[SUCESSO] Relatório em: {args.saida}")
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,26 @@
 # Projeto CARTO
 # Autoria: Wagner Calazans
 # Ano de criação: 2025
-# Versao: 2.0 (Fix: Leitura Direta via Slapcat)
+# Versao: 2.6 (Syncrepl + Lag por Entrada + Monitor contextCSN)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: ldap_juiz_master.sh
 # Descrição: Auditoria Unificada LDAP.
 #            - Usa 'slapcat' para garantir leitura real do DB.
 #            - Corrige falha de contagem na criação/modificação.
+#            - Syncrepl (ldap_juiz_sync.py) no lugar do slapcat em laço:
+#              para no alvo com precisão de ms e grava as chegadas.
+#            - Lag por entrada envio -> commit -> réplica (carto_lag.py).
+#            - Deriva e recuperação do MMR por contextCSN (ldap_monitor_csn.py).
 # ============================================================
 
 # --- CONFIGURACAO GERAL ---
 IP_PROVIDER="172.16.101.100" # IP da Maquina A
 LISTEN_INTERFACE="any"
 PORT="389"
+# Conexões do próprio juiz ao nó A (réplica do --par, monitor contextCSN) vão por LDAPS/636,
+# fora do filtro da captura: não inflam os bytes de replicação do pcap
+URI_JUIZ_A="ldaps://$IP_PROVIDER"
 BASE_DN="dc=carto,dc=org"
 
 # --- CAMINHO BASE PARA RESULTADOS ---
@@ -31,6 +38,7 @@ cleanup() {
         kill "$TCPDUMP_PID" 2>/dev/null
         wait "$TCPDUMP_PID" 2>/dev/null
     fi
+    [ -n "$CSN_PID" ] && kill "$CSN_PID" 2>/dev/null
     exit 0
 }
 
@@ -81,7 +89,9 @@ selecionar_cenario() {
 # ============================================================
 iniciar_captura() {
     local NOME_ARQUIVO=$1
-    FULL_PCAP_PATH="$FINAL_PATH/$NOME_ARQUIVO"
+    # Um arquivo por repetição (sufixo data/hora): o relatório comparativo
+    # calcula intervalos de confiança entre execuções do mesmo cenário
+    FULL_PCAP_PATH="$FINAL_PATH/${NOME_ARQUIVO%.pcap}_$(date +%Y%m%d_%H%M%S).pcap"
 
     echo "------------------------------------------------------------"
     echo "INICIANDO CAPTURA DE PACOTES (LDAP TCP/389)"
@@ -90,6 +100,7 @@ iniciar_captura() {
     tcpdump -i "$LISTEN_INTERFACE" "port $PORT and host $IP_PROVIDER" -U -w "$FULL_PCAP_PATH" > /dev/null 2>&1 &
     TCPDUMP_PID=$!
     echo "[INFO] Captura iniciada. PID: $TCPDUMP_PID"
+    iniciar_monitor_csn
     echo "------------------------------------------------------------"
 }
 
@@ -105,6 +116,7 @@ finalizar_captura() {
     echo "------------------------------------------------------------"
     echo "[INFO] Processo finalizado."
     echo "[INFO] Tempo (Script): ${DURATION} segundos"
+    parar_monitor_csn
 
     if command -v capinfos &> /dev/null; then
         echo "------------------------------------------------------------"
@@ -116,6 +128,57 @@ finalizar_captura() {
     read -p "Pressione [ENTER] para voltar ao menu..."
 }
 
+# ============================================================
+# MONITOR POR EVENTOS (SYNCREPL)
+# ============================================================
+# ldap_juiz_sync.py recebe do slapd local cada entrada criada / modificada /
+# removida (refreshAndPersist), sem despejar o banco inteiro a cada volta.
+# Código 0 = alvo atingido; outro código (sem python-ldap, slapd fora do ar)
+# faz o modo voltar ao laço com slapcat.
+# Com --par, um segundo consumidor no nó A (MMR) registra quando cada
+# entrada ficou visível na réplica; carto_lag.py junta isso ao carto_ts
+# gravado pelo jogador (lag envio -> commit -> réplica por entrada).
+JUIZ_SYNC="$(dirname "$(readlink -f "$0")")/ldap_juiz_sync.py"
+CARTO_LAG="$(dirname "$(readlink -f "$0")")/../carto_lag.py"
+
+monitorar_sync() {
+    local MODO=$1
+    local ALVO=$2
+    local CHEGADAS="${FULL_PCAP_PATH%.pcap}_chegadas.csv"
+    [ -f "$JUIZ_SYNC" ] || return 2
+    # Horário de chegada de cada entrada, ao lado do pcap
+    LDAPTLS_REQCERT=allow python3 "$JUIZ_SYNC" --modo "$MODO" --alvo "$ALVO" --chegadas "$CHEGADAS" \
+        --par "$URI_JUIZ_A" || return $?
+    # Deleções não levam carimbo de envio
+    if [ "$MODO" != "delecao" ] && [ -f "$CARTO_LAG" ]; then
+        python3 "$CARTO_LAG" "$CHEGADAS" --par "${CHEGADAS%.csv}_par.csv"
+    fi
+    return 0
+}
+
+# Deriva da replicação A <-> B durante o teste (contextCSN por serverID),
+# em segundo plano. No fim, SIGTERM: o monitor espera os nós convergirem
+# (tempo de recuperação depois do netem) e imprime o resumo.
+MONITOR_CSN="$(dirname "$(readlink -f "$0")")/ldap_monitor_csn.py"
+
+iniciar_monitor_csn() {
+    CSN_PID=""
+    [ -f "$MONITOR_CSN" ] || return
+    # No nó A só a leitura base do contextCSN: sem busca de atraso durante a medição
+    LDAPTLS_REQCERT=allow python3 "$MONITOR_CSN" --provedor "ldap://127.0.0.1" --provedor "$URI_JUIZ_A" \
+        --sem-contagem "$URI_JUIZ_A" --saida "${FULL_PCAP_PATH%.pcap}_csn.csv" --silencioso &
+    CSN_PID=$!
+}
+
+parar_monitor_csn() {
+    [ -n "$CSN_PID" ] || return
+    echo "------------------------------------------------------------"
+    echo "REPLICAÇÃO MMR (contextCSN)"
+    kill -TERM "$CSN_PID" 2>/dev/null
+    wait "$CSN_PID" 2>/dev/null
+    CSN_PID=""
+}
+
 # ============================================================
 # MODULOS DE MONITORAMENTO (USANDO SLAPCAT)
 # ============================================================
@@ -132,18 +195,23 @@ modo_criacao() {
     echo "Aguardando >= $TARGET_COUNT usuários..."
     
     START_TIME=$(date +%s)
-    while true; do
-        # Conta quantos UIDs de usuário existem
-        CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
-        
-        printf "[INFO] Usuários Criados: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
-
-        if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
-            echo ""; echo "[SUCESSO] Carga LDAP concluída."
-            break
-        fi
-        sleep 1
-    done
+    if monitorar_sync criacao "$TARGET_COUNT"; then
+        echo "[SUCESSO] Carga LDAP concluída."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            # Conta quantos UIDs de usuário existem
+            CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
+            
+            printf "[INFO] Usuários Criados: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
+
+            if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
+                echo ""; echo "[SUCESSO] Carga LDAP concluída."
+                break
+            fi
+            sleep 1
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -157,18 +225,23 @@ modo_modificacao() {
     echo "Aguardando string '$EXPECTED_VALUE' aparecer no banco..."
     
     START_TIME=$(date +%s)
-    while true; do
-        # Procura a string em todo o banco (é rápido via slapcat)
-        # O -m1 faz o grep parar na primeira ocorrência (otimização)
-        FOUND=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -m1 "$EXPECTED_VALUE")
-        
-        if [ -n "$FOUND" ]; then
-            echo ""; echo "[SUCESSO] Modificação detectada na base."
-            break
-        fi
-        printf "[INFO] Aguardando replicação/modificação... \r"
-        sleep 0.5
-    done
+    if monitorar_sync modificacao 5000; then
+        echo "[SUCESSO] Modificação de todos os usuários detectada na base."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            # Procura a string em todo o banco (é rápido via slapcat)
+            # O -m1 faz o grep parar na primeira ocorrência (otimização)
+            FOUND=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -m1 "$EXPECTED_VALUE")
+            
+            if [ -n "$FOUND" ]; then
+                echo ""; echo "[SUCESSO] Modificação detectada na base."
+                break
+            fi
+            printf "[INFO] Aguardando replicação/modificação... \r"
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -181,18 +254,23 @@ modo_delecao() {
     echo "Aguardando esvaziar a base..."
     
     START_TIME=$(date +%s)
-    while true; do
-        # Conta quantos usuários AINDA existem
-        CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
-        
-        printf "[INFO] Usuários Restantes: %-5s \r" "$CURRENT_COUNT"
-
-        if [ "$CURRENT_COUNT" -eq 0 ]; then
-            echo ""; echo "[SUCESSO] Base LDAP limpa (0 usuários)."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_sync delecao 0; then
+        echo "[SUCESSO] Base LDAP limpa (0 usuários)."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            # Conta quantos usuários AINDA existem
+            CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
+            
+            printf "[INFO] Usuários Restantes: %-5s \r" "$CURRENT_COUNT"
+
+            if [ "$CURRENT_COUNT" -eq 0 ]; then
+                echo ""; echo "[SUCESSO] Base LDAP limpa (0 usuários)."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -203,7 +281,7 @@ modo_delecao() {
 while true; do
     clear
     echo "========================================================"
-    echo "   JUIZ DE AUDITORIA LDAP - v2.0 (Slapcat Mode)"
+    echo "   JUIZ DE AUDITORIA LDAP - v2.6 (Syncrepl / Slapcat)"
     echo "   Salva em: $BASE_OUTPUT/<Cenario>"
     echo "========================================================"
     echo "1) Auditoria de INSERCAO (Carga Massiva)"
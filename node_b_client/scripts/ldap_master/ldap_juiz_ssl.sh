@@ -2,8 +2,11 @@
 # ============================================================
 # Projeto CARTO
 # Autoria: Wagner Calazans
-# Versão: 3.1 (Juiz SSL - Porta 636)
+# Versão: 3.6 (Juiz SSL - Porta 636 + Syncrepl + Lag + contextCSN)
 # Descrição: Auditoria Unificada LDAP sobre SSL.
+#            Monitor por eventos (ldap_juiz_sync.py), slapcat como reserva.
+#            Lag por entrada até a réplica MMR (carto_lag.py).
+#            Deriva e recuperação do MMR por contextCSN (ldap_monitor_csn.py).
 # ============================================================
 
 # --- CONFIGURACAO ---
@@ -13,6 +16,10 @@ LISTEN_INTERFACE="any"
 # MUDANÇA 1: Porta Segura
 PORT="636"                   
 
+# Conexões do próprio juiz ao nó A (réplica do --par, monitor contextCSN) vão pela 389,
+# fora do filtro da captura: não inflam os bytes de replicação do pcap
+URI_JUIZ_A="ldap://$IP_PROVIDER"
+
 BASE_DN="dc=carto,dc=org"
 
 # MUDANÇA 2: Pasta separada para não misturar resultados
@@ -27,6 +34,7 @@ cleanup() {
         kill "$TCPDUMP_PID" 2>/dev/null
         wait "$TCPDUMP_PID" 2>/dev/null
     fi
+    [ -n "$CSN_PID" ] && kill "$CSN_PID" 2>/dev/null
     exit 0
 }
 
@@ -77,7 +85,9 @@ selecionar_cenario() {
 # ============================================================
 iniciar_captura() {
     local NOME_ARQUIVO=$1
-    FULL_PCAP_PATH="$FINAL_PATH/$NOME_ARQUIVO"
+    # Um arquivo por repetição (sufixo data/hora): o relatório comparativo
+    # calcula intervalos de confiança entre execuções do mesmo cenário
+    FULL_PCAP_PATH="$FINAL_PATH/${NOME_ARQUIVO%.pcap}_$(date +%Y%m%d_%H%M%S).pcap"
 
     echo "------------------------------------------------------------"
     echo "INICIANDO CAPTURA (LDAPS TCP/636)"
@@ -86,6 +96,7 @@ iniciar_captura() {
     tcpdump -i "$LISTEN_INTERFACE" "port $PORT and host $IP_PROVIDER" -U -w "$FULL_PCAP_PATH" > /dev/null 2>&1 &
     TCPDUMP_PID=$!
     echo "[INFO] Captura iniciada. PID: $TCPDUMP_PID"
+    iniciar_monitor_csn
     echo "------------------------------------------------------------"
 }
 
@@ -101,6 +112,7 @@ finalizar_captura() {
     echo "------------------------------------------------------------"
     echo "[INFO] Processo finalizado."
     echo "[INFO] Tempo (Script): ${DURATION} segundos"
+    parar_monitor_csn
 
     if command -v capinfos &> /dev/null; then
         echo "------------------------------------------------------------"
@@ -113,7 +125,58 @@ finalizar_captura() {
 }
 
 # ============================================================
-# MONITORAMENTO (MANTIDO IGUAL - SLAPCAT LÊ O DISCO)
+# MONITOR POR EVENTOS (SYNCREPL)
+# ============================================================
+# ldap_juiz_sync.py recebe do slapd local cada entrada criada / modificada /
+# removida (refreshAndPersist), sem despejar o banco inteiro a cada volta.
+# Código 0 = alvo atingido; outro código (sem python-ldap, slapd fora do ar)
+# faz o modo voltar ao laço com slapcat.
+# Com --par, um segundo consumidor no nó A (MMR) registra quando cada
+# entrada ficou visível na réplica; carto_lag.py junta isso ao carto_ts
+# gravado pelo jogador (lag envio -> commit -> réplica por entrada).
+JUIZ_SYNC="$(dirname "$(readlink -f "$0")")/ldap_juiz_sync.py"
+CARTO_LAG="$(dirname "$(readlink -f "$0")")/../carto_lag.py"
+
+monitorar_sync() {
+    local MODO=$1
+    local ALVO=$2
+    local CHEGADAS="${FULL_PCAP_PATH%.pcap}_chegadas.csv"
+    [ -f "$JUIZ_SYNC" ] || return 2
+    # Horário de chegada de cada entrada, ao lado do pcap
+    python3 "$JUIZ_SYNC" --modo "$MODO" --alvo "$ALVO" --chegadas "$CHEGADAS" \
+        --par "$URI_JUIZ_A" || return $?
+    # Deleções não levam carimbo de envio
+    if [ "$MODO" != "delecao" ] && [ -f "$CARTO_LAG" ]; then
+        python3 "$CARTO_LAG" "$CHEGADAS" --par "${CHEGADAS%.csv}_par.csv"
+    fi
+    return 0
+}
+
+# Deriva da replicação A <-> B durante o teste (contextCSN por serverID),
+# em segundo plano. No fim, SIGTERM: o monitor espera os nós convergirem
+# (tempo de recuperação depois do netem) e imprime o resumo.
+MONITOR_CSN="$(dirname "$(readlink -f "$0")")/ldap_monitor_csn.py"
+
+iniciar_monitor_csn() {
+    CSN_PID=""
+    [ -f "$MONITOR_CSN" ] || return
+    # No nó A só a leitura base do contextCSN: sem busca de atraso durante a medição
+    python3 "$MONITOR_CSN" --provedor "ldap://127.0.0.1" --provedor "$URI_JUIZ_A" \
+        --sem-contagem "$URI_JUIZ_A" --saida "${FULL_PCAP_PATH%.pcap}_csn.csv" --silencioso &
+    CSN_PID=$!
+}
+
+parar_monitor_csn() {
+    [ -n "$CSN_PID" ] || return
+    echo "------------------------------------------------------------"
+    echo "REPLICAÇÃO MMR (contextCSN)"
+    kill -TERM "$CSN_PID" 2>/dev/null
+    wait "$CSN_PID" 2>/dev/null
+    CSN_PID=""
+}
+
+# ============================================================
+# MONITORAMENTO (SYNCREPL; SLAPCAT LÊ O DISCO COMO RESERVA)
 # ============================================================
 modo_criacao() {
     selecionar_cenario
@@ -122,15 +185,20 @@ modo_criacao() {
     
     echo "INICIANDO MONITORAMENTO (Leitura Direta DB)"
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
-        printf "[INFO] Usuários Criados: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
-        if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
-            echo ""; echo "[SUCESSO] Carga LDAPS concluída."
-            break
-        fi
-        sleep 1
-    done
+    if monitorar_sync criacao "$TARGET_COUNT"; then
+        echo "[SUCESSO] Carga LDAPS concluída."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
+            printf "[INFO] Usuários Criados: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
+            if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
+                echo ""; echo "[SUCESSO] Carga LDAPS concluída."
+                break
+            fi
+            sleep 1
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -141,15 +209,20 @@ modo_modificacao() {
     
     echo "INICIANDO MONITORAMENTO"
     START_TIME=$(date +%s)
-    while true; do
-        FOUND=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -m1 "$EXPECTED_VALUE")
-        if [ -n "$FOUND" ]; then
-            echo ""; echo "[SUCESSO] Modificação detectada."
-            break
-        fi
-        printf "[INFO] Aguardando replicação/modificação... \r"
-        sleep 0.5
-    done
+    if monitorar_sync modificacao 5000; then
+        echo "[SUCESSO] Modificação de todos os usuários detectada."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            FOUND=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -m1 "$EXPECTED_VALUE")
+            if [ -n "$FOUND" ]; then
+                echo ""; echo "[SUCESSO] Modificação detectada."
+                break
+            fi
+            printf "[INFO] Aguardando replicação/modificação... \r"
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -159,15 +232,20 @@ modo_delecao() {
     
     echo "INICIANDO MONITORAMENTO"
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
-        printf "[INFO] Usuários Restantes: %-5s \r" "$CURRENT_COUNT"
-        if [ "$CURRENT_COUNT" -eq 0 ]; then
-            echo ""; echo "[SUCESSO] Base limpa."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_sync delecao 0; then
+        echo "[SUCESSO] Base limpa."
+    else
+        echo "[AVISO] Syncrepl indisponível: voltando à leitura com slapcat."
+        while true; do
+            CURRENT_COUNT=$(slapcat -b "$BASE_DN" 2>/dev/null | grep -c "^uid: user_ldap_")
+            printf "[INFO] Usuários Restantes: %-5s \r" "$CURRENT_COUNT"
+            if [ "$CURRENT_COUNT" -eq 0 ]; then
+                echo ""; echo "[SUCESSO] Base limpa."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.1 (Juiz LDAP por Eventos - Syncrepl + Réplica MMR)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: ldap_juiz_sync.py
+# Descrição: Monitor do juiz LDAP sem varrer o banco.
+#            - Uma busca syncrepl refreshAndPersist (RFC 4533, a mesma do
+#              sync_A.ldif) no slapd local: o servidor avisa cada entrada
+#              criada / modificada / removida, sem slapcat a cada 0,5 s.
+#            - Contador ao vivo + horário de chegada de cada entrada (CSV).
+#            - Para no instante em que o alvo é atingido (precisão de ms).
+#            - entryCSN de cada entrada = horário do commit no provedor
+#              que recebeu a escrita (coluna ts_commit).
+#            - --par: segundo consumidor no outro nó do MMR; grava quando
+#              cada entrada ficou visível na réplica (*_par.csv). Visto
+#              daqui, inclui a volta réplica -> juiz pela rede.
+#            - Lag por entrada (envio -> commit -> réplica): carto_lag.py.
+#            - Chamado pelos ldap_juiz_*.sh; código 2 = indisponível
+#              (sem python-ldap ou sem conexão), e o juiz volta ao slapcat.
+# ============================================================
+
+import argparse
+import calendar
+import csv
+import select
+import sys
+import time
+
+try:
+    import ldap
+    from ldap.ldapobject import LDAPObject
+    from ldap.syncrepl import SyncreplConsumer
+except ImportError:
+    ldap = None
+
+# --- CONFIGURAÇÃO PADRÃO (slapd local do nó B) ---
+URI = "ldap://127.0.0.1"
+BIND_DN = "cn=replicator,dc=carto,dc=org"   # Tem leitura em tudo (replicator_access.ldif)
+BIND_PASS = "33028729"
+BASE_DN = "dc=carto,dc=org"
+FILTRO = "(uid=user_ldap_*)"
+ATRIBUTOS = ["uid", "description", "entryCSN"]
+
+MODOS = ("criacao", "modificacao", "delecao")
+POLL_TIMEOUT = 0.2          # s de espera por mensagem antes de atualizar a tela
+DRENAR_TIMEOUT = 0.001      # s: esvazia o que já chegou sem bloquear o outro consumidor
+ESPERA_PAR = 30             # s de espera pela réplica depois do alvo local
+INDISPONIVEL = 2            # Código de saída: o juiz usa o slapcat
+
+def _texto(attrs, nome):
+    valores = attrs.get(nome) or [b""]
+    return valores[0].decode("utf-8", "replace")
+
+def _csn_epoch(csn):
+    """ entryCSN (20251018123456.123456Z#000000#001#000000) -> epoch do commit """
+    try:
+        data, fracao = csn.split("Z", 1)[0].split(".")
+        return calendar.timegm(time.strptime(data, "%Y%m%d%H%M%S")) + int(fracao) / 10 ** len(fracao)
+    except ValueError:
+        return None
+
+if ldap is not None:
+    class JuizSync(LDAPObject, SyncreplConsumer):
+        """ Consumidor syncrepl que só conta: nada é gravado no banco local.
+
+        Fase de refresh: entradas já existentes (estado inicial, sem registro
+        de chegada). Fase persist: cada add / modify / delete vira um evento
+        com horário de chegada.
+        """
+        def __init__(self, uri, modo, alvo):
+            LDAPObject.__init__(self, uri)
+            self.uri_origem = uri
+            self.modo = modo
+            self.alvo = alvo
+            self.uids = {}              # entryUUID -> uid das entradas presentes
+            self.modificados = set()
+            self.chegadas = []          # (epoch, evento, uid, description, epoch do commit)
+            self.cookie = None
+            self.refresh_concluido = False
+            self.inscrito_em = None
+            self.alvo_em = None
+
+        # --- ESTADO EXIGIDO PELO SyncreplConsumer ---
+        def syncrepl_get_cookie(self):
+            return self.cookie
+
+        def syncrepl_set_cookie(self, cookie):
+            self.cookie = cookie
+
+        # --- EVENTOS ---
+        def syncrepl_entry(self, dn, attrs, uuid):
+            agora = time.time()
+            uid = _texto(attrs, "uid") or dn
+            conhecido = uuid in self.uids
+            self.uids[uuid] = uid
+            if not self.refresh_concluido:
+                return
+            if conhecido:
+                self.modificados.add(uuid)
+            self.chegadas.append((agora, "modificacao" if conhecido else "criacao", uid,
+                                  _texto(attrs, "description"), _csn_epoch(_texto(attrs, "entryCSN"))))
+            self._verificar(agora)
+
+        def syncrepl_delete(self, uuids):
+            agora = time.time()
+            for uuid in uuids:
+                uid = self.uids.pop(uuid, None)
+                self.modificados.discard(uuid)
+                if self.refresh_concluido and uid is not None:
+                    self.chegadas.append((agora, "delecao", uid, "", None))
+            self._verificar(agora)
+
+        def syncrepl_present(self, uuids, refreshDeletes=False):
+            # Sem cookie o refresh manda as entradas inteiras; nada a reconciliar
+            pass
+
+        def syncrepl_refreshdone(self):
+            self.refresh_concluido = True
+            self.inscrito_em = time.time()
+            self._verificar(self.inscrito_em)
+
+        # --- ALVO ---
+        def contagem(self):
+            return len(self.modificados) if self.modo == "modificacao" else len(self.uids)
+
+        def _verificar(self, agora):
+            if self.alvo_em is not None or not self.refresh_concluido:
+                return
+            n = self.contagem()
+            if (self.modo == "delecao" and n <= self.alvo) or (self.modo != "delecao" and n >= self.alvo):
+                self.alvo_em = agora
+
+def gravar_chegadas(juiz, caminho):
+    with open(caminho, "w", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["ts_epoch", "evento", "uid", "description", "ts_commit"])
+        for ts, evento, uid, descricao, ts_commit in juiz.chegadas:
+            escritor.writerow([f"{ts:.6f}", evento, uid, descricao, f"{ts_commit:.6f}" if ts_commit else ""])
+
+def caminho_par(chegadas):
+    return chegadas[:-4] + "_par.csv" if chegadas.endswith(".csv") else chegadas + "_par"
+
+def inscrever(juiz, args):
+    juiz.simple_bind_s(args.bind_dn, args.senha)
+    return juiz.syncrepl_search(args.base, ldap.SCOPE_SUBTREE, mode="refreshAndPersist",
+                                filterstr=args.filtro, attrlist=ATRIBUTOS)
+
+def drenar(juiz, msgid):
+    """ Processa tudo o que já chegou; False se o servidor encerrou a busca """
+    while True:
+        try:
+            if not juiz.syncrepl_poll(msgid=msgid, timeout=DRENAR_TIMEOUT, all=0):
+                return False
+        except ldap.TIMEOUT:
+            return True
+
+def monitorar(args):
+    juiz = JuizSync(args.uri, args.modo, args.alvo)
+    try:
+        msgid = inscrever(juiz, args)
+    except ldap.LDAPError as e:
+        print(f"[ERRO] Syncrepl indisponível em {args.uri}: {e}")
+        return INDISPONIVEL
+    # Réplica MMR: falha aqui não derruba o juiz, só tira a coluna da réplica
+    consumidores = {juiz: msgid}
+    par = None
+    if args.par:
+        par = JuizSync(args.par, args.modo, args.alvo)
+        try:
+            consumidores[par] = inscrever(par, args)
+        except ldap.LDAPError as e:
+            print(f"[AVISO] Réplica {args.par} sem syncrepl ({e}): lag de replicação não medido.")
+            par = None
+
+    rotulo = {"criacao": "Usuários Criados", "modificacao": "Usuários Modificados",
+              "delecao": "Usuários Restantes"}[args.modo]
+    inicio = time.time()
+    limite_par = None
+    try:
+        while juiz.alvo_em is None or (par is not None and par.alvo_em is None and time.time() < limite_par):
+            prontos, _, _ = select.select([c.fileno() for c in consumidores], [], [], POLL_TIMEOUT)
+            for c, m in consumidores.items():
+                if c.fileno() in prontos and not drenar(c, m):
+                    print(f"\n[ERRO] O servidor {c.uri_origem} encerrou a busca syncrepl.")
+                    return 1
+            if juiz.alvo_em is not None and limite_par is None:
+                limite_par = juiz.alvo_em + args.espera_par
+            estado = "" if juiz.refresh_concluido else " (carregando estado inicial)"
+            if par is not None:
+                estado += f" | réplica: {par.contagem():<5}"
+            print(f"[INFO] {rotulo}: {juiz.contagem():<5} / {args.alvo:<5}{estado}   ", end="\r", flush=True)
+    except ldap.LDAPError as e:
+        print(f"\n[ERRO] Conexão syncrepl perdida: {e}")
+        return 1
+    finally:
+        if args.chegadas:
+            gravar_chegadas(juiz, args.chegadas)
+            if par is not None:
+                gravar_chegadas(par, caminho_par(args.chegadas))
+        for c in consumidores:
+            try: c.unbind_s()
+            except ldap.LDAPError: pass
+
+    print(f"\n[SUCESSO] Alvo atingido: {rotulo} = {juiz.contagem()}")
+    if not juiz.chegadas:
+        print("[AVISO] O alvo já estava atingido na inscrição (nenhum evento recebido).")
+    else:
+        primeiro = juiz.chegadas[0][0]
+        print(f"[TEMPO] Inscrição -> alvo......: {juiz.alvo_em - juiz.inscrito_em:.3f} s")
+        print(f"[TEMPO] 1º evento -> alvo......: {juiz.alvo_em - primeiro:.3f} s")
+        print(f"[TEMPO] Eventos recebidos......: {len(juiz.chegadas)}")
+    print(f"[TEMPO] Alvo (epoch)...........: {juiz.alvo_em:.3f}")
+    if par is not None:
+        if par.alvo_em is None:
+            print(f"[AVISO] Réplica não convergiu em {args.espera_par:g} s: {rotulo} = {par.contagem()}")
+        else:
+            print(f"[TEMPO] Alvo na réplica........: +{par.alvo_em - juiz.alvo_em:.3f} s")
+    print(f"[INFO] Estado inicial carregado em {juiz.inscrito_em - inicio:.3f} s")
+    if args.chegadas:
+        print(f"[INFO] Chegadas por entrada: {args.chegadas}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Juiz LDAP por eventos (syncrepl refreshAndPersist)")
+    parser.add_argument("--modo", choices=MODOS, required=True)
+    parser.add_argument("--alvo", type=int, help="usuários esperados (padrão: 5000; 0 na deleção)")
+    parser.add_argument("--chegadas", help="CSV com o horário de chegada de cada entrada")
+    parser.add_argument("--uri", default=URI)
+    parser.add_argument("--bind-dn", default=BIND_DN)
+    parser.add_argument("--senha", default=BIND_PASS)
+    parser.add_argument("--base", default=BASE_DN)
+    parser.add_argument("--filtro", default=FILTRO)
+    parser.add_argument("--par", help="URI do outro nó do MMR (ex.: ldap://172.16.101.100)")
+    parser.add_argument("--espera-par", type=float, default=ESPERA_PAR,
+                        help="s de espera pela réplica depois do alvo local")
+    args = parser.parse_args()
+    if args.alvo is None:
+        args.alvo = 0 if args.modo == "delecao" else 5000
+
+    if ldap is None:
+        print("[AVISO] python-ldap não instalado (apt-get install python3-ldap).")
+        return INDISPONIVEL
+    return monitorar(args)
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n[!] Interrompido.")
+        sys.exit(130)
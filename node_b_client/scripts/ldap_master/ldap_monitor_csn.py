@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.2 (Monitor de Replicação MMR por contextCSN)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: ldap_monitor_csn.py
+# Descrição: Deriva e recuperação da replicação entre os nós A e B.
+#            - Lê o contextCSN (um valor por serverID) dos dois provedores
+#              a cada intervalo: busca base, custo desprezível no slapd.
+#            - Lag por serverID = horário do CSN mais novo entre os nós -
+#              horário do CSN que o nó já aplicou (0 = convergido).
+#            - Atraso (backlog) = entradas no nó mais adiantado com
+#              entryCSN maior que o contextCSN do atrasado (deleções não
+#              entram na conta; escritas de outro serverID sim).
+#              --sem-contagem URI: nó que só recebe a leitura base (o juiz
+#              não faz buscas em subárvore no nó A durante a medição).
+#            - Episódios de divergência: início, duração até convergir,
+#              lag e atraso máximos (recuperação depois do netem).
+#              Nó inacessível mantém o episódio aberto (não é convergência).
+#            - CSV compacto: uma linha só quando o valor muda.
+#            - SIGTERM (fim do juiz): espera convergir (--espera-fim) e
+#              imprime o resumo; código 2 = sem python-ldap.
+# ============================================================
+
+import argparse
+import calendar
+import csv
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+try:
+    import ldap
+except ImportError:
+    ldap = None
+
+# --- CONFIGURAÇÃO PADRÃO (MMR entre os nós A e B) ---
+PROVEDORES = ("ldap://127.0.0.1", "ldap://172.16.101.100")    # B (local) e A
+BIND_DN = "cn=replicator,dc=carto,dc=org"
+BIND_PASS = "33028729"
+BASE_DN = "dc=carto,dc=org"
+
+INTERVALO = 0.5             # s entre amostras
+TIMEOUT = 2                 # s por operação: nó isolado pelo netem não trava o laço
+ESPERA_FIM = 30             # s de espera pela convergência depois do SIGTERM
+INDISPONIVEL = 2
+
+LOG_DIR = "/opt/resultados/replicacao"
+
+def csn_epoch(csn):
+    """ 20251018123456.123456Z#000000#001#000000 -> epoch (s) """
+    data, fracao = csn.split("Z", 1)[0].split(".")
+    return calendar.timegm(time.strptime(data, "%Y%m%d%H%M%S")) + int(fracao) / 10 ** len(fracao)
+
+def csn_sid(csn):
+    return csn.split("#")[2]
+
+class Provedor:
+    """ Conexão a um nó do MMR; reconecta sozinha depois de uma falha """
+    def __init__(self, uri, args):
+        self.uri = uri
+        self.nome = uri.split("://", 1)[-1].rstrip("/")
+        self.args = args
+        self.conn = None
+        self.avisado = False
+        self.contar = uri not in args.sem_contagem
+
+    def _conectar(self):
+        conn = ldap.initialize(self.uri)
+        conn.set_option(ldap.OPT_NETWORK_TIMEOUT, TIMEOUT)
+        conn.set_option(ldap.OPT_TIMEOUT, TIMEOUT)
+        conn.simple_bind_s(self.args.bind_dn, self.args.senha)
+        return conn
+
+    def _executar(self, operacao):
+        try:
+            if self.conn is None:
+                self.conn = self._conectar()
+            resultado = operacao(self.conn)
+            self.avisado = False
+            return resultado
+        except ldap.LDAPError as e:
+            if not self.avisado:
+                print(f"[AVISO] {self.nome} inacessível: {e}")
+                self.avisado = True
+            self.conn = None
+            return None
+
+    def context_csn(self):
+        """ {serverID: CSN} ou None se o nó não respondeu """
+        def ler(conn):
+            _, attrs = conn.search_st(self.args.base, ldap.SCOPE_BASE, "(objectClass=*)",
+                                      ["contextCSN"], timeout=TIMEOUT)[0]
+            return {csn_sid(v.decode()): v.decode() for v in attrs.get("contextCSN", [])}
+        return self._executar(ler)
+
+    def atraso(self, desde):
+        """ Entradas com entryCSN > desde (o que falta ao nó atrasado) """
+        filtro = f"(&(entryCSN>={desde})(!(entryCSN={desde})))"
+        def contar(conn):
+            return len(conn.search_st(self.args.base, ldap.SCOPE_SUBTREE, filtro, ["1.1"], timeout=TIMEOUT))
+        return self._executar(contar)
+
+    def fechar(self):
+        if self.conn is not None:
+            try: self.conn.unbind_s()
+            except ldap.LDAPError: pass
+
+def amostrar(provedores):
+    """ {(nó, serverID): (epoch do CSN, lag s, atraso)}; nó sem resposta -> {(nó, None): None} """
+    lidos = {p: p.context_csn() for p in provedores}
+    referencia = {}                 # serverID -> (CSN mais novo, nó que o tem)
+    for p, csns in lidos.items():
+        for sid, csn in (csns or {}).items():
+            if sid not in referencia or csn > referencia[sid][0]:
+                referencia[sid] = (csn, p)
+
+    amostra = {}
+    for p, csns in lidos.items():
+        if csns is None:
+            amostra[(p.nome, None)] = None
+            continue
+        for sid, (ref, dono) in referencia.items():
+            csn = csns.get(sid)
+            if csn is None:
+                # serverID que o nó nunca recebeu: atrasado desde o início
+                amostra[(p.nome, sid)] = (None, None, None)
+            elif csn < ref:
+                atraso = dono.atraso(csn) if dono.contar else None
+                amostra[(p.nome, sid)] = (csn_epoch(csn), csn_epoch(ref) - csn_epoch(csn), atraso)
+            else:
+                amostra[(p.nome, sid)] = (csn_epoch(csn), 0.0, 0)
+    return amostra
+
+class Episodios:
+    """ Intervalos em que algum nó ficou atrás (divergência -> convergência) """
+    def __init__(self):
+        self.fechados = []
+        self.aberto = None          # [início, lag máx., atraso máx.]
+
+    def registrar(self, agora, amostra):
+        """ True só se todos os nós responderam e nenhum está atrás """
+        valores = [v for v in amostra.values() if v is not None]
+        # Nó inacessível (netem com perda alta) não prova nada: conta como divergente
+        inacessivel = not amostra or len(valores) < len(amostra)
+        divergente = inacessivel or any(lag is None or lag > 0 for _, lag, _ in valores)
+        if divergente:
+            lag = max((l for _, l, _ in valores if l is not None), default=0.0)
+            atraso = max((a for _, _, a in valores if a is not None), default=0)
+            if self.aberto is None:
+                self.aberto = [agora, lag, atraso]
+            else:
+                self.aberto[1] = max(self.aberto[1], lag)
+                self.aberto[2] = max(self.aberto[2], atraso)
+        elif self.aberto is not None:
+            self.fechados.append((self.aberto[0], agora - self.aberto[0], self.aberto[1], self.aberto[2]))
+            self.aberto = None
+        return not divergente
+
+def _texto(v, fmt):
+    return "" if v is None else fmt.format(v)
+
+def monitorar(args):
+    provedores = [Provedor(uri, args) for uri in args.provedor]
+    parar = []
+    signal.signal(signal.SIGTERM, lambda *_: parar.append(time.time()))
+
+    caminho = args.saida or os.path.join(LOG_DIR, f"{args.rotulo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    episodios = Episodios()
+    ultimo = {}
+    convergido = False
+    inicio = agora = time.time()
+    if not args.silencioso:
+        print(f"[INFO] contextCSN de {', '.join(p.nome for p in provedores)} a cada {args.intervalo:g} s -> {caminho}")
+    with open(caminho, "w", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["ts_epoch", "no", "sid", "csn_epoch", "lag_ms", "atraso"])
+        try:
+            while not parar or (not convergido and time.time() < parar[0] + args.espera_fim):
+                agora = time.time()
+                amostra = amostrar(provedores)
+                convergido = episodios.registrar(agora, amostra)
+                for (no, sid), valor in sorted(amostra.items(), key=lambda kv: (kv[0][0], kv[0][1] or "")):
+                    # Compacto: só grava o que mudou desde a última linha da série
+                    if ultimo.get((no, sid), "-") == valor:
+                        continue
+                    ultimo[(no, sid)] = valor
+                    csn, lag, atraso = valor or (None, None, None)
+                    escritor.writerow([f"{agora:.3f}", no, sid or "", _texto(csn, "{:.6f}"),
+                                       _texto(lag and lag * 1000, "{:.3f}"), _texto(atraso, "{}")])
+                f.flush()
+                if not args.silencioso:
+                    lags = [f"{no}/{sid}: {'inacessível' if v is None else '?' if v[1] is None else f'{v[1] * 1000:.0f} ms'}"
+                            for (no, sid), v in sorted(amostra.items(), key=lambda kv: (kv[0][0], kv[0][1] or ""))]
+                    print(f"[INFO] {' | '.join(lags)}   ", end="\r", flush=True)
+                time.sleep(max(0.0, args.intervalo - (time.time() - agora)))
+        except KeyboardInterrupt:
+            pass
+    for p in provedores:
+        p.fechar()
+
+    print(f"\n[INFO] Monitor de replicação ({args.rotulo}): {time.time() - inicio:.1f} s observados")
+    for ini, duracao, lag, atraso in episodios.fechados:
+        print(f"[TEMPO] Divergência às {datetime.fromtimestamp(ini).strftime('%H:%M:%S.%f')[:-3]}: "
+              f"convergiu em {duracao:.3f} s (lag máx. {lag * 1000:.0f} ms, atraso máx. {atraso})")
+    if episodios.aberto is not None:
+        ini, lag, atraso = episodios.aberto
+        print(f"[AVISO] Ainda divergente há {time.time() - ini:.1f} s (lag máx. {lag * 1000:.0f} ms, atraso máx. {atraso})")
+    elif not episodios.fechados:
+        print("[INFO] Nós convergidos durante toda a observação.")
+    if parar and convergido:
+        print(f"[TEMPO] Convergência após o fim do teste: {max(0.0, agora - parar[0]):.3f} s")
+    print(f"[INFO] Série: {caminho}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Lag e atraso de replicação MMR pelo contextCSN")
+    parser.add_argument("--provedor", action="append", help="URI de um nó do MMR (repetir; padrão: B local e A)")
+    parser.add_argument("--sem-contagem", action="append", default=[], metavar="URI",
+                        help="provedor sem busca de atraso (só a leitura base do contextCSN)")
+    parser.add_argument("--rotulo", default="mmr", help="nome do arquivo em /opt/resultados/replicacao")
+    parser.add_argument("--saida", help="CSV de saída (substitui o rótulo)")
+    parser.add_argument("--intervalo", type=float, default=INTERVALO)
+    parser.add_argument("--espera-fim", type=float, default=ESPERA_FIM,
+                        help="s de espera pela convergência depois do SIGTERM")
+    parser.add_argument("--silencioso", action="store_true", help="só o resumo final (uso em segundo plano)")
+    parser.add_argument("--bind-dn", default=BIND_DN)
+    parser.add_argument("--senha", default=BIND_PASS)
+    parser.add_argument("--base", default=BASE_DN)
+    args = parser.parse_args()
+    args.provedor = args.provedor or list(PROVEDORES)
+
+    if ldap is None:
+        print("[AVISO] python-ldap não instalado (apt-get install python3-ldap).")
+        return INDISPONIVEL
+    return monitorar(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
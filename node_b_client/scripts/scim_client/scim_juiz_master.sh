@@ -3,13 +3,16 @@
 # Projeto CARTO
 # Autoria: Wagner Calazans
 # Ano de criação: 2025
-# Versao: 3.0 (Organização Automática de Diretórios)
+# Versao: 3.3 (LISTEN/NOTIFY + Lag por Registro)
 # IME - Instituto Militar de Engenharia
 #
 # Arquivo: scim_juiz_master.sh
 # Descrição: Auditoria Unificada SCIM.
 #            - Cria árvore de diretórios baseada no cenário.
 #            - Salva PCAP organizado por pasta.
+#            - LISTEN/NOTIFY (scim_juiz_notify.py) no lugar do psql em laço:
+#              para no alvo com precisão de ms e grava os commits.
+#            - Lag por registro envio -> commit (carto_lag.py).
 # ============================================================
 
 # --- CONFIGURACAO GERAL ---
@@ -86,13 +89,15 @@ selecionar_cenario() {
 iniciar_captura() {
     local NOME_ARQUIVO=$1
     # Define o caminho completo baseado na seleção anterior
-    FULL_PCAP_PATH="$FINAL_PATH/$NOME_ARQUIVO"
+    # Um arquivo por repetição (sufixo data/hora): o relatório comparativo
+    # calcula intervalos de confiança entre execuções do mesmo cenário
+    FULL_PCAP_PATH="$FINAL_PATH/${NOME_ARQUIVO%.pcap}_$(date +%Y%m%d_%H%M%S).pcap"
 
     echo "------------------------------------------------------------"
     echo "INICIANDO CAPTURA DE PACOTES (SCIM/HTTP)"
     echo "Arquivo: $FULL_PCAP_PATH"
     
-    # Inicia tcpdump (Sobrescreve se existir devido ao -w direto)
+    # Inicia tcpdump
     tcpdump -i "$LISTEN_INTERFACE" "port $PORT and host $IP_CLIENT" -U -w "$FULL_PCAP_PATH" > /dev/null 2>&1 &
     TCPDUMP_PID=$!
     echo "[INFO] Captura iniciada. PID: $TCPDUMP_PID"
@@ -124,6 +129,33 @@ finalizar_captura() {
     read -p "Pressione [ENTER] para voltar ao menu..."
 }
 
+# ============================================================
+# MONITOR POR EVENTOS (LISTEN/NOTIFY)
+# ============================================================
+# scim_juiz_notify.py instala um trigger em 'users' e recebe cada commit
+# por uma única conexão LISTEN, sem psql + count(*) a cada 0,5 s.
+# Código 0 = alvo atingido; outro código (sem psycopg2, banco fora do ar)
+# faz o modo voltar ao laço com psql.
+JUIZ_NOTIFY="$(dirname "$(readlink -f "$0")")/scim_juiz_notify.py"
+PYTHON_JUIZ="/opt/scim_server/venv/bin/python3"   # venv do servidor (psycopg2)
+CARTO_LAG="$(dirname "$(readlink -f "$0")")/../carto_lag.py"
+
+monitorar_notify() {
+    local MODO=$1
+    local ALVO=$2
+    local PY="python3"
+    local CHEGADAS="${FULL_PCAP_PATH%.pcap}_chegadas.csv"
+    [ -f "$JUIZ_NOTIFY" ] || return 2
+    [ -x "$PYTHON_JUIZ" ] && PY="$PYTHON_JUIZ"
+    # Horário de commit de cada registro, ao lado do pcap
+    "$PY" "$JUIZ_NOTIFY" --modo "$MODO" --alvo "$ALVO" --chegadas "$CHEGADAS" || return $?
+    # Lag envio (carto_ts do jogador) -> commit; deleções não levam carimbo
+    if [ "$MODO" != "delecao" ] && [ -f "$CARTO_LAG" ]; then
+        python3 "$CARTO_LAG" "$CHEGADAS"
+    fi
+    return 0
+}
+
 # ============================================================
 # MODULOS DE MONITORAMENTO
 # ============================================================
@@ -138,18 +170,23 @@ modo_criacao() {
     echo "Aguardando chegar em $TARGET_COUNT registros..."
     
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
-        if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
-
-        printf "[INFO] Registros: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
-
-        if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
-            echo ""; echo "[SUCESSO] Carga SCIM concluida."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_notify criacao "$TARGET_COUNT"; then
+        echo "[SUCESSO] Carga SCIM concluida."
+    else
+        echo "[AVISO] Notificações indisponíveis: voltando à consulta com psql."
+        while true; do
+            CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
+            if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
+
+            printf "[INFO] Registros: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
+
+            if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
+                echo ""; echo "[SUCESSO] Carga SCIM concluida."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -164,16 +201,21 @@ modo_modificacao() {
     echo "Aguardando update em uid='$TARGET_USER'..."
     
     START_TIME=$(date +%s)
-    while true; do
-        RESULT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT description FROM users WHERE uid='$TARGET_USER';" 2>/dev/null)
-        
-        if echo "$RESULT" | grep -q "$EXPECTED_VALUE"; then
-            echo ""; echo "[SUCESSO] Atualizacao detectada."
-            break
-        fi
-        printf "[INFO] Aguardando commit... \r"
-        sleep 0.5
-    done
+    if monitorar_notify modificacao 5000; then
+        echo "[SUCESSO] Atualizacao de todos os registros detectada."
+    else
+        echo "[AVISO] Notificações indisponíveis: voltando à consulta com psql."
+        while true; do
+            RESULT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT description FROM users WHERE uid='$TARGET_USER';" 2>/dev/null)
+            
+            if echo "$RESULT" | grep -q "$EXPECTED_VALUE"; then
+                echo ""; echo "[SUCESSO] Atualizacao detectada."
+                break
+            fi
+            printf "[INFO] Aguardando commit... \r"
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -186,18 +228,23 @@ modo_delecao() {
     echo "Aguardando esvaziar tabela..."
     
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
-        if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
-        
-        printf "[INFO] Restantes: %-5s \r" "$CURRENT_COUNT"
-
-        if [ "$CURRENT_COUNT" -le 0 ]; then
-            echo ""; echo "[SUCESSO] Tabela vazia."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_notify delecao 0; then
+        echo "[SUCESSO] Tabela vazia."
+    else
+        echo "[AVISO] Notificações indisponíveis: voltando à consulta com psql."
+        while true; do
+            CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
+            if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
+            
+            printf "[INFO] Restantes: %-5s \r" "$CURRENT_COUNT"
+
+            if [ "$CURRENT_COUNT" -le 0 ]; then
+                echo ""; echo "[SUCESSO] Tabela vazia."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -208,7 +255,7 @@ modo_delecao() {
 while true; do
     clear
     echo "========================================================"
-    echo "   JUIZ DE AUDITORIA SCIM - v3.0 (Organization Mode)"
+    echo "   JUIZ DE AUDITORIA SCIM - v3.3 (LISTEN/NOTIFY)"
     echo "   Salva em: $BASE_OUTPUT/<Cenario>"
     echo "========================================================"
     echo "1) Auditoria de INSERCAO"
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# ============================================================
+# Projeto CARTO
+# Versao: 1.0 (Juiz SCIM por Eventos - LISTEN/NOTIFY)
+# IME - Instituto Militar de Engenharia
+#
+# Arquivo: scim_juiz_notify.py
+# Descrição: Monitor do juiz SCIM sem psql em laço.
+#            - Trigger por linha em 'users' publica cada INSERT / UPDATE /
+#              DELETE com pg_notify; uma única conexão faz LISTEN.
+#            - Contagem incremental (uids presentes carregados uma vez),
+#              sem processo, backend novo nem count(*) a cada 0,5 s.
+#            - NOTIFY só é entregue no COMMIT: o horário de chegada é o
+#              horário de commit visto pelo juiz (mesma máquina), gravado
+#              por linha junto com o horário da escrita (clock_timestamp).
+#            - Para no instante em que o alvo é atingido (precisão de ms).
+#            - Lag por registro (carto_ts do jogador -> commit): carto_lag.py.
+#            - Chamado pelos scim_juiz_*.sh; código 2 = indisponível
+#              (sem psycopg2 ou sem banco), e o juiz volta ao psql.
+# ============================================================
+
+import argparse
+import csv
+import json
+import select
+import sys
+import time
+
+try:
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+except ImportError:
+    psycopg2 = None
+
+# --- BANCO (mesmas credenciais do server.py) ---
+DB_HOST = "localhost"
+DB_NAME = "scim_db"
+DB_USER = "scim_user"
+DB_PASS = "carto123"
+
+CANAL = "carto_users"
+MODOS = ("criacao", "modificacao", "delecao")
+POLL_TIMEOUT = 0.2          # s de espera por notificação antes de atualizar a tela
+INDISPONIVEL = 2            # Código de saída: o juiz usa o psql
+
+# Trigger instalado só enquanto o juiz observa (removido na saída).
+# A descrição vai truncada: o payload do NOTIFY tem limite de 8000 bytes.
+INSTALAR_SQL = f"""
+CREATE OR REPLACE FUNCTION carto_notifica_users() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CANAL}', json_build_object(
+        'op', TG_OP,
+        'uid', CASE WHEN TG_OP = 'DELETE' THEN OLD.uid ELSE NEW.uid END,
+        'description', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE left(NEW.description, 500) END,
+        'ts_linha', extract(epoch FROM clock_timestamp()))::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+CREATE OR REPLACE TRIGGER carto_notifica_users
+    AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION carto_notifica_users();
+"""
+REMOVER_SQL = "DROP TRIGGER IF EXISTS carto_notifica_users ON users;"
+
+EVENTOS = {"INSERT": "criacao", "UPDATE": "modificacao", "DELETE": "delecao"}
+
+class JuizNotify:
+    """ Estado do juiz: uids presentes, uids modificados e chegadas por linha """
+    def __init__(self, modo, alvo):
+        self.modo = modo
+        self.alvo = alvo
+        self.presentes = set()
+        self.modificados = set()
+        self.chegadas = []          # (epoch chegada, evento, uid, description, epoch escrita)
+        self.alvo_em = None
+
+    def carregar(self, uids):
+        self.presentes.update(uids)
+        self._verificar(time.time())
+
+    def evento(self, payload, agora):
+        dados = json.loads(payload)
+        uid = dados["uid"]
+        evento = EVENTOS.get(dados["op"])
+        if evento == "criacao":
+            self.presentes.add(uid)
+        elif evento == "modificacao":
+            self.modificados.add(uid)
+        elif evento == "delecao":
+            self.presentes.discard(uid)
+            self.modificados.discard(uid)
+        else:
+            return
+        self.chegadas.append((agora, evento, uid, dados.get("description") or "", dados.get("ts_linha")))
+        self._verificar(agora)
+
+    def contagem(self):
+        return len(self.modificados) if self.modo == "modificacao" else len(self.presentes)
+
+    def _verificar(self, agora):
+        if self.alvo_em is not None:
+            return
+        n = self.contagem()
+        if (self.modo == "delecao" and n <= self.alvo) or (self.modo != "delecao" and n >= self.alvo):
+            self.alvo_em = agora
+
+def gravar_chegadas(juiz, caminho):
+    with open(caminho, "w", newline="") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(["ts_epoch", "evento", "uid", "description", "ts_linha"])
+        for ts, evento, uid, descricao, ts_linha in juiz.chegadas:
+            escritor.writerow([f"{ts:.6f}", evento, uid, descricao, f"{ts_linha:.6f}" if ts_linha else ""])
+
+def monitorar(args):
+    juiz = JuizNotify(args.modo, args.alvo)
+    try:
+        conn = psycopg2.connect(host=args.host, database=args.banco, user=args.usuario, password=args.senha)
+        conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+        cur = conn.cursor()
+        cur.execute(INSTALAR_SQL)
+        # LISTEN antes da carga inicial: linha gravada entre os dois aparece
+        # nos dois lados, e os conjuntos absorvem a duplicata
+        cur.execute(f"LISTEN {CANAL};")
+        inscrito_em = time.time()
+        cur.execute("SELECT uid FROM users;")
+        juiz.carregar(uid for (uid,) in cur.fetchall())
+    except psycopg2.Error as e:
+        print(f"[ERRO] LISTEN/NOTIFY indisponível em {args.banco}@{args.host}: {str(e).strip()}")
+        return INDISPONIVEL
+
+    rotulo = {"criacao": "Registros", "modificacao": "Registros Modificados",
+              "delecao": "Restantes"}[args.modo]
+    print(f"[INFO] Estado inicial: {len(juiz.presentes)} registros (carregado em {time.time() - inscrito_em:.3f} s)")
+    try:
+        while juiz.alvo_em is None:
+            if select.select([conn], [], [], POLL_TIMEOUT) != ([], [], []):
+                conn.poll()
+                agora = time.time()
+                while conn.notifies:
+                    juiz.evento(conn.notifies.pop(0).payload, agora)
+            print(f"[INFO] {rotulo}: {juiz.contagem():<5} / {args.alvo:<5}   ", end="\r", flush=True)
+    except psycopg2.Error as e:
+        print(f"\n[ERRO] Conexão LISTEN perdida: {str(e).strip()}")
+        return 1
+    finally:
+        if args.chegadas:
+            gravar_chegadas(juiz, args.chegadas)
+        try:
+            if not conn.closed:
+                cur.execute(REMOVER_SQL)
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    print(f"\n[SUCESSO] Alvo atingido: {rotulo} = {juiz.contagem()}")
+    if not juiz.chegadas:
+        print("[AVISO] O alvo já estava atingido na inscrição (nenhum evento recebido).")
+    else:
+        primeiro = juiz.chegadas[0][0]
+        print(f"[TEMPO] Inscrição -> alvo......: {juiz.alvo_em - inscrito_em:.3f} s")
+        print(f"[TEMPO] 1º commit -> alvo......: {juiz.alvo_em - primeiro:.3f} s")
+        print(f"[TEMPO] Eventos recebidos......: {len(juiz.chegadas)}")
+    print(f"[TEMPO] Alvo (epoch)...........: {juiz.alvo_em:.3f}")
+    if args.chegadas:
+        print(f"[INFO] Chegadas por registro: {args.chegadas}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Juiz SCIM por eventos (PostgreSQL LISTEN/NOTIFY)")
+    parser.add_argument("--modo", choices=MODOS, required=True)
+    parser.add_argument("--alvo", type=int, help="registros esperados (padrão: 5000; 0 na deleção)")
+    parser.add_argument("--chegadas", help="CSV com o horário de commit de cada registro")
+    parser.add_argument("--host", default=DB_HOST)
+    parser.add_argument("--banco", default=DB_NAME)
+    parser.add_argument("--usuario", default=DB_USER)
+    parser.add_argument("--senha", default=DB_PASS)
+    args = parser.parse_args()
+    if args.alvo is None:
+        args.alvo = 0 if args.modo == "delecao" else 5000
+
+    if psycopg2 is None:
+        print("[AVISO] psycopg2 não instalado (use o venv do /opt/scim_server).")
+        return INDISPONIVEL
+    return monitorar(args)
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n[!] Interrompido.")
+        sys.exit(130)
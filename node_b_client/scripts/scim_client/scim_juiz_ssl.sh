@@ -2,10 +2,12 @@
 # ============================================================
 # Projeto CARTO
 # Autoria: Wagner Calazans
-# Versão: 3.1 (Juiz SCIM SSL - HTTPS)
+# Versão: 3.3 (Juiz SCIM SSL - HTTPS + LISTEN/NOTIFY + Lag por Registro)
 # Descrição: Auditoria Unificada SCIM sobre HTTPS.
 #            - Monitoriza Porta 5000 (Criptografada).
 #            - Salva em pastas separadas (_SSL) para organização.
+#            - Monitor por eventos (scim_juiz_notify.py), psql como reserva.
+#            - Lag envio -> commit por registro (carto_lag.py).
 # ============================================================
 
 # --- CONFIGURACAO ---
@@ -76,7 +78,9 @@ selecionar_cenario() {
 # ============================================================
 iniciar_captura() {
     local NOME_ARQUIVO=$1
-    FULL_PCAP_PATH="$FINAL_PATH/$NOME_ARQUIVO"
+    # Um arquivo por repetição (sufixo data/hora): o relatório comparativo
+    # calcula intervalos de confiança entre execuções do mesmo cenário
+    FULL_PCAP_PATH="$FINAL_PATH/${NOME_ARQUIVO%.pcap}_$(date +%Y%m%d_%H%M%S).pcap"
 
     echo "------------------------------------------------------------"
     echo "A INICIAR CAPTURA (SCIM HTTPS/TCP 5000)"
@@ -111,6 +115,33 @@ finalizar_captura() {
     read -p "Pressione [ENTER] para voltar ao menu..."
 }
 
+# ============================================================
+# MONITOR POR EVENTOS (LISTEN/NOTIFY)
+# ============================================================
+# scim_juiz_notify.py instala um trigger em 'users' e recebe cada commit
+# por uma única conexão LISTEN, sem psql + count(*) a cada 0,5 s.
+# Código 0 = alvo atingido; outro código (sem psycopg2, banco fora do ar)
+# faz o modo voltar ao laço com psql.
+JUIZ_NOTIFY="$(dirname "$(readlink -f "$0")")/scim_juiz_notify.py"
+PYTHON_JUIZ="/opt/scim_server/venv/bin/python3"   # venv do servidor (psycopg2)
+CARTO_LAG="$(dirname "$(readlink -f "$0")")/../carto_lag.py"
+
+monitorar_notify() {
+    local MODO=$1
+    local ALVO=$2
+    local PY="python3"
+    local CHEGADAS="${FULL_PCAP_PATH%.pcap}_chegadas.csv"
+    [ -f "$JUIZ_NOTIFY" ] || return 2
+    [ -x "$PYTHON_JUIZ" ] && PY="$PYTHON_JUIZ"
+    # Horário de commit de cada registro, ao lado do pcap
+    "$PY" "$JUIZ_NOTIFY" --modo "$MODO" --alvo "$ALVO" --chegadas "$CHEGADAS" || return $?
+    # Lag envio (carto_ts do jogador) -> commit; deleções não levam carimbo
+    if [ "$MODO" != "delecao" ] && [ -f "$CARTO_LAG" ]; then
+        python3 "$CARTO_LAG" "$CHEGADAS"
+    fi
+    return 0
+}
+
 # ============================================================
 # MODULOS DE MONITORIZAÇÃO (SQL)
 # ============================================================
@@ -122,17 +153,22 @@ modo_criacao() {
     
     echo "A INICIAR MONITORIZAÇÃO (PostgreSQL)"
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
-        if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
-        printf "[INFO] Registos: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
-
-        if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
-            echo ""; echo "[SUCESSO] Carga SCIM SSL concluída."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_notify criacao "$TARGET_COUNT"; then
+        echo "[SUCESSO] Carga SCIM SSL concluída."
+    else
+        echo "[AVISO] Notificações indisponíveis: a voltar à consulta com psql."
+        while true; do
+            CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
+            if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
+            printf "[INFO] Registos: %-5s / %-5s\r" "$CURRENT_COUNT" "$TARGET_COUNT"
+
+            if [ "$CURRENT_COUNT" -ge "$TARGET_COUNT" ]; then
+                echo ""; echo "[SUCESSO] Carga SCIM SSL concluída."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -144,15 +180,20 @@ modo_modificacao() {
     
     echo "A INICIAR MONITORIZAÇÃO (PostgreSQL)"
     START_TIME=$(date +%s)
-    while true; do
-        RESULT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT description FROM users WHERE uid='$TARGET_USER';" 2>/dev/null)
-        if echo "$RESULT" | grep -q "$EXPECTED_VALUE"; then
-            echo ""; echo "[SUCESSO] Atualização SSL detetada."
-            break
-        fi
-        printf "[INFO] A aguardar commit... \r"
-        sleep 0.5
-    done
+    if monitorar_notify modificacao 5000; then
+        echo "[SUCESSO] Atualização SSL de todos os registos detetada."
+    else
+        echo "[AVISO] Notificações indisponíveis: a voltar à consulta com psql."
+        while true; do
+            RESULT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT description FROM users WHERE uid='$TARGET_USER';" 2>/dev/null)
+            if echo "$RESULT" | grep -q "$EXPECTED_VALUE"; then
+                echo ""; echo "[SUCESSO] Atualização SSL detetada."
+                break
+            fi
+            printf "[INFO] A aguardar commit... \r"
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
@@ -162,17 +203,22 @@ modo_delecao() {
     
     echo "A INICIAR MONITORIZAÇÃO (PostgreSQL)"
     START_TIME=$(date +%s)
-    while true; do
-        CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
-        if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
-        printf "[INFO] Restantes: %-5s \r" "$CURRENT_COUNT"
-
-        if [ "$CURRENT_COUNT" -le 0 ]; then
-            echo ""; echo "[SUCESSO] Tabela vazia."
-            break
-        fi
-        sleep 0.5
-    done
+    if monitorar_notify delecao 0; then
+        echo "[SUCESSO] Tabela vazia."
+    else
+        echo "[AVISO] Notificações indisponíveis: a voltar à consulta com psql."
+        while true; do
+            CURRENT_COUNT=$(sudo -u postgres psql -d $DB_NAME -t -A -c "SELECT count(*) FROM users;" 2>/dev/null)
+            if [ -z "$CURRENT_COUNT" ]; then CURRENT_COUNT=0; fi
+            printf "[INFO] Restantes: %-5s \r" "$CURRENT_COUNT"
+
+            if [ "$CURRENT_COUNT" -le 0 ]; then
+                echo ""; echo "[SUCESSO] Tabela vazia."
+                break
+            fi
+            sleep 0.5
+        done
+    fi
     finalizar_captura $START_TIME
 }
 
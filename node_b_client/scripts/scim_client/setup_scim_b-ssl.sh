@@ -12,6 +12,8 @@
 
 set -e
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+
 echo "[INFO] 1. Parando e desabilitando servico LDAP..."
 systemctl stop slapd 2>/dev/null || true
 systemctl disable slapd 2>/dev/null || true
@@ -50,81 +52,9 @@ python3 -m venv venv
 source venv/bin/activate
 pip install flask psycopg2-binary gunicorn > /dev/null
 
-echo "[INFO] 5. Criando codigo do Servidor SCIM (server.py)..."
-cat <<EOF > "$APP_DIR/server.py"
-from flask import Flask, request, jsonify
-import psycopg2
-
-app = Flask(__name__)
-
-# Configuracao do Banco
-DB_HOST = "localhost"
-DB_NAME = "scim_db"
-DB_USER = "scim_user"
-DB_PASS = "carto123"
-
-def get_db_connection():
-    conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
-    return conn
-
-@app.route('/Users', methods=['POST'])
-def create_user():
-    data = request.json
-    uid = data.get('id')
-    username = data.get('userName')
-    description = data.get('description', '')
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO users (uid, username, description) VALUES (%s, %s, %s)",
-            (uid, username, description)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"id": uid, "status": "created"}), 201
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
-
-@app.route('/Users/<uid>', methods=['PUT', 'PATCH'])
-def update_user(uid):
-    data = request.json
-    description = data.get('description')
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "UPDATE users SET description = %s WHERE uid = %s",
-            (description, uid)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"id": uid, "status": "updated"}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
-
-@app.route('/Users/<uid>', methods=['DELETE'])
-def delete_user(uid):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("DELETE FROM users WHERE uid = %s", (uid,))
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"status": "deleted"}), 204
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
-
-if __name__ == '__main__':
-#    app.run(host='0.0.0.0', port=5000)
-    app.run(host='0.0.0.0', port=5000, debug=False, ssl_context=('/opt/certs/cert.pem', '/opt/certs/key.pem'))
-EOF
+echo "[INFO] 5. Instalando codigo do Servidor SCIM (server.py)..."
+# Copia a versao versionada do repositorio (pool de conexoes + statements preparados)
+cp "$SCRIPT_DIR/../scim_server/server.py" "$APP_DIR/server.py"
 
 echo "------------------------------------------------------------"
 echo "[SUCESSO] Ambiente SCIM corrigido e pronto com ssl."
@@ -1,5 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 import psycopg2
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+from contextlib import contextmanager
+import threading
+import time
 
 app = Flask(__name__)
 
@@ -9,9 +14,183 @@ DB_NAME = "scim_db"
 DB_USER = "scim_user"
 DB_PASS = "carto123"
 
+# Configuracao do Pool de Conexoes
+POOL_MIN = 5               # Conexoes abertas ja na primeira requisicao
+POOL_MAX = 20              # Teto de backends do Postgres usados pelo servidor
+POOL_WAIT_TIMEOUT = 10     # Segundos aguardando conexao livre antes de responder 503
+POOL_HEALTH_IDLE = 30      # Conexao ociosa ha mais tempo que isso e testada antes do uso
+
+# Statements preparados no servidor (PREPARE uma vez por conexao do pool)
+PREPARED_STATEMENTS = {
+    "scim_insert": "PREPARE scim_insert (varchar, varchar, text) AS "
+                   "INSERT INTO users (uid, username, description) VALUES ($1, $2, $3)",
+    "scim_update": "PREPARE scim_update (text, varchar) AS "
+                   "UPDATE users SET description = COALESCE($1, description) WHERE uid = $2",
+    "scim_delete": "PREPARE scim_delete (varchar) AS "
+                   "DELETE FROM users WHERE uid = $1",
+}
+
+# Limites do endpoint /Bulk (RFC 7644 secao 3.7), anunciados em /ServiceProviderConfig
+BULK_MAX_OPERATIONS = 1000
+BULK_MAX_PAYLOAD = 1048576
+
+SCHEMA_BULK_REQUEST = "urn:ietf:params:scim:api:messages:2.0:BulkRequest"
+SCHEMA_BULK_RESPONSE = "urn:ietf:params:scim:api:messages:2.0:BulkResponse"
+SCHEMA_ERROR = "urn:ietf:params:scim:api:messages:2.0:Error"
+SCHEMA_PATCH_OP = "urn:ietf:params:scim:api:messages:2.0:PatchOp"
+
+class PoolEsgotado(Exception):
+    pass
+
+class ConexaoCarto(psycopg2.extensions.connection):
+    """ Conexao com estado do pool: statements preparados e ultimo uso """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparada = False
+        self.ultimo_uso = time.monotonic()
+
+class PoolConexoes:
+    """ Pool limitado e thread-safe de conexoes psycopg2.
+
+    Ate `maxconn` conexoes ficam abertas e sao reaproveitadas (o
+    ThreadedConnectionPool do psycopg2 fecha tudo acima de minconn e falha
+    na hora quando esgota). Quem nao encontra conexao livre espera no
+    semaforo e o tempo de espera e medido, separando saturacao do banco de
+    degradacao da rede.
+    """
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self._kwargs = kwargs
+        self._ociosas = []
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self.stats = {
+            "emprestimos": 0, "em_uso": 0, "abertas": 0, "timeouts": 0,
+            "espera_total_ms": 0.0, "espera_max_ms": 0.0,
+            "descartadas_health": 0,
+        }
+        for _ in range(minconn):
+            self._ociosas.append(self._conectar())
+
+    def _conectar(self):
+        conn = psycopg2.connect(connection_factory=ConexaoCarto, **self._kwargs)
+        with self._lock: self.stats["abertas"] += 1
+        return conn
+
+    def _descartar(self, conn):
+        try: conn.close()
+        except Exception: pass
+        with self._lock: self.stats["abertas"] -= 1
+
+    def getconn(self):
+        inicio = time.perf_counter()
+        if not self._slots.acquire(timeout=POOL_WAIT_TIMEOUT):
+            with self._lock: self.stats["timeouts"] += 1
+            raise PoolEsgotado(f"Nenhuma conexao livre em {POOL_WAIT_TIMEOUT}s")
+        try:
+            conn = self._verificar()
+        except Exception:
+            self._slots.release()
+            raise
+        espera_ms = (time.perf_counter() - inicio) * 1000
+        with self._lock:
+            self.stats["emprestimos"] += 1
+            self.stats["em_uso"] += 1
+            self.stats["espera_total_ms"] += espera_ms
+            self.stats["espera_max_ms"] = max(self.stats["espera_max_ms"], espera_ms)
+        return conn, espera_ms
+
+    def putconn(self, conn):
+        try:
+            status = conn.info.transaction_status if not conn.closed else None
+            if status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                pass
+            elif status in (psycopg2.extensions.TRANSACTION_STATUS_INTRANS,
+                            psycopg2.extensions.TRANSACTION_STATUS_INERROR):
+                conn.rollback()
+            else:
+                raise psycopg2.InterfaceError("conexao perdida")
+            conn.ultimo_uso = time.monotonic()
+            with self._lock: self._ociosas.append(conn)
+        except psycopg2.Error:
+            self._descartar(conn)
+        finally:
+            with self._lock: self.stats["em_uso"] -= 1
+            self._slots.release()
+
+    def _verificar(self):
+        # Reaproveita a ociosa mais recente; health check se ficou parada demais
+        while True:
+            with self._lock:
+                conn = self._ociosas.pop() if self._ociosas else None
+            if conn is None:
+                conn = self._conectar()
+                break
+            if conn.closed:
+                with self._lock: self.stats["descartadas_health"] += 1
+                self._descartar(conn)
+                continue
+            if time.monotonic() - conn.ultimo_uso <= POOL_HEALTH_IDLE:
+                break
+            try:
+                with conn.cursor() as cur: cur.execute("SELECT 1")
+                conn.rollback()
+                break
+            except psycopg2.Error:
+                with self._lock: self.stats["descartadas_health"] += 1
+                self._descartar(conn)
+
+        if not conn.preparada:
+            try:
+                with conn.cursor() as cur:
+                    for sql in PREPARED_STATEMENTS.values():
+                        cur.execute(sql)
+                conn.commit()
+            except Exception:
+                self._descartar(conn)
+                raise
+            conn.preparada = True
+        return conn
+
+    def snapshot(self):
+        with self._lock:
+            snap = dict(self.stats)
+            snap["ociosas"] = len(self._ociosas)
+        snap["max"] = self.maxconn
+        snap["espera_media_ms"] = snap["espera_total_ms"] / snap["emprestimos"] if snap["emprestimos"] else 0.0
+        return snap
+
+_db_pool = None
+_db_pool_lock = threading.Lock()
+
+def get_db_pool():
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = PoolConexoes(POOL_MIN, POOL_MAX, host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
+    return _db_pool
+
+@contextmanager
 def get_db_connection():
-    conn = psycopg2.connect(host=DB_HOST, database=DB_NAME, user=DB_USER, password=DB_PASS)
-    return conn
+    """ Empresta uma conexao do pool e garante a devolucao (inclusive em erro) """
+    db_pool = get_db_pool()
+    conn, espera_ms = db_pool.getconn()
+    g.pool_wait_ms = g.get("pool_wait_ms", 0.0) + espera_ms
+    try:
+        yield conn
+    finally:
+        db_pool.putconn(conn)
+
+@app.errorhandler(PoolEsgotado)
+@app.errorhandler(psycopg2.OperationalError)
+def db_indisponivel(e):
+    return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+
+@app.after_request
+def registrar_espera_pool(response):
+    if "pool_wait_ms" in g:
+        response.headers["X-Pool-Wait-Ms"] = f"{g.pool_wait_ms:.3f}"
+    return response
 
 @app.route('/Users', methods=['POST'])
 def create_user():
@@ -20,53 +199,271 @@ def create_user():
     username = data.get('userName')
     description = data.get('description', '')
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "INSERT INTO users (uid, username, description) VALUES (%s, %s, %s)",
-            (uid, username, description)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"id": uid, "status": "created"}), 201
-    except Exception as e:
-        conn.rollback()
-        return jsonify({"error": str(e)}), 400
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXECUTE scim_insert (%s, %s, %s)", (uid, username, description))
+            conn.commit()
+            return jsonify({"id": uid, "status": "created"}), 201
+        except psycopg2.OperationalError:
+            raise
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 @app.route('/Users/<uid>', methods=['PUT', 'PATCH'])
 def update_user(uid):
     data = request.json
     description = data.get('description')
-    
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute(
-            "UPDATE users SET description = %s WHERE uid = %s",
-            (description, uid)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"id": uid, "status": "updated"}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXECUTE scim_update (%s, %s)", (description, uid))
+                encontrado = cur.rowcount > 0
+            conn.commit()
+            # Mesma resposta da operacao UPDATE no /Bulk para uid sem linha
+            if not encontrado:
+                return jsonify({"error": f"Usuario {uid} nao encontrado"}), 404
+            return jsonify({"id": uid, "status": "updated"}), 200
+        except psycopg2.OperationalError:
+            raise
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
 
 @app.route('/Users/<uid>', methods=['DELETE'])
 def delete_user(uid):
-    conn = get_db_connection()
-    cur = conn.cursor()
+    with get_db_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("EXECUTE scim_delete (%s)", (uid,))
+            conn.commit()
+            return jsonify({"status": "deleted"}), 204
+        except psycopg2.OperationalError:
+            raise
+        except Exception as e:
+            conn.rollback()
+            return jsonify({"error": str(e)}), 400
+
+# ============================================================
+# BULK (RFC 7644 3.7) - GROUP COMMIT
+# ============================================================
+# As operacoes sao agrupadas em sequencias consecutivas do mesmo tipo e cada
+# sequencia vira um unico INSERT/UPDATE/DELETE em lote (execute_values), tudo
+# dentro de uma transacao com um unico COMMIT no final.
+
+BULK_SQL = {
+    "insert": "INSERT INTO users (uid, username, description) VALUES %s "
+              "ON CONFLICT (uid) DO NOTHING RETURNING uid",
+    # Sem description na operacao (None): mantem o valor atual, a linha ainda conta como 200
+    "update": "UPDATE users AS u SET description = COALESCE(v.description, u.description) "
+              "FROM (VALUES %s) AS v(uid, description) WHERE u.uid = v.uid RETURNING u.uid",
+    "delete": "DELETE FROM users WHERE uid = ANY(%s) RETURNING uid",
+}
+
+# Status de cada tipo quando a linha foi (ou nao) afetada pelo lote
+BULK_STATUS = {
+    "insert": ("201", "409", "uniqueness"),
+    "update": ("200", "404", None),
+    "delete": ("204", "404", None),
+}
+
+def bulk_erro(status, detail, scim_type=None):
+    erro = {"schemas": [SCHEMA_ERROR], "status": str(status), "detail": detail}
+    if scim_type: erro["scimType"] = scim_type
+    return erro
+
+def parse_bulk_operation(op):
+    """ Valida uma operacao do Bulk e devolve (tipo, uid, valores) ou levanta ValueError """
+    if not isinstance(op, dict):
+        raise ValueError("Operacao invalida")
+    method = str(op.get("method", "")).upper()
+    path = op.get("path") or ""
+    if not isinstance(path, str):
+        raise ValueError("'path' invalido")
+    data = op.get("data")
+    if data is None:
+        data = {}
+    elif not isinstance(data, dict):
+        raise ValueError("'data' deve ser um objeto")
+
+    if method == "POST":
+        if path.rstrip("/") != "/Users":
+            raise ValueError(f"Path nao suportado para POST: {path}")
+        uid = data.get("id")
+        if not uid or not isinstance(uid, str):
+            raise ValueError("POST sem 'id'")
+        return "insert", uid, (uid, data.get("userName"), data.get("description", ""))
+
+    if not path.startswith("/Users/") or len(path) <= len("/Users/"):
+        raise ValueError(f"Path invalido: {path}")
+    uid = path[len("/Users/"):]
+
+    if method in ("PUT", "PATCH"):
+        description = data.get("description")
+        patches = data.get("Operations", []) if method == "PATCH" else []
+        if not isinstance(patches, list):
+            raise ValueError("PATCH com 'Operations' invalido")
+        # PATCH no formato PatchOp: usa o ultimo 'replace' de description
+        for patch in patches:
+            if not isinstance(patch, dict):
+                raise ValueError("Operacao de PATCH invalida")
+            if str(patch.get("op", "")).lower() in ("replace", "add"):
+                value = patch.get("value")
+                if patch.get("path") == "description": description = value
+                elif isinstance(value, dict) and "description" in value: description = value["description"]
+        if description is not None and not isinstance(description, str):
+            raise ValueError("'description' deve ser texto")
+        return "update", uid, (uid, description)
+    if method == "DELETE":
+        return "delete", uid, uid
+    raise ValueError(f"Metodo nao suportado: {method}")
+
+def bulk_sequencias(parsed):
+    """ Agrupa indices consecutivos do mesmo tipo, sem repetir uid numa sequencia """
+    seq, tipo, uids = [], None, set()
+    for i, item in enumerate(parsed):
+        if isinstance(item, Exception):
+            if seq: yield tipo, seq
+            yield None, [i]
+            seq, tipo, uids = [], None, set()
+            continue
+        t, uid, _ = item
+        if seq and (t != tipo or uid in uids):
+            yield tipo, seq
+            seq, uids = [], set()
+        tipo = t
+        seq.append(i)
+        uids.add(uid)
+    if seq: yield tipo, seq
+
+def bulk_executar_lote(cur, tipo, valores):
+    """ Executa um lote e devolve o conjunto de uids afetados """
+    if tipo == "delete":
+        cur.execute(BULK_SQL[tipo], (list(valores),))
+        return {row[0] for row in cur.fetchall()}
+    rows = execute_values(cur, BULK_SQL[tipo], valores, page_size=len(valores), fetch=True)
+    return {row[0] for row in rows}
+
+def bulk_executar_individual(cur, tipo, valores):
+    """ Fallback quando o lote inteiro falha: uma operacao por SAVEPOINT """
+    afetados, erros = set(), {}
+    for v in valores:
+        uid = v if tipo == "delete" else v[0]
+        cur.execute("SAVEPOINT bulk_op")
+        try:
+            afetados |= bulk_executar_lote(cur, tipo, [v])
+            cur.execute("RELEASE SAVEPOINT bulk_op")
+        except psycopg2.OperationalError:
+            raise
+        except psycopg2.Error as e:
+            cur.execute("ROLLBACK TO SAVEPOINT bulk_op")
+            erros[uid] = str(e).strip()
+    return afetados, erros
+
+def bulk_aplicar_sequencia(cur, tipo, indices, parsed):
+    """ Aplica uma sequencia e devolve o resultado (status, detalhe) de cada indice """
+    valores = [parsed[i][2] for i in indices]
+    cur.execute("SAVEPOINT bulk_lote")
     try:
-        cur.execute("DELETE FROM users WHERE uid = %s", (uid,))
+        afetados, erros = bulk_executar_lote(cur, tipo, valores), {}
+        cur.execute("RELEASE SAVEPOINT bulk_lote")
+    except psycopg2.OperationalError:
+        raise
+    except psycopg2.Error:
+        cur.execute("ROLLBACK TO SAVEPOINT bulk_lote")
+        afetados, erros = bulk_executar_individual(cur, tipo, valores)
+
+    ok, falha, scim_type = BULK_STATUS[tipo]
+    resultados = []
+    for i in indices:
+        uid = parsed[i][1]
+        if uid in erros: resultados.append(("400", erros[uid], None))
+        elif uid in afetados: resultados.append((ok, None, None))
+        else: resultados.append((falha, f"{uid}: {'ja existe' if tipo == 'insert' else 'nao encontrado'}", scim_type))
+    return resultados
+
+@app.route('/Bulk', methods=['POST'])
+def bulk():
+    if request.content_length and request.content_length > BULK_MAX_PAYLOAD:
+        return jsonify(bulk_erro(413, f"Payload excede {BULK_MAX_PAYLOAD} bytes")), 413
+    data = request.get_json(silent=True) or {}
+    operations = data.get("Operations")
+    if not isinstance(operations, list):
+        return jsonify(bulk_erro(400, "Campo 'Operations' ausente", "invalidSyntax")), 400
+    if len(operations) > BULK_MAX_OPERATIONS:
+        return jsonify(bulk_erro(413, f"Maximo de {BULK_MAX_OPERATIONS} operacoes por requisicao")), 413
+
+    fail_on_errors = data.get("failOnErrors")
+    try:
+        fail_on_errors = int(fail_on_errors) if fail_on_errors is not None else None
+    except (TypeError, ValueError):
+        return jsonify(bulk_erro(400, "failOnErrors invalido", "invalidValue")), 400
+
+    parsed = []
+    for op in operations:
+        try: parsed.append(parse_bulk_operation(op))
+        except ValueError as e: parsed.append(e)
+
+    respostas = []
+    erros = 0
+
+    def registrar(i, status, detail, scim_type):
+        op = operations[i] if isinstance(operations[i], dict) else {}
+        item = {"method": str(op.get("method", "")).upper(), "status": status}
+        if op.get("bulkId"): item["bulkId"] = op["bulkId"]
+        if status in ("200", "201"): item["location"] = f"{request.host_url}Users/{parsed[i][1]}"
+        if detail: item["response"] = bulk_erro(status, detail, scim_type)
+        respostas.append(item)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            for tipo, indices in bulk_sequencias(parsed):
+                if tipo is None:
+                    resultados = [("400", str(parsed[indices[0]]), "invalidSyntax")]
+                else:
+                    cur.execute("SAVEPOINT bulk_seq")
+                    resultados = bulk_aplicar_sequencia(cur, tipo, indices, parsed)
+
+                # failOnErrors: para no erro de numero N; se o limite cair no meio
+                # da sequencia, desfaz o lote e reaplica so o prefixo ate o erro
+                corte = None
+                if fail_on_errors:
+                    for k, (status, _, _) in enumerate(resultados):
+                        if int(status) >= 400:
+                            erros += 1
+                            if erros >= fail_on_errors:
+                                corte = k
+                                break
+                if tipo is not None:
+                    if corte is not None and corte < len(indices) - 1:
+                        cur.execute("ROLLBACK TO SAVEPOINT bulk_seq")
+                        indices = indices[:corte + 1]
+                        resultados = bulk_aplicar_sequencia(cur, tipo, indices, parsed)
+                    cur.execute("RELEASE SAVEPOINT bulk_seq")
+
+                for i, (status, detail, scim_type) in zip(indices, resultados):
+                    registrar(i, status, detail, scim_type)
+                if corte is not None:
+                    break
         conn.commit()
-        cur.close()
-        conn.close()
-        return jsonify({"status": "deleted"}), 204
-    except Exception as e:
-        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"schemas": [SCHEMA_BULK_RESPONSE], "Operations": respostas}), 200
+
+@app.route('/ServiceProviderConfig', methods=['GET'])
+def service_provider_config():
+    return jsonify({
+        "schemas": ["urn:ietf:params:scim:schemas:core:2.0:ServiceProviderConfig"],
+        "bulk": {"supported": True, "maxOperations": BULK_MAX_OPERATIONS, "maxPayloadSize": BULK_MAX_PAYLOAD},
+        "patch": {"supported": True},
+    }), 200
+
+@app.route('/Metrics', methods=['GET'])
+def metrics():
+    # Espera media/maxima por conexao: alta aqui = banco saturado, nao a rede
+    return jsonify({"pool": get_db_pool().snapshot()}), 200
 
 if __name__ == '__main__':
 #    app.run(host='0.0.0.0', port=5000)
-    app.run(host='0.0.0.0', port=5000, debug=False, ssl_context=('/opt/certs/cert.pem', '/opt/certs/key.pem'))
+    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True, ssl_context=('/opt/certs/cert.pem', '/opt/certs/key.pem'))